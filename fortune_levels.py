@@ -0,0 +1,169 @@
+import re
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+UNKNOWN = ("未知", "❓")
+
+# 数组查找表最多覆盖的分值个数（int16数组约2MiB），跨度更大时改用按分段边界二分查找
+MAX_TABLE_SPAN = 1 << 20
+
+_RANGE_PATTERN = re.compile(r"^\s*(-?\d+)\s*(?:-\s*(-?\d+)\s*)?$")
+
+
+def parse_ranges(ranges_str: str) -> List[Tuple[int, int]]:
+    """解析人品值分段字符串，如 "0-1, 2-10, 11-20"，支持负数（"-10--1"）和单个值，格式错误时抛出ValueError"""
+    ranges = []
+    for part in ranges_str.split(','):
+        if not part.strip():
+            continue
+        match = _RANGE_PATTERN.match(part)
+        if not match:
+            raise ValueError(f"无效的分段: '{part.strip()}'")
+        low = int(match.group(1))
+        high = int(match.group(2)) if match.group(2) is not None else low
+        if low > high:
+            raise ValueError(f"分段下限大于上限: '{part.strip()}'")
+        ranges.append((low, high))
+    return ranges
+
+
+class FortuneTable:
+    """编译后的运势等级查找表
+
+    把各分段展开成覆盖 [最小下限, 最大上限] 的数组，数组元素为分段序号（未覆盖处为-1），
+    单次查询是一次下标访问，整批分值可以用 classify_many 一次性分类。分段重叠时与原先的
+    线性扫描一致，靠前的分段优先；编译时记录所有空隙和重叠，供加载时报告。
+
+    覆盖范围超过 MAX_TABLE_SPAN（通常是配置写错，如上限多写了几位）时不展开数组，
+    改为把各分段边界切成互不重叠的区间，查询时二分查找，此时 sparse 为True。
+    """
+
+    def __init__(self, levels: Sequence[Tuple[int, int, str, str]]):
+        # levels: [(min, max, 运势, emoji), ...]，按配置顺序
+        self.levels = list(levels)
+        self.names = [name for _, _, name, _ in self.levels]
+        self.emojis = [emoji for _, _, _, emoji in self.levels]
+        self.gaps: List[Tuple[int, int]] = []
+        self.overlaps: List[Tuple[int, int, int, int]] = []
+        self.sparse = False
+        self._names = np.array(self.names + [UNKNOWN[0]], dtype=object)
+        self._emojis = np.array(self.emojis + [UNKNOWN[1]], dtype=object)
+
+        if not self.levels:
+            self.offset = self.upper = 0
+            self._index = np.full(0, -1, dtype=np.int16)
+            return
+
+        self.offset = min(low for low, _, _, _ in self.levels)
+        self.upper = max(high for _, high, _, _ in self.levels)
+        if self.upper - self.offset + 1 > MAX_TABLE_SPAN:
+            self._compile_sparse()
+            return
+
+        upper = self.upper
+        self._index = np.full(upper - self.offset + 1, -1, dtype=np.int16)
+        for i, (low, high, _, _) in enumerate(self.levels):
+            span = self._index[low - self.offset:high - self.offset + 1]
+            # 记录与之前分段重叠的部分 (先前分段序号, 当前分段序号, 起, 止)
+            for j in np.unique(span[span >= 0]):
+                covered = np.flatnonzero(span == j) + low
+                self.overlaps.append((int(j), i, int(covered[0]), int(covered[-1])))
+            span[span < 0] = i
+
+        holes = np.flatnonzero(self._index < 0)
+        if holes.size:
+            # 把连续的空缺下标合并成区间
+            breaks = np.flatnonzero(np.diff(holes) > 1)
+            starts = np.concatenate(([holes[0]], holes[breaks + 1]))
+            ends = np.concatenate((holes[breaks], [holes[-1]]))
+            self.gaps = [(int(s) + self.offset, int(e) + self.offset) for s, e in zip(starts, ends)]
+
+    def _compile_sparse(self):
+        """按分段边界切分区间: 第k个区间为 [_starts[k], _starts[k+1])，所属分段序号为 _owners[k]"""
+        self.sparse = True
+        points = sorted({low for low, _, _, _ in self.levels} | {high + 1 for _, high, _, _ in self.levels})
+        owners = np.full(len(points) - 1, -1, dtype=np.int16)
+        for i, (low, high, _, _) in enumerate(self.levels):
+            first, last = bisect_left(points, low), bisect_left(points, high + 1)
+            span = owners[first:last]
+            for j in np.unique(span[span >= 0]):
+                covered = np.flatnonzero(span == j) + first
+                self.overlaps.append((int(j), i, points[covered[0]], points[covered[-1] + 1] - 1))
+            span[span < 0] = i
+
+        for k in np.flatnonzero(owners < 0):
+            start, end = points[k], points[k + 1] - 1
+            if self.gaps and self.gaps[-1][1] == start - 1:
+                start = self.gaps.pop()[0]
+            self.gaps.append((start, end))
+
+        self._points = points
+        self._starts = np.array(points, dtype=np.int64)
+        self._owners = owners
+
+    @property
+    def bounds(self) -> Tuple[int, int]:
+        """查找表覆盖的分值范围 (最小值, 最大值)"""
+        return self.offset, self.upper
+
+    def index(self, value: int) -> int:
+        """返回分值所属分段的序号，不属于任何分段时返回-1"""
+        if self.sparse:
+            k = bisect_right(self._points, value) - 1
+            return int(self._owners[k]) if 0 <= k < len(self._owners) else -1
+        pos = value - self.offset
+        if 0 <= pos < len(self._index):
+            return int(self._index[pos])
+        return -1
+
+    def lookup(self, value: int) -> Tuple[str, str]:
+        """返回 (运势, emoji)"""
+        i = self.index(value)
+        if i < 0:
+            return UNKNOWN
+        return self.names[i], self.emojis[i]
+
+    def band(self, value: int) -> Optional[Tuple[int, int]]:
+        """返回分值所属分段的 (min, max)"""
+        i = self.index(value)
+        if i < 0:
+            return None
+        return self.levels[i][0], self.levels[i][1]
+
+    def classify_many(self, values) -> np.ndarray:
+        """批量返回分段序号数组，不属于任何分段的为-1"""
+        values = np.asarray(values, dtype=np.int64)
+        if self.sparse:
+            k = np.searchsorted(self._starts, values, side="right") - 1
+            inside = (k >= 0) & (k < len(self._owners))
+            result = np.full(values.shape, -1, dtype=np.int16)
+            result[inside] = self._owners[k[inside]]
+            return result
+        pos = values - self.offset
+        inside = (pos >= 0) & (pos < len(self._index))
+        result = np.full(values.shape, -1, dtype=np.int16)
+        result[inside] = self._index[pos[inside]]
+        return result
+
+    def names_many(self, values) -> np.ndarray:
+        """批量返回运势名称数组"""
+        return self._names[self.classify_many(values)]
+
+    def emojis_many(self, values) -> np.ndarray:
+        """批量返回emoji数组"""
+        return self._emojis[self.classify_many(values)]
+
+    def report(self) -> List[str]:
+        """分段空隙和重叠的描述，没有问题时返回空列表"""
+        problems = [f"{low}-{high} 不属于任何分段" if low != high else f"{low} 不属于任何分段"
+                    for low, high in self.gaps]
+        for earlier, later, low, high in self.overlaps:
+            problems.append(
+                f"分段 {self.levels[later][0]}-{self.levels[later][1]}({self.names[later]}) 与 "
+                f"{self.levels[earlier][0]}-{self.levels[earlier][1]}({self.names[earlier]}) 在 {low}-{high} 重叠，"
+                f"按 {self.names[earlier]} 处理"
+            )
+        return problems
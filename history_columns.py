@@ -0,0 +1,149 @@
+import hashlib
+import os
+import struct
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 每条记录6字节：日期序数(int32) + 人品值(int16，自定义分段可以使用负数或大于255的分值)，
+# 运势名称由分段表按人品值推出，不再重复保存
+RECORD = np.dtype([("day", "<i4"), ("jrrp", "<i2")])
+_PACK = struct.Struct("<ih")
+# 文件格式版本，版本不同时丢弃全部文件（由主存储重建）
+FORMAT_VERSION = "2"
+
+WEEKDAYS = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+
+
+def day_ordinal(day: str) -> int:
+    return date.fromisoformat(day).toordinal()
+
+
+class HistoryColumns:
+    """按用户保存的列式人品值历史
+
+    每个用户一个定长记录文件，按日期升序排列，读取时用 np.memmap 映射，不需要反序列化。
+    它是历史记录的派生副本：按日期顺序追加（每天一条的常见情况）时原地追加或覆盖最后一条，
+    补录更早的日期或删除记录时直接丢弃该用户的文件，下次读取时由 BaseStore.history_arrays
+    根据主存储重建。
+    """
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = base_dir
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        version_file = self.base_dir / "VERSION"
+        if not version_file.exists() or version_file.read_text(encoding="utf-8").strip() != FORMAT_VERSION:
+            # 旧版本每条5字节、人品值为uint8
+            self.clear()
+            version_file.write_text(FORMAT_VERSION, encoding="utf-8")
+
+    def _path(self, user_id: str) -> Path:
+        # 用户ID可能包含不能用作文件名的字符，统一取哈希
+        name = hashlib.blake2b(user_id.encode("utf-8"), digest_size=10).hexdigest()
+        return self.base_dir / f"{name}.col"
+
+    def read(self, user_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (日期序数数组, 人品值数组)，没有文件时返回空数组"""
+        path = self._path(user_id)
+        try:
+            count = path.stat().st_size // RECORD.itemsize
+        except FileNotFoundError:
+            count = 0
+        if count == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int16)
+        records = np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+        return records["day"], records["jrrp"]
+
+    def write(self, user_id: str, days: Sequence[str], values: Sequence[int]):
+        """用完整的历史（日期升序）重建用户的文件"""
+        records = np.empty(len(days), dtype=RECORD)
+        records["day"] = [day_ordinal(day) for day in days]
+        records["jrrp"] = values
+        path = self._path(user_id)
+        tmp_path = path.with_name(path.name + ".tmp")
+        records.tofile(tmp_path)
+        os.replace(tmp_path, path)
+
+    def append(self, user_id: str, day: str, jrrp: int):
+        """追加一条记录；日期早于最后一条时丢弃文件等待重建，文件不存在时不创建"""
+        path = self._path(user_id)
+        ordinal = day_ordinal(day)
+        try:
+            f = open(path, "r+b")
+        except FileNotFoundError:
+            return
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            tail = size - size % RECORD.itemsize
+            if tail:
+                f.seek(tail - RECORD.itemsize)
+                last_day, _ = _PACK.unpack(f.read(RECORD.itemsize))
+                if ordinal < last_day:
+                    tail = -1
+                elif ordinal == last_day:
+                    tail -= RECORD.itemsize
+            if tail >= 0:
+                f.seek(tail)
+                f.write(_PACK.pack(ordinal, int(jrrp)))
+                f.truncate()
+        if tail < 0:
+            self.discard(user_id)
+
+    def discard(self, user_id: str):
+        self._path(user_id).unlink(missing_ok=True)
+
+    def clear(self):
+        for path in self.base_dir.glob("*.col"):
+            path.unlink(missing_ok=True)
+
+
+def _longest_streak(mask: np.ndarray, days: np.ndarray) -> int:
+    """满足条件且日期连续的最长天数"""
+    if not mask.any():
+        return 0
+    joined = np.zeros(len(mask), dtype=bool)
+    joined[1:] = mask[1:] & mask[:-1] & (np.diff(days) == 1)
+    run_ids = np.cumsum(mask & ~joined)[mask]
+    return int(np.bincount(run_ids).max())
+
+
+def analyze_history(days: np.ndarray, scores: np.ndarray,
+                    good_threshold: int = 61, bad_threshold: int = 30) -> Optional[Dict[str, Any]]:
+    """计算移动平均、分位数、最长连续好运/霉运天数和星期分布"""
+    if len(scores) == 0:
+        return None
+    days = np.asarray(days, dtype=np.int64)
+    values = np.asarray(scores, dtype=np.float64)
+
+    p25, median, p75, p90 = np.percentile(values, (25, 50, 75, 90))
+    ma7 = values[-7:].mean()
+    ma30 = values[-30:].mean()
+
+    # 序数1(0001-01-01)是星期一
+    weekday = (days - 1) % 7
+    weekday_counts = np.bincount(weekday, minlength=7)
+    weekday_sums = np.bincount(weekday, weights=values, minlength=7)
+    weekday_avgs = np.divide(weekday_sums, weekday_counts,
+                             out=np.zeros(7), where=weekday_counts > 0)
+    present = np.flatnonzero(weekday_counts)
+
+    return {
+        "count": len(values),
+        "first_date": date.fromordinal(int(days[0])).isoformat(),
+        "last_date": date.fromordinal(int(days[-1])).isoformat(),
+        "avg": round(float(values.mean()), 1),
+        "ma7": round(float(ma7), 1),
+        "ma30": round(float(ma30), 1),
+        "trend": round(float(ma7 - ma30), 1),
+        "p25": round(float(p25), 1),
+        "median": round(float(median), 1),
+        "p75": round(float(p75), 1),
+        "p90": round(float(p90), 1),
+        "good_streak": _longest_streak(values >= good_threshold, days),
+        "bad_streak": _longest_streak(values <= bad_threshold, days),
+        "weekdays": [(WEEKDAYS[i], round(float(weekday_avgs[i]), 1), int(weekday_counts[i])) for i in present],
+        "best_weekday": WEEKDAYS[present[np.argmax(weekday_avgs[present])]],
+        "worst_weekday": WEEKDAYS[present[np.argmin(weekday_avgs[present])]]
+    }
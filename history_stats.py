@@ -0,0 +1,89 @@
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class HistoryStats:
+    """单个用户历史人品值的增量聚合
+
+    按日期升序保存 (日期, 人品值)，同时维护全部记录的 count/sum/min/max，以及最近 window 条记录的
+    同类统计。按日期顺序追加（每天一条的常见情况）时全量统计是O(1)更新，窗口统计在写入时重算一次（O(window)），
+    读取都是O(1)。补录早于最新日期的记录或删除记录时会重算受影响的部分。
+    """
+
+    def __init__(self, window: int = 30, entries: Iterable[Tuple[str, int]] = ()):
+        self.window = max(1, window)
+        entries = sorted(entries)
+        self.dates: List[str] = [day for day, _ in entries]
+        self.values: List[int] = [value for _, value in entries]
+        self._recompute_totals()
+        self._recompute_window()
+
+    @property
+    def count(self) -> int:
+        return len(self.values)
+
+    def put(self, day: str, jrrp: int):
+        if not self.dates or day > self.dates[-1]:
+            # 常见情况：按日期顺序追加
+            self.dates.append(day)
+            self.values.append(jrrp)
+            self.total += jrrp
+            self.min = jrrp if self.min is None else min(self.min, jrrp)
+            self.max = jrrp if self.max is None else max(self.max, jrrp)
+        else:
+            i = bisect_left(self.dates, day)
+            if i < len(self.dates) and self.dates[i] == day:
+                self.values[i] = jrrp
+            else:
+                self.dates.insert(i, day)
+                self.values.insert(i, jrrp)
+            self._recompute_totals()
+        self._recompute_window()
+
+    def remove(self, day: str) -> bool:
+        i = bisect_left(self.dates, day)
+        if i >= len(self.dates) or self.dates[i] != day:
+            return False
+        del self.dates[i]
+        del self.values[i]
+        self._recompute_totals()
+        self._recompute_window()
+        return True
+
+    def _recompute_totals(self):
+        self.total = sum(self.values)
+        self.min = min(self.values) if self.values else None
+        self.max = max(self.values) if self.values else None
+
+    def _recompute_window(self):
+        recent = self.values[-self.window:]
+        self.window_count = len(recent)
+        self.window_sum = sum(recent)
+        self.window_min = min(recent) if recent else None
+        self.window_max = max(recent) if recent else None
+
+    @property
+    def avg(self) -> float:
+        return round(self.total / self.count, 1) if self.values else 0
+
+    @property
+    def window_avg(self) -> float:
+        return round(self.window_sum / self.window_count, 1) if self.window_count else 0
+
+    def latest_dates(self, limit: Optional[int] = None) -> List[str]:
+        """按日期从新到旧返回最近limit个日期"""
+        start = 0 if limit is None else max(0, len(self.dates) - limit)
+        return self.dates[start:][::-1]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": self.avg,
+            "min": self.min,
+            "max": self.max,
+            "window": self.window,
+            "window_count": self.window_count,
+            "window_avg": self.window_avg,
+            "window_min": self.window_min,
+            "window_max": self.window_max
+        }
@@ -0,0 +1,131 @@
+import hashlib
+from datetime import date
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+ALGORITHMS = ("random", "hash", "normal", "lucky", "challenge")
+
+# 每个用户每天最多使用的随机数个数（lucky算法需要 8+2 个均匀分布随机数）
+_STREAM_LENGTH = 10
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+# 2^64 mod 101，用于把md5的128位整数拆成两个64位分量后取模
+_TWO64_MOD_101 = (1 << 64) % 101
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """对uint64数组逐元素做splitmix64混合"""
+    with np.errstate(over='ignore'):
+        z = x + _GOLDEN
+        z = (z ^ (z >> np.uint64(30))) * _MIX1
+        z = (z ^ (z >> np.uint64(27))) * _MIX2
+        return z ^ (z >> np.uint64(31))
+
+
+def _user_key(user_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(user_id.encode(), digest_size=8).digest(), 'little')
+
+
+class JrrpEngine:
+    """批量计算人品值
+
+    每个 (用户, 日期) 拥有一条独立的随机数流：由引擎的根种子(SeedSequence)、用户ID哈希、日期序号
+    和重抽次数混合出流的起点，流中第i个随机数为 splitmix64(起点 + i)。整批用户的随机数和分布变换
+    都在一次NumPy数组运算中完成，不读写全局 random / np.random 的状态。
+
+    同一引擎对同一 (用户, 日期) 的结果是确定的，因此可以在日初预先计算；`reroll()` 让某个用户
+    当天换一条新的随机数流（初始化今日记录后重新抽取）。hash算法保持原有的md5结果不变。
+    """
+
+    def __init__(self, algorithm: str = "random", entropy: Optional[int] = None):
+        self.algorithm = algorithm if algorithm in ALGORITHMS else "random"
+        self.seed_sequence = np.random.SeedSequence(entropy)
+        self._root = np.uint64(self.seed_sequence.generate_state(1, np.uint64)[0])
+        # 当天被重新抽取的用户 -> 重抽次数
+        self._epochs: Dict[str, int] = {}
+        self._epoch_day = ""
+
+    @staticmethod
+    def user_keys(user_ids: Sequence[str]) -> np.ndarray:
+        """用户ID的64位哈希，同一批用户跨多天计算时可以只算一次"""
+        return np.fromiter((_user_key(uid) for uid in user_ids), dtype=np.uint64, count=len(user_ids))
+
+    def compute(self, user_ids: Sequence[str], day: str, keys: Optional[np.ndarray] = None) -> np.ndarray:
+        """计算一批用户在某天的人品值，返回int数组；keys为user_keys(user_ids)的预计算结果"""
+        if not len(user_ids):
+            return np.zeros(0, dtype=np.int64)
+        if self.algorithm == "hash":
+            return self._hash_values(user_ids, day)
+
+        uniforms = self._uniforms(user_ids, day, keys)
+        if self.algorithm == "normal":
+            # 均值50，标准差20的正态分布（Box-Muller），截断到0-100
+            z = np.sqrt(-2.0 * np.log1p(-uniforms[:, 0])) * np.cos(2.0 * np.pi * uniforms[:, 1])
+            values = np.clip((50 + 20 * z).astype(np.int64), 0, 100)
+        elif self.algorithm == "lucky":
+            # Beta(8, 2) = X / (X + Y)，X~Gamma(8)，Y~Gamma(2)，整数形状的Gamma由指数分布求和得到
+            logs = -np.log1p(-uniforms)
+            x = logs[:, :8].sum(axis=1)
+            y = logs[:, 8:10].sum(axis=1)
+            values = (x / (x + y) * 100).astype(np.int64)
+        elif self.algorithm == "challenge":
+            # 30%概率获得极端值（极低0-20、极高80-100各半），否则为21-79
+            extreme = uniforms[:, 0] < 0.3
+            low = uniforms[:, 1] < 0.5
+            pick = uniforms[:, 2]
+            values = np.where(
+                extreme,
+                np.where(low, (pick * 21).astype(np.int64), 80 + (pick * 21).astype(np.int64)),
+                21 + (pick * 59).astype(np.int64)
+            )
+        else:
+            values = (uniforms[:, 0] * 101).astype(np.int64)
+        return values
+
+    def compute_one(self, user_id: str, day: str) -> int:
+        """单次查询，即批大小为1的compute"""
+        return int(self.compute([user_id], day)[0])
+
+    def reroll(self, user_id: str, day: str):
+        """让用户当天换一条新的随机数流"""
+        self._roll_epochs(day)
+        self._epochs[user_id] = self._epochs.get(user_id, 0) + 1
+
+    def rerolled(self, user_id: str, day: str) -> bool:
+        """用户当天是否换过随机数流（换过之后预先计算的结果失效）"""
+        return day == self._epoch_day and user_id in self._epochs
+
+    def _roll_epochs(self, day: str):
+        if day != self._epoch_day:
+            self._epoch_day = day
+            self._epochs.clear()
+
+    def _uniforms(self, user_ids: Sequence[str], day: str, keys: Optional[np.ndarray] = None) -> np.ndarray:
+        """返回形状为 (用户数, _STREAM_LENGTH) 的 [0, 1) 均匀分布随机数"""
+        self._roll_epochs(day)
+        if keys is None:
+            keys = self.user_keys(user_ids)
+        if self._epochs:
+            epochs = np.fromiter((self._epochs.get(uid, 0) for uid in user_ids), dtype=np.uint64, count=len(user_ids))
+        else:
+            epochs = np.uint64(0)
+        day_ordinal = np.uint64(date.fromisoformat(day).toordinal())
+
+        with np.errstate(over='ignore'):
+            start = _splitmix64(_splitmix64(_splitmix64(keys ^ self._root) + day_ordinal) + epochs)
+            counters = start[:, None] + np.arange(_STREAM_LENGTH, dtype=np.uint64)[None, :]
+        bits = _splitmix64(counters)
+        return (bits >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+    @staticmethod
+    def _hash_values(user_ids: Sequence[str], day: str) -> np.ndarray:
+        """md5(f"{user_id}_{day}") % 101，按高低64位分别取模后合并"""
+        digests = b"".join(hashlib.md5(f"{uid}_{day}".encode()).digest() for uid in user_ids)
+        halves = np.frombuffer(digests, dtype=">u8").reshape(-1, 2)
+        high = (halves[:, 0] % np.uint64(101)).astype(np.int64)
+        low = (halves[:, 1] % np.uint64(101)).astype(np.int64)
+        return (high * _TWO64_MOD_101 + low) % 101
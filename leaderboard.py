@@ -0,0 +1,63 @@
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class GroupLeaderboards:
+    """按群维护的今日排行榜
+
+    每个群保存一个按 (-人品值, 查询时间, user_id) 排好序的列表，新记录插入时用二分查找定位，
+    取前k名是O(k)的切片，查询某人名次是一次O(log n)的二分查找，不需要每次排序全部记录。
+    """
+
+    def __init__(self, day: str = ""):
+        self.day = day
+        # group_id -> 有序的排序键列表
+        self._boards: Dict[str, List[Tuple[int, str, str]]] = {}
+        # group_id -> {user_id: (排序键, 展示信息)}
+        self._entries: Dict[str, Dict[str, Tuple[Tuple[int, str, str], Dict[str, Any]]]] = {}
+
+    def reset(self, day: str):
+        """切换日期时清空所有排行榜"""
+        self.day = day
+        self._boards.clear()
+        self._entries.clear()
+
+    def add(self, group_id: str, user_id: str, record: Dict[str, Any]):
+        """加入一条今日记录，私聊记录(group_id为空)不参与排行"""
+        if not group_id:
+            return
+        self.remove(group_id, user_id)
+        key = (-record["jrrp"], record.get("timestamp", ""), user_id)
+        info = {
+            "nickname": record.get("nickname", "未知"),
+            "jrrp": record["jrrp"],
+            "fortune": record.get("fortune", "未知")
+        }
+        insort(self._boards.setdefault(group_id, []), key)
+        self._entries.setdefault(group_id, {})[user_id] = (key, info)
+
+    def remove(self, group_id: str, user_id: str):
+        entries = self._entries.get(group_id)
+        if not entries or user_id not in entries:
+            return
+        key, _ = entries.pop(user_id)
+        board = self._boards[group_id]
+        del board[bisect_left(board, key)]
+
+    def top(self, group_id: str, k: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """返回前k名的 (user_id, 展示信息)"""
+        entries = self._entries.get(group_id, {})
+        return [(key[2], entries[key[2]][1]) for key in self._boards.get(group_id, [])[:k]]
+
+    def position(self, group_id: str, user_id: str) -> Optional[int]:
+        """返回用户在群内的名次（从1开始），今天未查询时返回None"""
+        entry = self._entries.get(group_id, {}).get(user_id)
+        if entry is None:
+            return None
+        return bisect_left(self._boards[group_id], entry[0]) + 1
+
+    def group_count(self) -> int:
+        return len(self._entries)
+
+    def size(self, group_id: str) -> int:
+        return len(self._boards.get(group_id, []))
@@ -0,0 +1,220 @@
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from astrbot.api import logger
+
+
+# 当前调用的截止时间（事件循环时间），客户端据此限制每次请求和重试的耗时
+_deadline: ContextVar[Optional[float]] = ContextVar("daily_fortune_llm_deadline", default=None)
+
+
+def remaining_time() -> Optional[float]:
+    """当前调度器调用距截止时间还剩的秒数，不在调度器中调用时返回None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+
+class LLMUnavailable(Exception):
+    """调度器拒绝或放弃了这次调用（队列已满、超时、熔断），调用方应使用备用文本"""
+
+
+class LLMScheduler:
+    """插件内共享的LLM调用调度器
+
+    - 同时进行的调用数不超过 max_in_flight，其余按先来后到排队，队列长度超过 max_queue 时直接拒绝
+    - 每次调用从进入调度器开始计算截止时间，排队和调用本身共用 timeout 秒；
+      调用内部可以用 remaining_time() 取得剩余时间（第三方接口客户端据此设置每次请求的超时）
+    - 熔断器统计最近 window 次调用，错误率或平均耗时超过阈值时熔断 cooldown 秒，
+      期间所有调用直接拒绝；冷却结束后放行一次试探调用，成功则恢复，失败则继续熔断
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 32, timeout: float = 30.0,
+                 window: int = 20, min_calls: int = 5, error_threshold: float = 0.5,
+                 latency_threshold: float = 20.0, cooldown: float = 30.0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.min_calls = max(1, min_calls)
+        self.error_threshold = error_threshold
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # 最近调用结果 (是否成功, 耗时秒)
+        self._outcomes: Deque[tuple] = deque(maxlen=max(self.min_calls, window))
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_running = False
+
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.short_circuited = 0
+        self.max_queue_seen = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """在调度器的并发限制、截止时间和熔断保护下执行一次调用"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        probe = self._admit()
+
+        try:
+            await self._acquire(deadline)
+        except BaseException:
+            if probe:
+                self._probe_running = False
+            raise
+
+        start = time.perf_counter()
+        token = _deadline.set(deadline)
+        try:
+            result = await asyncio.wait_for(call(), timeout=max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._record(False, time.perf_counter() - start, probe)
+            raise LLMUnavailable(f"调用超过 {self.timeout:g}s 截止时间")
+        except asyncio.CancelledError:
+            if probe:
+                self._probe_running = False
+            raise
+        except Exception:
+            self._record(False, time.perf_counter() - start, probe)
+            raise
+        else:
+            self._record(True, time.perf_counter() - start, probe)
+            return result
+        finally:
+            _deadline.reset(token)
+            self._release()
+
+    def _admit(self) -> bool:
+        """检查熔断器状态，返回本次调用是否为半开状态下的试探调用"""
+        self.calls += 1
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                self.short_circuited += 1
+                raise LLMUnavailable("熔断中")
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probe_running:
+                self.short_circuited += 1
+                raise LLMUnavailable("熔断恢复试探中")
+            self._probe_running = True
+            return True
+        return False
+
+    async def _acquire(self, deadline: float):
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LLMUnavailable(f"等待队列已满({self.max_queue})")
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        self.max_queue_seen = max(self.max_queue_seen, len(self._waiters))
+        logger.debug(f"[daily_fortune] LLM调用排队中，进行中 {self._in_flight}，排队 {len(self._waiters)}")
+        try:
+            await asyncio.wait_for(waiter, timeout=max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._abandon(waiter)
+            raise LLMUnavailable("排队超过截止时间")
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: asyncio.Future):
+        """放弃排队；如果名额已经转交给了这个waiter，则继续转交给下一个"""
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+        elif waiter.done() and not waiter.cancelled():
+            self._release()
+
+    def _release(self):
+        # 名额直接转交给队首，in_flight计数不变
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _record(self, success: bool, elapsed: float, probe: bool):
+        if success:
+            self.successes += 1
+        else:
+            self.failures += 1
+
+        if probe:
+            self._probe_running = False
+            if success and elapsed < self.latency_threshold:
+                self._outcomes.clear()
+                self._set_state(self.CLOSED)
+            else:
+                self._trip()
+            return
+
+        self._outcomes.append((success, elapsed))
+        if self.state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+            error_rate, avg_latency = self._window_stats()
+            if error_rate >= self.error_threshold or avg_latency >= self.latency_threshold:
+                self._trip()
+
+    def _trip(self):
+        self._opened_at = time.monotonic()
+        self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        error_rate, avg_latency = self._window_stats()
+        logger.warning(f"[daily_fortune] LLM熔断器 {self.state} -> {state}"
+                       f"（错误率 {error_rate:.0%}，平均耗时 {avg_latency:.1f}s，排队 {self.queued}）")
+        self.state = state
+
+    def _window_stats(self) -> tuple:
+        if not self._outcomes:
+            return 0.0, 0.0
+        errors = sum(1 for ok, _ in self._outcomes if not ok)
+        latency = sum(elapsed for _, elapsed in self._outcomes) / len(self._outcomes)
+        return errors / len(self._outcomes), latency
+
+    def stats(self) -> Dict[str, Any]:
+        error_rate, avg_latency = self._window_stats()
+        return {
+            "state": self.state,
+            "in_flight": self._in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queue_seen,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "short_circuited": self.short_circuited,
+            "window_error_rate": round(error_rate, 3),
+            "window_avg_latency_ms": round(avg_latency * 1000, 1)
+        }
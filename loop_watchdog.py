@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Deque, Dict, Iterator, List, Tuple
+
+from astrbot.api import logger
+
+from .metrics import LatencyHistogram, format_duration
+
+# 卡顿期间没有任何插件阶段在运行时的归属名（其他插件或AstrBot本身）
+OTHER = "其他"
+
+_NULL = nullcontext()
+
+
+class LoopWatchdog:
+    """事件循环延迟监控
+
+    后台任务每隔interval秒醒来一次，实际醒来时间比预期晚多少就是这段时间内事件循环被阻塞的时长。
+    插件中同步执行的代码段用 blocking(名称) 标记，结束时记录 (名称, 开始, 结束)；
+    延迟超过阈值时，按与阻塞窗口的重叠时长把卡顿归到各个阶段，没有重叠的部分记为"其他"。
+
+    blocking() 只用于不含await的代码段：含await的代码段在等待期间并不阻塞事件循环，
+    但仍会与其他代码造成的卡顿重叠，导致误判。未开启时 blocking() 返回共享的空上下文。
+    """
+
+    def __init__(self, enabled: bool = False, interval: float = 0.05, threshold_ms: float = 100,
+                 max_events: int = 20):
+        self.enabled = enabled
+        self.interval = max(0.01, interval)
+        self.threshold_ms = threshold_ms
+        # 最近结束的同步代码段 (名称, 开始, 结束)，只需覆盖最长的一次卡顿
+        self._spans: Deque[Tuple[str, float, float]] = deque(maxlen=256)
+        self.recent: Deque[Tuple[float, float, str]] = deque(maxlen=max(1, max_events))
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self.lag = LatencyHistogram()
+        self.stalls = 0
+        # 阶段 -> [卡顿次数(主要归属), 阻塞累计ms, 单次最长ms]
+        self.by_phase: Dict[str, List[float]] = {}
+        self.recent.clear()
+
+    @contextmanager
+    def _track(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._spans.append((name, start, time.perf_counter()))
+
+    def blocking(self, name: str):
+        """标记一段同步执行的代码"""
+        return self._track(name) if self.enabled else _NULL
+
+    async def run(self, stop_event: asyncio.Event):
+        while not stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                return
+            now = time.perf_counter()
+            lag_ms = max(0.0, (now - start - self.interval) * 1000)
+            self.lag.observe(lag_ms)
+            if lag_ms >= self.threshold_ms:
+                self._record_stall(now - lag_ms / 1000, now, lag_ms)
+
+    def _record_stall(self, window_start: float, window_end: float, lag_ms: float):
+        overlaps: Dict[str, float] = {}
+        for name, start, end in self._spans:
+            if end <= window_start or start >= window_end:
+                continue
+            overlap = (min(end, window_end) - max(start, window_start)) * 1000
+            overlaps[name] = overlaps.get(name, 0.0) + overlap
+        attributed = sum(overlaps.values())
+        if lag_ms - attributed > 0.5:
+            overlaps[OTHER] = overlaps.get(OTHER, 0.0) + lag_ms - attributed
+        main_phase = max(overlaps, key=overlaps.get)
+
+        self.stalls += 1
+        for name, ms in overlaps.items():
+            entry = self.by_phase.setdefault(name, [0, 0.0, 0.0])
+            entry[1] += ms
+            entry[2] = max(entry[2], ms)
+        self.by_phase[main_phase][0] += 1
+        self.recent.append((time.time(), lag_ms, main_phase))
+        logger.warning(f"[daily_fortune] 事件循环阻塞 {lag_ms:.0f}ms，主要来自: {main_phase} "
+                       f"({', '.join(f'{name} {ms:.0f}ms' for name, ms in overlaps.items())})")
+
+    def summary(self) -> str:
+        lines = [f"⏱️ 事件循环监控（统计 {format_duration(time.time() - self.started_at)}，"
+                 f"采样间隔 {self.interval * 1000:.0f}ms）",
+                 f"延迟: p50 {self.lag.quantile(0.5):.1f}ms / p99 {self.lag.quantile(0.99):.1f}ms / "
+                 f"最大 {self.lag.max_ms:.1f}ms",
+                 f"超过 {self.threshold_ms:g}ms 的卡顿: {self.stalls} 次"]
+        if self.by_phase:
+            lines.append("━━ 按阶段 ━━")
+            for name, (count, total, longest) in sorted(self.by_phase.items(), key=lambda x: -x[1][1]):
+                lines.append(f"{name}: 主因 {count:.0f} 次，累计阻塞 {total:.0f}ms，单次最长 {longest:.0f}ms")
+        if self.recent:
+            lines.append("━━ 最近卡顿 ━━")
+            for at, lag_ms, phase in reversed(self.recent):
+                lines.append(f"{datetime.fromtimestamp(at).strftime('%m-%d %H:%M:%S')} {lag_ms:.0f}ms {phase}")
+        return "\n".join(lines)
@@ -1,16 +1,56 @@
 import json
 import asyncio
-import random
-import hashlib
-import numpy as np
-from datetime import datetime, date
+import re
+import time
+from datetime import datetime, date, timedelta
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger, AstrBotConfig
 import astrbot.api.message_components as Comp
 
+from .storage import create_store, WriteBehindWorker
+from .leaderboard import GroupLeaderboards
+from .text_pool import TextPool
+from .llm_scheduler import LLMScheduler, LLMUnavailable
+from .openai_client import OpenAICompatibleClient
+from .jrrp_engine import JrrpEngine
+from .fortune_levels import FortuneTable, parse_ranges
+from .templates import compile_templates
+from .profile_cache import ProfileCache
+from .history_columns import analyze_history
+from .rollups import GroupRollups, period_label
+from .score_histogram import ScoreHistograms
+from .metrics import Metrics, timed_command
+from .loop_watchdog import LoopWatchdog
+from .profiler import HandlerProfiler, structure_sizes, format_sizes
+
+# LLM不可用时使用的备用文本
+FALLBACK_PROCESS = "水晶球中浮现出神秘的光芒..."
+FALLBACK_ADVICE = "保持乐观的心态，好运自然来。"
+
+# 多日排行榜的周期别名、标题和默认最少参与天数
+RANK_PERIOD_ALIASES = {
+    "week": "week", "周": "week", "本周": "week",
+    "month": "month", "月": "month", "本月": "month",
+    "all": "all", "总": "all", "总榜": "all"
+}
+RANK_PERIOD_TITLES = {"week": "本周人品排行榜", "month": "本月人品排行榜", "all": "人品总排行榜"}
+RANK_MIN_DAYS = {"week": 3, "month": 10, "all": 30}
+
+# 接口拒绝请求本身时的状态码，可能是不支持system角色
+REJECTED_STATUS = {400, 422}
+
+
+def _system_prompt_rejected(error: Exception) -> bool:
+    """错误是否可能由system_prompt引起：provider不接受该参数，或接口以400/422拒绝了请求"""
+    if isinstance(error, TypeError):
+        return True
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    return status in REJECTED_STATUS
+
 
 @register(
     "astrbot_plugin_daily_fortune1",
@@ -22,31 +62,137 @@ import astrbot.api.message_components as Comp
 class DailyFortunePlugin(Star):
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
+        init_start = time.perf_counter()
         self.config = config
+        # 运行指标（指令/阶段耗时、LLM结果、持久化耗时和字节数）
+        metrics_config = self.config.get("metrics", {})
+        self.metrics = Metrics(enabled=metrics_config.get("enable", True))
+        # 事件循环延迟监控，把卡顿归到插件中同步执行的阶段
+        watchdog_config = self.config.get("loop_watchdog", {})
+        self.watchdog = LoopWatchdog(
+            enabled=watchdog_config.get("enable", False),
+            interval=watchdog_config.get("interval_ms", 50) / 1000,
+            threshold_ms=watchdog_config.get("threshold_ms", 100),
+            max_events=watchdog_config.get("max_events", 20)
+        )
         self.data_dir = Path("data/plugin_data/astrbot_plugin_daily_fortune1")
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        # 按需开启的cProfile/tracemalloc分析，结果写入 profiles/ 目录
+        self.profiler = HandlerProfiler(self.data_dir / "profiles")
+        self._profile_timeout_task: Optional[asyncio.Task] = None
+        self._tracing_started = False
+
+        # 日期边界按配置的时区计算，未配置时使用服务器本地时区
+        rollover_config = self.config.get("day_rollover", {})
+        self._timezone = self._load_timezone(rollover_config.get("timezone", ""))
 
         # 数据文件路径
-        self.fortune_file = self.data_dir / "daily_fortune.json"
+        self.fortune_file = self.data_dir / "daily_fortune.json"  # 旧版单文件，加载时自动拆分为日期分区
         self.history_file = self.data_dir / "fortune_history.json"
 
-        # 加载数据
-        self.daily_data = self._load_data(self.fortune_file)
-        self.history_data = self._load_data(self.history_file)
-
-        # 初始化运势等级映射
+        # 加载数据（json: 快照 + journal重放；sqlite: 打开数据库）
+        storage_config = self.config.get("storage", {})
+        self.store = create_store(storage_config.get("backend", "json"), self.data_dir,
+                                  self.fortune_file, self.history_file,
+                                  history_cache_shards=storage_config.get("history_cache_shards", 16),
+                                  history_window=self.config.get("history_days", 30))
+        self._current_day = self._now().strftime("%Y-%m-%d")
+        # 初始化运势等级映射（今日分数分布按分段覆盖的范围建立）
         self._init_fortune_levels()
 
+        load_start = time.perf_counter()
+        self.store.load(self._current_day)
+        load_ms = (time.perf_counter() - load_start) * 1000
+
+        # 从今日记录重建各群排行榜；周/月/总排行的汇总从文件载入，今日部分同样由今日记录重建
+        self.leaderboards = GroupLeaderboards(self._current_day)
+        low, high = self.fortune_table.bounds
+        self.score_histograms = ScoreHistograms(self._current_day, low, high)
+        self.rollups_file = self.data_dir / "rollups.json"
+        self._rollups_lock = asyncio.Lock()
+        rollups_changed = self._load_rollups()
+        for user_id, record in self.store.iter_daily(self._current_day):
+            self.leaderboards.add(record.get("group_id", ""), user_id, record)
+            self.score_histograms.add(record.get("group_id", ""), record["jrrp"])
+            self.rollups.add(record.get("group_id", ""), user_id, self._current_day,
+                             record["jrrp"], record.get("nickname", ""))
+
+        # 人品值计算引擎（每个用户独立的随机数流，不影响全局random状态）
+        self.jrrp_engine = JrrpEngine(self.config.get("jrrp_algorithm", "random"))
+
         # 初始化奖牌配置
         self._init_medals()
 
+        # 预编译所有消息模板和提示词，格式错误的在加载时回退为默认值
+        self.templates = compile_templates(self.config)
+
         # 初始化LLM提供商
         self._init_provider()
 
-        # 初始化正在处理的用户集合
-        self.processing_users = set()
+        # 正在处理的用户: user_id -> 开始处理的日期（日期切换时清理前一天遗留的标记）
+        self.processing_users: Dict[str, str] = {}
+
+        # 日初预先计算的今日人品值（day_rollover.precompute）
+        self._precomputed: Dict[str, int] = {}
+        self._precomputed_day = ""
+
+        # 用户信息缓存和rawmessage_viewer1插件句柄
+        profile_config = self.config.get("profile_cache", {})
+        self.profile_cache = ProfileCache(
+            ttl=profile_config.get("ttl", 600),
+            max_size=profile_config.get("max_size", 2000)
+        )
+        self._viewer_meta = None
+        self._viewer_instance = None
+        self._viewer_checked_at = float("-inf")
+
+        # LLM调用调度器：限制并发、排队、截止时间和熔断
+        scheduler_config = self.config.get("llm_scheduler", {})
+        self.llm_scheduler = LLMScheduler(
+            max_in_flight=scheduler_config.get("max_in_flight", 4),
+            max_queue=scheduler_config.get("max_queue", 32),
+            timeout=scheduler_config.get("timeout", 30.0),
+            window=scheduler_config.get("breaker_window", 20),
+            error_threshold=scheduler_config.get("breaker_error_rate", 0.5),
+            latency_threshold=scheduler_config.get("breaker_latency", 20.0),
+            cooldown=scheduler_config.get("breaker_cooldown", 30.0)
+        )
+
+        # 预生成文本池（按运势分段+人格），关闭时为None
+        pool_config = self.config.get("text_pool", {})
+        self.text_pool = None
+        self._pool_wakeup = asyncio.Event()
+        if pool_config.get("enable", False) and self.config.get("enable_llm_calls", True):
+            self.text_pool = TextPool(
+                size=pool_config.get("pool_size", 5),
+                max_age=pool_config.get("max_age_hours", 24) * 3600
+            )
 
-        logger.info("astrbot_plugin_daily_fortune1 插件已加载")
+        # 启动延迟写入worker，写操作合并后在线程池中批量持久化
+        self.writer = WriteBehindWorker(
+            self.store,
+            flush_interval=self.config.get("storage", {}).get("flush_interval", 1.0),
+            max_pending=self.config.get("storage", {}).get("max_pending_writes", 1000),
+            metrics=self.metrics
+        )
+        self.writer.start()
+
+        # 启动后台journal压缩任务，并清理一次过期的每日分区
+        self._stop_event = asyncio.Event()
+        self._maintenance_lock = asyncio.Lock()
+        self._compact_task = asyncio.create_task(self._compact_loop())
+        self._pool_task = asyncio.create_task(self._refill_text_pool()) if self.text_pool else None
+        asyncio.create_task(self._apply_retention())
+        if rollups_changed:
+            asyncio.create_task(self._save_rollups())
+        self._metrics_task = asyncio.create_task(self._export_metrics_loop()) \
+            if self.metrics.enabled and metrics_config.get("prometheus_interval", 0) > 0 else None
+        self._watchdog_task = asyncio.create_task(self.watchdog.run(self._stop_event)) \
+            if self.watchdog.enabled else None
+        self._rollover_task = asyncio.create_task(self._rollover_loop())
+
+        init_ms = (time.perf_counter() - init_start) * 1000
+        logger.info(f"astrbot_plugin_daily_fortune1 插件已加载，耗时 {init_ms:.1f}ms（数据加载 {load_ms:.1f}ms）")
 
     def _check_group_whitelist(self, event: AstrMessageEvent) -> bool:
         """检查群聊白名单"""
@@ -78,17 +224,8 @@ class DailyFortunePlugin(Star):
     def _parse_ranges_string(self, ranges_str: str) -> List[List[int]]:
         """解析人品值分段字符串"""
         try:
-            ranges = []
-            parts = [part.strip() for part in ranges_str.split(',')]
-            for part in parts:
-                if '-' in part:
-                    min_val, max_val = part.split('-', 1)
-                    ranges.append([int(min_val.strip()), int(max_val.strip())])
-                else:
-                    # 如果没有'-'，则认为是单个值
-                    val = int(part.strip())
-                    ranges.append([val, val])
-            return ranges
+            # 支持单个值和负数分段，如 "-10--1, 0, 1-1000"
+            return [[low, high] for low, high in parse_ranges(ranges_str)]
         except Exception as e:
             logger.error(f"[daily_fortune] 解析人品值分段失败: {e}")
             return []
@@ -120,8 +257,8 @@ class DailyFortunePlugin(Star):
         self.ranges_fortune_str = fortune_names_str
         self.ranges_emoji_str = fortune_emojis_str
 
-        # 构建运势等级映射
-        self.fortune_levels = {}
+        # 构建运势等级列表
+        levels = []
 
         for i, range_config in enumerate(jrrp_ranges_config):
             if len(range_config) >= 2:
@@ -132,23 +269,41 @@ class DailyFortunePlugin(Star):
                 fortune_name = fortune_names_config[i] if i < len(fortune_names_config) else "未知"
                 fortune_emoji = fortune_emojis_config[i] if i < len(fortune_emojis_config) else "❓"
 
-                self.fortune_levels[(min_val, max_val)] = (fortune_name, fortune_emoji)
+                levels.append((min_val, max_val, fortune_name, fortune_emoji))
+
+        if len(fortune_names_config) != len(levels) or len(fortune_emojis_config) != len(levels):
+            logger.warning(f"[daily_fortune] 运势分段数({len(levels)})与运势描述数({len(fortune_names_config)})"
+                           f"或emoji数({len(fortune_emojis_config)})不一致")
 
         # 如果配置为空或无效，使用默认配置
-        if not self.fortune_levels:
-            self.fortune_levels = {
-                (0, 1): ("极凶", "💀"),
-                (2, 10): ("大凶", "😨"),
-                (11, 20): ("凶", "😰"),
-                (21, 30): ("小凶", "😟"),
-                (31, 40): ("末吉", "😐"),
-                (41, 60): ("小吉", "🙂"),
-                (61, 80): ("中吉", "😊"),
-                (81, 98): ("大吉", "😄"),
-                (99, 100): ("极吉", "🤩")
-            }
+        if not levels:
+            levels = [
+                (0, 1, "极凶", "💀"),
+                (2, 10, "大凶", "😨"),
+                (11, 20, "凶", "😰"),
+                (21, 30, "小凶", "😟"),
+                (31, 40, "末吉", "😐"),
+                (41, 60, "小吉", "🙂"),
+                (61, 80, "中吉", "😊"),
+                (81, 98, "大吉", "😄"),
+                (99, 100, "极吉", "🤩")
+            ]
+
+        # 编译为数组查找表，并报告分段中的空隙和重叠
+        self.fortune_table = FortuneTable(levels)
+        if self.fortune_table.sparse:
+            low, high = self.fortune_table.bounds
+            logger.error(f"[daily_fortune] 人品值分段覆盖 {low}~{high}，跨度过大，请检查 ranges_jrrp 配置是否写错；"
+                         f"已改用按分段边界查找")
+        for problem in self.fortune_table.report():
+            logger.warning(f"[daily_fortune] 运势分段配置问题: {problem}")
+
+        self.fortune_levels = {}
+        for min_val, max_val, fortune_name, fortune_emoji in levels:
+            self.fortune_levels.setdefault((min_val, max_val), (fortune_name, fortune_emoji))
 
-        logger.info(f"[daily_fortune] 运势等级映射已初始化，共 {len(self.fortune_levels)} 个等级")
+        low, high = self.fortune_table.bounds
+        logger.info(f"[daily_fortune] 运势等级映射已初始化，共 {len(levels)} 个等级，覆盖 {low}~{high}")
 
     def _init_medals(self):
         """初始化奖牌配置"""
@@ -237,6 +392,7 @@ class DailyFortunePlugin(Star):
     def _init_provider(self):
         """初始化LLM提供商"""
         provider_id = self.config.get("llm_provider_id", "")
+        self.api_client = None
 
         if provider_id:
             try:
@@ -274,9 +430,18 @@ class DailyFortunePlugin(Star):
             api_config = self.config.get("llm_api", {})
             if api_config.get("llm_api_key") and api_config.get("llm_url"):
                 logger.info(f"[daily_fortune] 配置了第三方接口: {api_config['llm_url']}")
-                # 创建自定义provider
+                # 创建第三方接口客户端，作为provider使用
+                self.api_client = OpenAICompatibleClient(
+                    api_config['llm_url'],
+                    api_config['llm_api_key'],
+                    model=api_config.get('model', 'gpt-3.5-turbo'),
+                    max_connections=api_config.get('max_connections', 10),
+                    timeout=api_config.get('timeout', 10.0),
+                    max_retries=api_config.get('max_retries', 2),
+                    retry_backoff=api_config.get('retry_backoff', 0.5)
+                )
+                self.provider = self.api_client
                 asyncio.create_task(self._test_third_party_api(api_config))
-                self.provider = None
             else:
                 self.provider = None
 
@@ -335,221 +500,352 @@ class DailyFortunePlugin(Star):
 
     async def _test_third_party_api(self, api_config):
         """测试第三方API连接"""
-        try:
-            import aiohttp
-
-            # 智能处理URL
-            url = api_config['llm_url'].rstrip('/')
-            if not url.endswith('/chat/completions'):
-                if url.endswith('/v1'):
-                    url += '/chat/completions'
-                else:
-                    url += '/v1/chat/completions'
-
-            headers = {
-                'Authorization': f"Bearer {api_config['llm_api_key']}",
-                'Content-Type': 'application/json'
-            }
-
-            data = {
-                'model': api_config.get('model', 'gpt-3.5-turbo'),
-                'messages': [{'role': 'user', 'content': 'REPLY `PONG` ONLY'}],
-                'max_tokens': 10
-            }
+        if await self.api_client.ping():
+            logger.info(f"[daily_fortune] 第三方API连接测试成功: {api_config['llm_url']}")
+
+    async def _compact_loop(self):
+        """后台定期把journal合并进快照文件"""
+        storage_config = self.config.get("storage", {})
+        interval = storage_config.get("compact_interval", 300)
+        threshold = storage_config.get("compact_threshold", 500)
+        elapsed = 0
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
+            elapsed += 5
+            pending = self.store.pending_records
+            if pending >= threshold or (pending and elapsed >= interval):
+                await self._compact_store()
+                elapsed = 0
+
+    async def _compact_store(self):
+        """在线程池中执行一次journal压缩"""
+        async with self._maintenance_lock:
+            with self.watchdog.blocking("compact"):
+                job = self.store.begin_compaction()
+            if not job:
+                return
+            try:
+                with self.metrics.time("save", "compact"):
+                    await asyncio.to_thread(job)
+                with self.watchdog.blocking("compact"):
+                    self.store.finish_compaction()
+                logger.debug("[daily_fortune] journal压缩完成")
+            except Exception as e:
+                self.store.finish_compaction(success=False)
+                logger.error(f"[daily_fortune] journal压缩失败: {e}")
+
+    async def _apply_retention(self):
+        """按保留天数归档或删除过期的每日分区"""
+        storage_config = self.config.get("storage", {})
+        retention_days = storage_config.get("daily_retention_days", 0)
+        if retention_days <= 0:
+            return
+        mode = storage_config.get("daily_retention_mode", "archive")
+        cutoff = date.fromisoformat(self._current_day) - timedelta(days=retention_days - 1)
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=data, timeout=10) as resp:
-                    if resp.status == 200:
-                        logger.info(f"[daily_fortune] 第三方API连接测试成功: {api_config['llm_url']}")
-                    else:
-                        text = await resp.text()
-                        logger.warning(f"[daily_fortune] 第三方API连接测试失败: {resp.status} - {text}")
-        except Exception as e:
-            logger.error(f"[daily_fortune] 第三方API连接测试失败: {e}")
+        async with self._maintenance_lock:
+            job = self.store.apply_retention(cutoff.strftime("%Y-%m-%d"), mode)
+            if not job:
+                return
+            try:
+                await asyncio.to_thread(job)
+            except Exception as e:
+                logger.error(f"[daily_fortune] 清理过期每日分区失败: {e}")
 
-    def _load_data(self, file_path: Path) -> Dict:
-        """加载JSON数据"""
+    def _load_timezone(self, name: str):
+        """解析时区名称（如 Asia/Shanghai），为空或无效时返回None（使用服务器本地时区）"""
+        if not name:
+            return None
         try:
-            if file_path.exists():
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            logger.error(f"[daily_fortune] 无效的时区 {name}，将使用服务器本地时区"
+                         f"（Windows上可能需要安装tzdata）: {e}")
+            return None
+
+    def _now(self) -> datetime:
+        """配置时区的当前时间，未配置时区时为服务器本地时间"""
+        return datetime.now(self._timezone)
+
+    async def _rollover_loop(self):
+        """在配置时区的零点切换日期，不必等到当天第一次查询"""
+        while not self._stop_event.is_set():
+            now = self._now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo)
+            # 按时间戳计算间隔，夏令时切换当天也准确；最多睡10分钟，系统时间被调整后能及时纠正
+            delay = max(0.0, midnight.timestamp() - now.timestamp())
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=min(delay + 0.05, 600))
+            except asyncio.TimeoutError:
+                pass
+            if not self._stop_event.is_set():
+                self._get_today_key()
+
+    def _roll_over(self, today: str):
+        """日期变化时封存前一天的数据并重置今日结构"""
+        logger.info(f"[daily_fortune] 日期切换: {self._current_day} -> {today}")
+        previous = self._current_day
+        with self.watchdog.blocking("rollover"):
+            # 把前一天的记录计入周/月/总汇总
+            records = self.store.iter_daily(previous)
+            self.rollups.seal(previous, records)
+            self._current_day = today
+            self.store.rollover(today)
+            self.leaderboards.reset(today)
+            self.score_histograms.reset(today)
+            # 前一天开始、至今没有结束的查询标记（如处理器被中途丢弃）不再阻止今天的查询
+            for user_id in [uid for uid, day in self.processing_users.items() if day != today]:
+                del self.processing_users[user_id]
+            self._precomputed = {}
+            self._precomputed_day = today
+        asyncio.create_task(self._apply_retention())
+        asyncio.create_task(self._save_rollups())
+        # 尽快把前一天的分区写回文件并移出内存
+        if self.store.pending_records:
+            asyncio.create_task(self._compact_store())
+        if self.config.get("day_rollover", {}).get("precompute", False):
+            asyncio.create_task(self._precompute_jrrp(today, [user_id for user_id, _ in records]))
+
+    async def _precompute_jrrp(self, day: str, user_ids: List[str]):
+        """在线程池中批量计算一批用户（前一天查询过的用户）当天的人品值"""
+        if not user_ids:
+            return
+        try:
+            values = await asyncio.to_thread(self.jrrp_engine.compute, user_ids, day)
         except Exception as e:
-            logger.error(f"加载数据文件失败: {e}")
-        return {}
+            logger.error(f"[daily_fortune] 预先计算人品值失败: {e}")
+            return
+        # 计算期间日期可能又变了，或者有人已经查询/被初始化
+        if day != self._current_day:
+            return
+        for user_id, value in zip(user_ids, values.tolist()):
+            if not self.jrrp_engine.rerolled(user_id, day):
+                self._precomputed.setdefault(user_id, value)
+        logger.info(f"[daily_fortune] 已预先计算 {len(user_ids)} 个用户 {day} 的人品值")
 
-    def _save_data(self, data: Dict, file_path: Path):
-        """保存JSON数据"""
+    def _load_rollups(self) -> bool:
+        """载入周/月/总排行汇总，并封存停机期间（最多一年）还没计入的日期，返回是否有变化"""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.rollups = GroupRollups.load(self.rollups_file)
         except Exception as e:
-            logger.error(f"保存数据文件失败: {e}")
+            logger.error(f"[daily_fortune] 加载排行汇总失败，将从保留的每日记录重新统计: {e}")
+            self.rollups = GroupRollups()
+
+        today = date.fromisoformat(self._current_day)
+        day = today - timedelta(days=366)
+        if self.rollups.sealed_through:
+            day = max(day, date.fromisoformat(self.rollups.sealed_through) + timedelta(days=1))
+        sealed = 0
+        while day < today:
+            self.rollups.seal(day.isoformat(), self.store.iter_daily(day.isoformat()))
+            day += timedelta(days=1)
+            sealed += 1
+        if sealed:
+            logger.info(f"[daily_fortune] 排行汇总已补充 {sealed} 天的记录")
+        return sealed > 0
+
+    async def _save_rollups(self):
+        """在线程池中保存排行汇总（序列化在事件循环中完成，保存按调用顺序进行）"""
+        async with self._rollups_lock:
+            with self.watchdog.blocking("save"):
+                text = self.rollups.dumps()
+            try:
+                with self.metrics.time("save", "rollups"):
+                    await asyncio.to_thread(GroupRollups.write, self.rollups_file, text)
+                self.metrics.incr("save_bytes", "rollups", len(text.encode('utf-8')))
+            except Exception as e:
+                logger.error(f"[daily_fortune] 保存排行汇总失败: {e}")
 
     def _get_today_key(self) -> str:
-        """获取今日日期作为key"""
-        return date.today().strftime("%Y-%m-%d")
-
-    def _calculate_jrrp(self, user_id: str) -> int:
-        """计算今日人品值"""
-        algorithm = self.config.get("jrrp_algorithm", "random")
-        today = self._get_today_key()
-
-        if algorithm == "random":
-            # 纯随机算法（添加时间变量实现真随机）
-            current_time = datetime.now().strftime("%H:%M:%S.%f")  # 包含微秒的时间
-            seed = f"{user_id}_{today}_{current_time}"
-            random.seed(seed)
-            return random.randint(0, 100)
-
-        elif algorithm == "hash":
-            # 基于用户ID和日期的哈希算法（保持固定）
-            seed = f"{user_id}_{today}"
-            hash_value = int(hashlib.md5(seed.encode()).hexdigest(), 16)
-            return hash_value % 101
-
-        elif algorithm == "normal":
-            # 正态分布算法（中间值概率高）
-            current_time = datetime.now().strftime("%H:%M:%S.%f")
-            seed = f"{user_id}_{today}_{current_time}"
-            random.seed(seed)
-            # 均值50，标准差20的正态分布
-            value = int(np.random.normal(50, 20))
-            # 限制在0-100范围内
-            return max(0, min(100, value))
-
-        elif algorithm == "lucky":
-            # 幸运算法（高分值概率较高）
-            current_time = datetime.now().strftime("%H:%M:%S.%f")
-            seed = f"{user_id}_{today}_{current_time}"
-            random.seed(seed)
-            # 使用beta分布，α=8, β=2，偏向高分
-            value = int(np.random.beta(8, 2) * 100)
-            return value
-
-        elif algorithm == "challenge":
-            # 挑战算法（极端值概率较高）
-            current_time = datetime.now().strftime("%H:%M:%S.%f")
-            seed = f"{user_id}_{today}_{current_time}"
-            random.seed(seed)
-            # 30%概率获得极低或极高值
-            if random.random() < 0.3:
-                # 极端值
-                if random.random() < 0.5:
-                    return random.randint(0, 20)  # 极低
-                else:
-                    return random.randint(80, 100)  # 极高
-            else:
-                # 普通值
-                return random.randint(21, 79)
-        else:
-            # 默认使用random算法
-            current_time = datetime.now().strftime("%H:%M:%S.%f")  # 包含微秒的时间
-            seed = f"{user_id}_{today}_{current_time}"
-            random.seed(seed)
-            return random.randint(0, 100)
+        """获取今日日期作为key，日期变化时自动切换分区"""
+        today = self._now().strftime("%Y-%m-%d")
+        if today != self._current_day:
+            self._roll_over(today)
+        return today
+
+    def _calculate_jrrp(self, user_id: str, day: str) -> int:
+        """计算某日的人品值（批大小为1的批量计算）"""
+        if self._precomputed_day == day and user_id in self._precomputed:
+            return self._precomputed.pop(user_id)
+        with self.watchdog.blocking("jrrp_compute"):
+            return self.jrrp_engine.compute_one(user_id, day)
+
+    def _get_fortune_band(self, jrrp: int) -> Optional[Tuple[int, int]]:
+        """返回人品值所在的分段 (min, max)"""
+        return self.fortune_table.band(jrrp)
 
     def _get_fortune_info(self, jrrp: int) -> tuple:
         """根据人品值获取运势信息"""
-        # 按照配置的分段从左到右匹配
-        for (min_val, max_val), (fortune, emoji) in self.fortune_levels.items():
-            if min_val <= jrrp <= max_val:
-                return fortune, emoji
-        return "未知", "❓"
+        # 查找表与按配置分段从左到右匹配的结果一致
+        return self.fortune_table.lookup(jrrp)
+
+    def _percentile_vars(self, event: AstrMessageEvent, jrrp: int, record_group: Optional[str]) -> Dict[str, Any]:
+        """{percentile}/{group_percentile} 变量（模板引用时才计算）
+
+        record_group 为该人品值记录所在的群号，None表示还没有计入今日分布。群排名按当前会话所在的群计算，
+        私聊中 {group_percentile} 显示为 "-"。
+        """
+        group_id = "" if event.is_private_chat() else str(event.get_group_id() or "")
+        counted = record_group is not None
+        return {
+            "percentile": lambda: self._format_percentile(
+                self.score_histograms.percentile(jrrp, counted=counted)),
+            "group_percentile": lambda: self._format_percentile(
+                self.score_histograms.percentile(jrrp, group_id, counted=counted and record_group == group_id))
+        }
+
+    def _format_percentile(self, value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.0f}"
+
+    def _profile_key(self, event: AstrMessageEvent, user_id: str) -> Tuple[str, str, str]:
+        return event.get_platform_name(), str(event.get_group_id() or ""), str(user_id)
+
+    def _get_rawmessage_viewer(self):
+        """返回rawmessage_viewer1插件实例
+
+        查找结果会保留一段时间，避免每次都遍历所有插件；插件被重载（实例变化）或超过刷新间隔后重新查找。
+        """
+        now = time.monotonic()
+        meta = self._viewer_meta
+        if now - self._viewer_checked_at < 60 and (meta is None or meta.instance is self._viewer_instance):
+            return self._viewer_instance
+
+        self._viewer_checked_at = now
+        self._viewer_meta = None
+        self._viewer_instance = None
+        for plugin_meta in self.context.get_all_stars():
+            if plugin_meta.metadata.name == "astrbot_plugin_rawmessage_viewer1":
+                self._viewer_meta = plugin_meta
+                self._viewer_instance = plugin_meta.instance
+                break
+        return self._viewer_instance
+
+    @staticmethod
+    def _profile_complete(profile: Dict[str, str]) -> bool:
+        """是否含有群名片或头衔（只有昵称时还需要从rawmessage_viewer1补充）"""
+        return profile["card"] != profile["nickname"] or profile["title"] != "无"
+
+    def _sender_profile(self, event: AstrMessageEvent) -> Optional[Dict[str, str]]:
+        """aiocqhttp原始消息中的发送者信息（不写入缓存）"""
+        if event.get_platform_name() != "aiocqhttp":
+            return None
+        raw_message = event.message_obj.raw_message
+        if not isinstance(raw_message, dict):
+            return None
+        sender = raw_message.get("sender", {})
+        if not sender:
+            return None
+        nickname = sender.get("nickname", event.get_sender_name())
+        return {"nickname": nickname, "card": sender.get("card", "") or nickname,
+                "title": sender.get("title", "") or "无"}
+
+    def _remember_sender(self, event: AstrMessageEvent) -> Optional[Dict[str, str]]:
+        """把发送者信息写入缓存，返回发送者信息
+
+        只有昵称的信息不会覆盖缓存中已有的信息（如从rawmessage_viewer1获取的群名片和头衔）。
+        """
+        profile = self._sender_profile(event)
+        if profile is None:
+            return None
+        key = self._profile_key(event, event.get_sender_id())
+        if self._profile_complete(profile) or self.profile_cache.peek(key) is None:
+            self.profile_cache.put(key, profile["nickname"], profile["card"], profile["title"])
+        return profile
+
+    @filter.event_message_type(filter.EventMessageType.ALL)
+    async def record_sender_profile(self, event: AstrMessageEvent):
+        """记录消息发送者的昵称、群名片和头衔，供@查询时使用"""
+        try:
+            self._remember_sender(event)
+        except Exception as e:
+            logger.debug(f"[daily_fortune] 记录发送者信息失败: {e}")
 
     async def _get_user_info(self, event: AstrMessageEvent, target_user_id: str = None) -> Dict[str, str]:
-        """获取用户信息（从rawmessage_viewer1插件）"""
+        """获取用户信息（原始消息 > 缓存 > rawmessage_viewer1插件）"""
         user_id = target_user_id or event.get_sender_id()
-        nickname = event.get_sender_name() if not target_user_id else f"用户{target_user_id}"
-        card = nickname  # 默认值
-        title = "无"  # 默认值
+        default_nickname = event.get_sender_name() if not target_user_id else f"用户{target_user_id}"
+        key = self._profile_key(event, user_id)
+        profile = None
 
-        # 尝试从rawmessage_viewer1插件获取增强信息
-        try:
-            if event.get_platform_name() == "aiocqhttp":
-                # 如果是查询自己，直接从事件的raw_message获取信息
+        with self.metrics.time("phase", "user_info"):
+            try:
+                # 查询自己时，当前消息的发送者信息最新，含有群名片或头衔时直接使用
                 if not target_user_id:
-                    raw_message = event.message_obj.raw_message
-                    if isinstance(raw_message, dict):
-                        sender = raw_message.get("sender", {})
-                        if sender:
-                            # 优先使用原始消息中的信息
-                            nickname = sender.get("nickname", nickname)
-                            card = sender.get("card", "") or nickname
-                            title = sender.get("title", "") or "无"
-
-                            # 调试日志
-                            logger.debug(f"[daily_fortune] 从raw_message获取用户信息: user_id={user_id}, nickname={nickname}, card={card}, title={title}")
-
-                # 如果raw_message中没有，或者是查询他人，再尝试从插件获取
-                if (card == nickname and title == "无") or target_user_id:
-                    message_id = event.message_obj.message_id
-                    plugins = self.context.get_all_stars()
-                    for plugin_meta in plugins:
-                        if plugin_meta.metadata.name == "astrbot_plugin_rawmessage_viewer1":
-                            plugin_instance = plugin_meta.instance
-                            if hasattr(plugin_instance, 'enhanced_messages'):
-                                enhanced_msg = plugin_instance.enhanced_messages.get(message_id, {})
-                                if enhanced_msg:
-                                    # 如果是查询自己，确保获取的是当前消息的发送者信息
-                                    if not target_user_id:
-                                        msg_sender = enhanced_msg.get("sender", {})
-                                        if msg_sender.get("user_id") == int(user_id):
-                                            nickname = msg_sender.get("nickname", nickname)
-                                            card = msg_sender.get("card", nickname)
-                                            title = msg_sender.get("title", "无")
-                                            logger.debug(f"[daily_fortune] 从rawmessage_viewer1获取用户信息: user_id={user_id}, nickname={nickname}, card={card}, title={title}")
-                                    else:
-                                        # 查询他人时，尝试从@信息中获取
-                                        for i in range(1, 10):  # 检查ater1到ater9
-                                            ater_key = f"ater{i}"
-                                            if ater_key in enhanced_msg:
-                                                ater_info = enhanced_msg[ater_key]
-                                                if str(ater_info.get("user_id")) == str(target_user_id):
-                                                    nickname = ater_info.get("nickname", nickname)
-                                                    card = ater_info.get("card", nickname)
-                                                    title = ater_info.get("title", "无")
-                                                    logger.debug(f"[daily_fortune] 从ater信息获取用户信息: user_id={user_id}, nickname={nickname}, card={card}, title={title}")
-                                                    break
-                            break
-        except Exception as e:
-            logger.debug(f"获取增强用户信息失败: {e}")
+                    profile = self._remember_sender(event)
+                    if profile:
+                        logger.debug(f"[daily_fortune] 从raw_message获取用户信息: user_id={user_id}, {profile}")
+
+                if profile is None or not self._profile_complete(profile):
+                    cached = self.profile_cache.get(key)
+                    if cached is not None and self._profile_complete(cached):
+                        profile = cached
+                    elif event.get_platform_name() == "aiocqhttp":
+                        # 缓存中没有完整信息时，再从rawmessage_viewer1插件获取
+                        profile = self._lookup_rawmessage_viewer(event, user_id, target_user_id) or cached or profile
+                    else:
+                        profile = cached or profile
+            except Exception as e:
+                logger.debug(f"获取增强用户信息失败: {e}")
 
-        # 确保card有值
-        if not card or card == "":
-            card = nickname
+        if profile is None:
+            profile = {"nickname": default_nickname, "card": default_nickname, "title": "无"}
 
         return {
             "user_id": user_id,
-            "nickname": nickname,
-            "card": card,
-            "title": title
+            "nickname": profile["nickname"],
+            # 确保card有值
+            "card": profile["card"] or profile["nickname"],
+            "title": profile["title"]
         }
 
+    def _lookup_rawmessage_viewer(self, event: AstrMessageEvent, user_id: str, target_user_id: str = None) -> Optional[Dict[str, str]]:
+        """从rawmessage_viewer1记录的增强消息中查找用户信息，找到的@对象都会写入缓存"""
+        plugin_instance = self._get_rawmessage_viewer()
+        if plugin_instance is None or not hasattr(plugin_instance, 'enhanced_messages'):
+            return None
+        enhanced_msg = plugin_instance.enhanced_messages.get(event.message_obj.message_id, {})
+        if not enhanced_msg:
+            return None
+
+        if not target_user_id:
+            # 查询自己时，确保获取的是当前消息的发送者信息
+            msg_sender = enhanced_msg.get("sender", {})
+            if str(msg_sender.get("user_id")) == str(user_id):
+                self.profile_cache.put(self._profile_key(event, user_id), msg_sender.get("nickname", event.get_sender_name()),
+                                       msg_sender.get("card", ""), msg_sender.get("title", ""))
+        else:
+            # 查询他人时，把消息中所有@对象(ater1, ater2, ...)的信息写入缓存
+            for ater_key, ater_info in enhanced_msg.items():
+                if ater_key.startswith("ater") and isinstance(ater_info, dict) and ater_info.get("user_id"):
+                    self.profile_cache.put(self._profile_key(event, ater_info["user_id"]),
+                                           ater_info.get("nickname", f"用户{ater_info['user_id']}"),
+                                           ater_info.get("card", ""), ater_info.get("title", ""))
+
+        profile = self.profile_cache.get(self._profile_key(event, user_id))
+        if profile:
+            logger.debug(f"[daily_fortune] 从rawmessage_viewer1获取用户信息: user_id={user_id}, {profile}")
+        return profile
+
     async def _generate_with_llm(self, prompt: str, system_prompt: str = "", user_nickname: str = "") -> str:
         """使用LLM生成内容"""
         # 检查是否启用LLM（通过配置）
         if not self.config.get("enable_llm_calls", True):
             logger.debug("[daily_fortune] LLM调用被配置禁用")
-            if "过程" in prompt:
-                return "水晶球中浮现出神秘的光芒..."
-            elif "建议" in prompt:
-                return "保持乐观的心态，好运自然来。"
-            return "LLM服务已被禁用"
+            self.metrics.incr("llm_calls", "disabled")
+            return self._fallback_text(prompt, "LLM服务已被禁用")
             
         try:
-            # 优先使用默认provider，如果配置的provider不可用
-            provider = self.context.get_using_provider()
-            if not provider and self.provider:
-                provider = self.provider
+            # 优先使用配置的provider或第三方接口，未配置时使用AstrBot默认provider
+            provider = self.provider or self.context.get_using_provider()
 
             if not provider:
                 logger.warning("[daily_fortune] 没有可用的LLM提供商")
+                self.metrics.incr("llm_calls", "no_provider")
                 # 返回备用响应
-                if "过程" in prompt:
-                    return "水晶球中浮现出神秘的光芒..."
-                elif "建议" in prompt:
-                    return "保持乐观的心态，好运自然来。"
-                return "LLM服务暂时不可用"
+                return self._fallback_text(prompt, "LLM服务暂时不可用")
 
             # 获取当前会话的人格信息
             contexts = []
@@ -558,49 +854,187 @@ class DailyFortunePlugin(Star):
             if user_nickname:
                 prompt = f"用户昵称是'{user_nickname}'。{prompt}"
 
-            # 处理system_prompt - 某些模型可能不支持
-            try:
-                # 首先尝试使用system_prompt
-                if self.persona_name:
-                    # 使用指定的人格
-                    personas = self.context.provider_manager.personas
-                    for p in personas:
-                        if p.get('name') == self.persona_name:
-                            system_prompt = p.get('prompt', '') + "\n" + system_prompt
-                            break
+            if self.persona_name:
+                # 使用指定的人格
+                personas = self.context.provider_manager.personas
+                for p in personas:
+                    if p.get('name') == self.persona_name:
+                        system_prompt = p.get('prompt', '') + "\n" + system_prompt
+                        break
 
-                response = await provider.text_chat(
-                    prompt=prompt,
-                    contexts=contexts,
-                    system_prompt=system_prompt
-                )
-            except Exception as e:
-                # 如果system_prompt导致错误，尝试将其合并到prompt中
-                logger.debug(f"使用system_prompt失败，尝试合并到prompt: {e}")
-                combined_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+            async def chat():
+                # 处理system_prompt - 某些模型可能不支持
                 try:
-                    response = await provider.text_chat(
+                    return await provider.text_chat(
+                        prompt=prompt,
+                        contexts=contexts,
+                        system_prompt=system_prompt
+                    )
+                except Exception as e:
+                    # 只有接口拒绝了请求本身时才可能是system_prompt导致的，
+                    # 超时、网络错误、限流等直接交给调度器处理，不再多发一次请求
+                    if not system_prompt or not _system_prompt_rejected(e):
+                        raise
+                    # 尝试将system_prompt合并到prompt中
+                    logger.debug(f"使用system_prompt失败，尝试合并到prompt: {e}")
+                    combined_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+                    return await provider.text_chat(
                         prompt=combined_prompt,
                         contexts=contexts
                     )
-                except Exception as e2:
-                    logger.error(f"LLM调用完全失败: {e2}")
-                    # 返回备用响应
-                    if "过程" in prompt:
-                        return "水晶球中浮现出神秘的光芒..."
-                    elif "建议" in prompt:
-                        return "保持乐观的心态，好运自然来。"
-                    return "生成失败"
 
+            try:
+                with self.metrics.time("phase", "llm"):
+                    response = await self.llm_scheduler.run(chat)
+            except LLMUnavailable as e:
+                logger.warning(f"[daily_fortune] LLM调用被调度器放弃，使用备用文本: {e}")
+                self.metrics.incr("llm_calls", "unavailable")
+                return self._fallback_text(prompt)
+            except Exception as e2:
+                logger.error(f"LLM调用完全失败: {e2}")
+                self.metrics.incr("llm_calls", "failed")
+                # 返回备用响应
+                return self._fallback_text(prompt)
+
+            self.metrics.incr("llm_calls", "success" if response else "empty")
             return response.completion_text if response else "生成失败"
         except Exception as e:
             logger.error(f"LLM生成失败: {e}")
+            self.metrics.incr("llm_calls", "failed")
             # 返回备用响应
-            if "过程" in prompt:
-                return "水晶球中浮现出神秘的光芒..."
-            elif "建议" in prompt:
-                return "保持乐观的心态，好运自然来。"
-            return "生成失败"
+            return self._fallback_text(prompt)
+
+    def _fallback_text(self, prompt: str, default: str = "生成失败") -> str:
+        """LLM不可用时按提示词内容选择备用文本"""
+        if "过程" in prompt:
+            return FALLBACK_PROCESS
+        elif "建议" in prompt:
+            return FALLBACK_ADVICE
+        return default
+
+    async def _generate_texts(self, process_prompt: str, advice_prompt: str, user_nickname: str = "",
+                              phase: str = "generate") -> Tuple[str, str]:
+        """按配置的生成模式生成过程模拟和建议，返回 (process, advice)
+
+        phase为记录耗时用的阶段名，文本池后台补充使用 pool_generate，不计入实时查询的 generate
+        """
+        mode = self.config.get("llm_generation_mode", "concurrent")
+        if not self.config.get("enable_llm_calls", True):
+            mode = "sequential"
+
+        start = time.perf_counter()
+        if mode == "combined":
+            texts = await self._generate_combined(process_prompt, advice_prompt, user_nickname)
+            if texts is None:
+                logger.warning("[daily_fortune] 合并生成结果解析失败，回退为两次并发调用")
+                self.metrics.incr("llm_combined_parse_failed")
+                mode = "combined->concurrent"
+                texts = await self._generate_concurrent(process_prompt, advice_prompt, user_nickname)
+        elif mode == "sequential":
+            texts = (
+                await self._generate_with_llm(process_prompt, user_nickname=user_nickname),
+                await self._generate_with_llm(advice_prompt, user_nickname=user_nickname)
+            )
+        else:
+            texts = await self._generate_concurrent(process_prompt, advice_prompt, user_nickname)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.metrics.observe("phase", phase, elapsed_ms)
+        if phase == "generate":
+            logger.info(f"[daily_fortune] LLM生成完成，模式: {mode}，耗时 {elapsed_ms:.0f}ms")
+        else:
+            logger.debug(f"[daily_fortune] 文本池补充生成完成，模式: {mode}，耗时 {elapsed_ms:.0f}ms")
+        return texts
+
+    async def _refill_text_pool(self):
+        """空闲时为每个运势分段预生成过程模拟和建议，池被取用后尽快补充"""
+        pool_config = self.config.get("text_pool", {})
+        refill_interval = pool_config.get("refill_interval", 60)
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._pool_wakeup.wait(), timeout=refill_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._pool_wakeup.clear()
+            self.text_pool.evict_stale()
+
+            persona = self.persona_name or ""
+            keys = [(band, persona) for band in self.fortune_levels]
+            while not self._stop_event.is_set():
+                key = self.text_pool.neediest(keys)
+                if key is None:
+                    break
+                # 有用户正在等待LLM结果时暂停补充，把LLM让给实时查询
+                if self.processing_users:
+                    await asyncio.sleep(1)
+                    continue
+                try:
+                    process, advice = await self._generate_pool_texts(key[0])
+                except Exception as e:
+                    logger.warning(f"[daily_fortune] 预生成文本失败: {e}")
+                    break
+                # 生成失败时返回的是备用文本，不放入池中，等下一轮再试
+                if process == FALLBACK_PROCESS or advice == FALLBACK_ADVICE:
+                    break
+                self.text_pool.put(key, process, advice)
+
+    async def _generate_pool_texts(self, band: Tuple[int, int]) -> Tuple[str, str]:
+        """为一个运势分段生成不针对具体用户的过程模拟和建议"""
+        fortune, femoji = self.fortune_levels[band]
+        vars_dict = {
+            "jrrp": f"{band[0]}-{band[1]}",
+            "fortune": fortune,
+            "femoji": femoji,
+            "date": self._get_today_key(),
+            "medals": self.medals_str,
+            "ranges_jrrp": self.ranges_jrrp_str,
+            "ranges_fortune": self.ranges_fortune_str,
+            "ranges_emoji": self.ranges_emoji_str
+        }
+        return await self._generate_texts(
+            self.templates["pool_process_prompt"].render(vars_dict),
+            self.templates["pool_advice_prompt"].render(vars_dict),
+            phase="pool_generate"
+        )
+
+    async def _generate_concurrent(self, process_prompt: str, advice_prompt: str, user_nickname: str = "") -> Tuple[str, str]:
+        """同时发起过程模拟和建议两次调用"""
+        process, advice = await asyncio.gather(
+            self._generate_with_llm(process_prompt, user_nickname=user_nickname),
+            self._generate_with_llm(advice_prompt, user_nickname=user_nickname)
+        )
+        return process, advice
+
+    async def _generate_combined(self, process_prompt: str, advice_prompt: str, user_nickname: str = "") -> Optional[Tuple[str, str]]:
+        """一次调用同时生成两部分内容，解析失败时返回None"""
+        combined_prompt = (
+            "请完成下面两项任务，只输出一个JSON对象，格式为"
+            '{"process": "任务一的内容", "advice": "任务二的内容"}，不要输出任何其他内容。\n'
+            f"任务一：{process_prompt}\n"
+            f"任务二：{advice_prompt}"
+        )
+        response = await self._generate_with_llm(combined_prompt, user_nickname=user_nickname)
+        return self._parse_combined_response(response)
+
+    def _parse_combined_response(self, text: str) -> Optional[Tuple[str, str]]:
+        """从LLM回复中提取 {"process": ..., "advice": ...}"""
+        if not text:
+            return None
+        start = text.find("{")
+        end = text.rfind("}")
+        if start < 0 or end <= start:
+            return None
+        try:
+            data = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        process = data.get("process")
+        advice = data.get("advice")
+        if not isinstance(process, str) or not isinstance(advice, str) or not process.strip() or not advice.strip():
+            return None
+        return process.strip(), advice.strip()
 
     def _get_target_user_from_event(self, event: AstrMessageEvent) -> Tuple[Optional[str], Optional[str]]:
         """从消息中提取目标用户ID和昵称"""
@@ -613,7 +1047,17 @@ class DailyFortunePlugin(Star):
         """检查消息中是否包含 --confirm 参数"""
         return "--confirm" in event.message_str.lower()
 
+    def _get_user_ids_from_event(self, event: AstrMessageEvent, keyword: str) -> List[str]:
+        """提取指令关键字之后的用户ID列表（逗号或空格分隔）以及消息中@的用户，保持顺序并去重"""
+        tokens = event.message_str.split()
+        start = next((i + 1 for i, token in enumerate(tokens) if token.lower().endswith(keyword)), len(tokens))
+        user_ids = [user_id for token in tokens[start:] if not token.startswith("-")
+                    for user_id in re.split(r"[,，]", token) if user_id]
+        user_ids += [str(comp.qq) for comp in event.message_obj.message if isinstance(comp, Comp.At)]
+        return list(dict.fromkeys(user_ids))
+
     @filter.command("jrrp")
+    @timed_command("jrrp")
     async def jrrp(self, event: AstrMessageEvent, subcommand: str = ""):
         """今日人品查询"""
         # 检查群聊白名单
@@ -639,6 +1083,10 @@ class DailyFortunePlugin(Star):
 • 查看群内今日人品排行榜
     - jrrp rank
     - jrrprank
+• 查看本周/本月/总平均人品排行榜
+    - jrrp rank week
+    - jrrp rank month
+    - jrrp rank all
 
 📚 历史记录：
 • 查看历史记录
@@ -649,6 +1097,10 @@ class DailyFortunePlugin(Star):
 • 查看他人历史记录
     - jrrp history @某人
     - jrrphistory @某人
+• 查看人品统计（移动平均、分位数、连续天数、星期分布）
+    - jrrp stats
+    - jrrpstats
+    - jrrp stats @某人
 
 🗑️ 数据管理：
 • 删除除今日外的历史记录
@@ -666,11 +1118,28 @@ class DailyFortunePlugin(Star):
 • 初始化他人今日记录
     - jrrp init @某人 --confirm
     - jrrpinit @某人 --confirm
+• 批量删除指定用户的全部数据
+    - jrrp purge 用户ID,用户ID --confirm
+    - jrrppurge 用户ID,用户ID --confirm
+    - jrrppurge @某人 --confirm
 • 重置所有数据
     - jrrp reset --confirm
     - jrrp re --confirm
     - jrrpreset --confirm
     - jrrpre --confirm
+• 查看运行指标（指令耗时、LLM调用、存储状态）
+    - jrrp metrics
+    - jrrpmetrics
+    - jrrpmetrics reset
+• 查看事件循环卡顿统计（需开启 loop_watchdog）
+    - jrrp lag
+    - jrrplag
+    - jrrplag reset
+• 性能分析（cProfile / 内存占用）
+    - jrrp profile start
+    - jrrp profile stop
+    - jrrp profile mem
+    - jrrp profile mem stop
 
 💡 提示：带 --confirm 的指令需要确认参数才能执行"""
             yield event.plain_result(help_text)
@@ -689,6 +1158,11 @@ class DailyFortunePlugin(Star):
                 yield result
             return
         
+        elif subcommand.lower() == "stats":
+            async for result in self.jrrpstats(event):
+                yield result
+            return
+
         elif subcommand.lower() in ["init", "initialize"]:
             # 初始化指令需要管理员权限
             if not event.is_admin():
@@ -708,6 +1182,43 @@ class DailyFortunePlugin(Star):
                 yield result
             return
 
+        elif subcommand.lower() == "metrics":
+            # 运行指标需要管理员权限
+            if not event.is_admin():
+                yield event.plain_result("❌ 此操作需要管理员权限")
+                return
+            action = "reset" if "reset" in event.message_str.lower().split()[2:] else ""
+            async for result in self.jrrpmetrics(event, action):
+                yield result
+            return
+
+        elif subcommand.lower() == "profile":
+            if not event.is_admin():
+                yield event.plain_result("❌ 此操作需要管理员权限")
+                return
+            args = event.message_str.lower().split()
+            args = args[args.index("profile") + 1:] if "profile" in args else []
+            async for result in self.jrrpprofile(event, *args[:2]):
+                yield result
+            return
+
+        elif subcommand.lower() == "lag":
+            if not event.is_admin():
+                yield event.plain_result("❌ 此操作需要管理员权限")
+                return
+            action = "reset" if "reset" in event.message_str.lower().split()[2:] else ""
+            async for result in self.jrrplag(event, action):
+                yield result
+            return
+
+        elif subcommand.lower() == "purge":
+            if not event.is_admin():
+                yield event.plain_result("❌ 此操作需要管理员权限")
+                return
+            async for result in self.jrrppurge(event):
+                yield result
+            return
+
         elif subcommand.lower() in ["reset", "re"]:
             # 重置指令需要管理员权限
             if not event.is_admin():
@@ -735,11 +1246,9 @@ class DailyFortunePlugin(Star):
             target_nickname = target_user_info["nickname"]
 
             # 检查对方是否已经查询过
-            if today not in self.daily_data or target_user_id not in self.daily_data[today]:
+            cached = self.store.get_daily(today, target_user_id)
+            if cached is None:
                 # 使用配置的未查询提示信息，支持所有变量
-                not_queried_template = self.config.get("others_not_queried_message",
-                    "{target_nickname} 今天还没有查询过人品值呢~")
-
                 # 准备变量字典，包含所有可能的变量
                 vars_dict = {
                     "target_nickname": target_nickname,
@@ -753,6 +1262,8 @@ class DailyFortunePlugin(Star):
                     "jrrp": "未知",
                     "fortune": "未知",
                     "femoji": "❓",
+                    "percentile": "未知",
+                    "group_percentile": "未知",
                     "process": "",
                     "advice": "",
                     "avgjrrp": 0,
@@ -766,21 +1277,16 @@ class DailyFortunePlugin(Star):
                     "ranges_emoji": self.ranges_emoji_str
                 }
 
-                result = not_queried_template.format(**vars_dict)
+                result = self.templates["not_queried"].render(vars_dict)
                 yield event.plain_result(result)
                 return
 
             # 获取对方的查询结果
-            cached = self.daily_data[today][target_user_id]
             jrrp = cached["jrrp"]
             fortune, femoji = self._get_fortune_info(jrrp)
             target_nickname = cached.get("nickname", target_nickname)
 
-            # 构建查询模板，支持所有变量
-            query_template = self.config.get("templates", {}).get("query_template",
-                "📌 今日人品\n{nickname}，今天已经查询过了哦~\n今日人品值: {jrrp}\n运势: {fortune} {femoji}")
-
-            # 准备变量字典
+            # 准备查询模板的变量字典，支持所有变量
             vars_dict = {
                 "nickname": target_nickname,
                 "card": target_user_info["card"],
@@ -794,6 +1300,7 @@ class DailyFortunePlugin(Star):
                 "target_nickname": target_nickname,
                 "target_user_id": target_user_id,
                 "sender_nickname": sender_nickname,
+                **self._percentile_vars(event, jrrp, cached.get("group_id", "")),
                 # 统计信息（如果需要的话）
                 "avgjrrp": jrrp,  # 单个用户的平均值就是当前值
                 "maxjrrp": jrrp,
@@ -806,7 +1313,7 @@ class DailyFortunePlugin(Star):
                 "ranges_emoji": self.ranges_emoji_str
             }
 
-            result = query_template.format(**vars_dict)
+            result = self.templates["query"].render(vars_dict)
 
             # 检查是否显示对方的缓存完整结果
             if self.config.get("show_others_cached_result", False) and "result" in cached:
@@ -821,34 +1328,24 @@ class DailyFortunePlugin(Star):
         nickname = user_info["nickname"]
         today = self._get_today_key()
 
-        # 初始化今日数据（修复KeyError）
-        if today not in self.daily_data:
-            self.daily_data[today] = {}
-
         # 检查用户是否正在处理中
         if user_id in self.processing_users:
             # 用户正在处理中，彻底阻止事件传播和LLM调用
             event.should_call_llm(False)
             event.stop_event()
-            processing_msg = self.config.get("processing_message",
-                "已经在努力获取 {nickname} 的命运了哦~")
-            yield event.plain_result(processing_msg.format(nickname=nickname))
+            yield event.plain_result(self.templates["processing"].render({"nickname": nickname}))
             return
 
         # 检查是否已经查询过
-        if user_id in self.daily_data[today]:
+        cached = self.store.get_daily(today, user_id)
+        if cached is not None:
             # 已查询，返回缓存结果 - 不需要LLM
             event.should_call_llm(False)
             
-            cached = self.daily_data[today][user_id]
             jrrp = cached["jrrp"]
             fortune, femoji = self._get_fortune_info(jrrp)
 
-            # 构建查询模板
-            query_template = self.config.get("templates", {}).get("query_template",
-                "📌 今日人品\n{nickname}，今天已经查询过了哦~\n今日人品值: {jrrp}\n运势: {fortune} {femoji}")
-
-            # 准备变量字典
+            # 准备查询模板的变量字典
             vars_dict = {
                 "nickname": nickname,
                 "card": user_info["card"],
@@ -859,6 +1356,10 @@ class DailyFortunePlugin(Star):
                 "date": today,
                 "process": cached.get("process", ""),
                 "advice": cached.get("advice", ""),
+                "target_nickname": nickname,
+                "target_user_id": user_id,
+                "sender_nickname": nickname,
+                **self._percentile_vars(event, jrrp, cached.get("group_id", "")),
                 # 统计信息
                 "avgjrrp": jrrp,
                 "maxjrrp": jrrp,
@@ -871,7 +1372,7 @@ class DailyFortunePlugin(Star):
                 "ranges_emoji": self.ranges_emoji_str
             }
 
-            result = query_template.format(**vars_dict)
+            result = self.templates["query"].render(vars_dict)
 
             # 如果配置启用了显示缓存结果
             if self.config.get("show_cached_result", True) and "result" in cached:
@@ -884,16 +1385,15 @@ class DailyFortunePlugin(Star):
         event.should_call_llm(False)
         
         # 将用户添加到正在处理的集合中
-        self.processing_users.add(user_id)
+        self.processing_users[user_id] = today
         
         try:
             # 显示检测中消息
-            detecting_msg = self.config.get("detecting_message",
-                "神秘的能量汇聚，{nickname}，你的命运即将显现，正在祈祷中...")
-            yield event.plain_result(detecting_msg.format(nickname=nickname))
+            yield event.plain_result(self.templates["detecting"].render({"nickname": nickname}))
 
             # 计算人品值
-            jrrp = self._calculate_jrrp(user_id)
+            # 使用查询开始时的日期，处理期间跨过零点也不会混用两天的数据
+            jrrp = self._calculate_jrrp(user_id, today)
             fortune, femoji = self._get_fortune_info(jrrp)
 
             # 准备LLM生成的变量
@@ -909,65 +1409,71 @@ class DailyFortunePlugin(Star):
                 "medals": self.medals_str,
                 "ranges_jrrp": self.ranges_jrrp_str,
                 "ranges_fortune": self.ranges_fortune_str,
-                "ranges_emoji": self.ranges_emoji_str
+                "ranges_emoji": self.ranges_emoji_str,
+                # 本次人品值还没计入今日分布
+                **self._percentile_vars(event, jrrp, None)
             }
 
-            # 生成过程模拟（传入用户昵称）
-            process_prompt = self.config.get("prompts", {}).get("process_prompt",
-                "读取'user_id:{user_id}'相关信息，以对其适当的称呼开头，模拟你使用水晶球缓慢复现的过程，50字以内")
-            process_prompt = process_prompt.format(**vars_dict)
-            process = await self._generate_with_llm(process_prompt, user_nickname=nickname)
-
-            # 生成建议（传入用户昵称）
-            advice_prompt = self.config.get("prompts", {}).get("advice_prompt",
-                "人品值分段为{ranges_jrrp}，对应运势是{ranges_fortune}\n上述作为人品值好坏的参考，接下来，\n对{user_id}的今日人品值{jrrp}给出你的评语和建议，50字以内")
-            advice_prompt = advice_prompt.format(**vars_dict)
-            advice = await self._generate_with_llm(advice_prompt, user_nickname=nickname)
+            # 生成过程模拟和建议的提示词（调用时传入用户昵称）
+            process_prompt = self.templates["process_prompt"].render(vars_dict)
+            advice_prompt = self.templates["advice_prompt"].render(vars_dict)
+
+            # 优先使用预生成文本池，池为空时再实时调用LLM
+            pooled = None
+            if self.text_pool:
+                pooled = self.text_pool.take((self._get_fortune_band(jrrp), self.persona_name or ""))
+                self._pool_wakeup.set()
+                self.metrics.incr("text_pool", "hit" if pooled else "miss")
+            if pooled:
+                process, advice = pooled
+            else:
+                process, advice = await self._generate_texts(process_prompt, advice_prompt, nickname)
 
             # 构建结果
-            result_template = self.config.get("templates", {}).get("resault_template",
-                "🔮 {process}\n💎 人品值：{jrrp}\n✨ 运势：{fortune}\n💬 建议：{advice}")
-
-            result = result_template.format(
-                process=process,
-                jrrp=jrrp,
-                fortune=fortune,
-                advice=advice
-            )
-
-            # 缓存结果（确保today已存在）
-            if today not in self.daily_data:
-                self.daily_data[today] = {}
+            vars_dict["process"] = process
+            vars_dict["advice"] = advice
+            result = self.templates["resault"].render(vars_dict)
 
-            self.daily_data[today][user_id] = {
+            # 缓存结果（只追加journal记录，不重写整个文件）
+            group_id = "" if event.is_private_chat() else str(event.get_group_id() or "")
+            record = {
                 "jrrp": jrrp,
                 "fortune": fortune,
                 "process": process,
                 "advice": advice,
                 "result": result,
                 "nickname": nickname,
-                "timestamp": datetime.now().isoformat()
+                "group_id": group_id,
+                "timestamp": self._now().isoformat()
             }
-            self._save_data(self.daily_data, self.fortune_file)
+            self.store.put_daily(today, user_id, record)
+            if today == self._current_day:
+                self.leaderboards.add(group_id, user_id, record)
+                self.score_histograms.add(group_id, jrrp)
+                self.rollups.add(group_id, user_id, today, jrrp, nickname)
+            else:
+                # 等待LLM期间已经切换到新的一天：今日排行榜和分布已属于新的一天，
+                # 前一天也已封存，直接计入周/月/总汇总
+                self.rollups.add_sealed(group_id, user_id, today, jrrp, nickname)
+                asyncio.create_task(self._save_rollups())
 
             # 更新历史记录
-            if user_id not in self.history_data:
-                self.history_data[user_id] = {}
-            self.history_data[user_id][today] = {
+            self.store.put_history(user_id, today, {
                 "jrrp": jrrp,
                 "fortune": fortune
-            }
-            self._save_data(self.history_data, self.history_file)
+            })
+            await self.writer.commit()
 
             yield event.plain_result(result)
             
         finally:
             # 确保在处理完成后从集合中移除用户
-            self.processing_users.discard(user_id)
+            self.processing_users.pop(user_id, None)
 
     @filter.command("jrrprank")
-    async def jrrprank(self, event: AstrMessageEvent):
-        """群内今日人品排行榜"""
+    @timed_command("jrrprank")
+    async def jrrprank(self, event: AstrMessageEvent, period: str = ""):
+        """群内今日人品排行榜，带 week/month/all 参数时为多日平均排行榜"""
         # 检查群聊白名单
         if not self._check_group_whitelist(event):
             yield event.plain_result("")
@@ -981,52 +1487,107 @@ class DailyFortunePlugin(Star):
             return
 
         today = self._get_today_key()
+        group_id = str(event.get_group_id())
 
-        if today not in self.daily_data:
-            yield event.plain_result("今天还没有人查询过人品值呢~")
-            return
+        # jrrp rank week 经由jrrp指令转发时，周期参数只能从原始消息中取
+        period = self._parse_rank_period(period or event.message_str)
+        with self.metrics.time("phase", "rank_render"), self.watchdog.blocking("rank_build"):
+            if period:
+                result = self._render_period_rank(event, group_id, today, period)
+            else:
+                result = self._render_daily_rank(event, group_id, today)
 
-        # 获取群成员的人品值
-        group_data = []
-        for user_id, data in self.daily_data[today].items():
-            group_data.append({
-                "user_id": user_id,
-                "nickname": data.get("nickname", "未知"),
-                "jrrp": data["jrrp"],
-                "fortune": data.get("fortune", "未知")
-            })
+        yield event.plain_result(result)
 
-        # 排序
-        group_data.sort(key=lambda x: x["jrrp"], reverse=True)
+    def _render_daily_rank(self, event: AstrMessageEvent, group_id: str, today: str) -> str:
+        """渲染群内今日人品排行榜"""
+        # 获取本群今日人品值最高的前10名
+        top_records = self.leaderboards.top(group_id, 10)
+        if not top_records:
+            return "今天还没有人查询过人品值呢~"
 
         # 构建排行榜
-        rank_template = self.config.get("templates", {}).get("rank_template",
-            "{medal} {nickname}: {jrrp} ({fortune})")
+        rank_template = self.templates["rank"]
 
         ranks = []
 
-        for i, user in enumerate(group_data[:10]):  # 只显示前10名
-            medal = self.medals[i] if i < len(self.medals) else self.medals[-1] if self.medals else "🏅"
-            rank_line = rank_template.format(
-                medal=medal,
-                nickname=user["nickname"],
-                jrrp=user["jrrp"],
-                fortune=user["fortune"]
-            )
+        for i, (user_id, data) in enumerate(top_records):
+            rank_line = rank_template.render({
+                "medal": self._get_medal(i),
+                "nickname": data.get("nickname", "未知"),
+                "jrrp": data["jrrp"],
+                "fortune": data.get("fortune", "未知")
+            })
             ranks.append(rank_line)
 
         # 构建完整排行榜
-        board_template = self.config.get("templates", {}).get("rank_board_template",
-            "📊【今日人品排行榜】{date}\n━━━━━━━━━━━━━━━\n{ranks}")
-
-        result = board_template.format(
-            date=today,
-            ranks="\n".join(ranks)
-        )
-
-        yield event.plain_result(result)
+        result = self.templates["rank_board"].render({
+            "date": today,
+            "ranks": "\n".join(ranks)
+        })
+
+        # 附加发送者在本群的名次
+        self_template = self.templates["rank_self"]
+        position = self.leaderboards.position(group_id, event.get_sender_id()) if self_template else None
+        if position is not None:
+            result += "\n" + self_template.render({
+                "nickname": event.get_sender_name(),
+                "position": position,
+                "total": self.leaderboards.size(group_id)
+            })
+        return result
+
+    def _get_medal(self, index: int) -> str:
+        return self.medals[index] if index < len(self.medals) else self.medals[-1] if self.medals else "🏅"
+
+    def _parse_rank_period(self, text: str) -> str:
+        """从参数中识别 week/month/all 周期，今日排行返回空字符串"""
+        for token in text.lower().split():
+            if token in RANK_PERIOD_ALIASES:
+                return RANK_PERIOD_ALIASES[token]
+        return ""
+
+    def _render_period_rank(self, event: AstrMessageEvent, group_id: str, today: str, period: str) -> str:
+        """按预先汇总的数据渲染本周/本月/总平均人品排行榜"""
+        min_days = self.config.get("rank_periods", {}).get(f"{period}_min_days", RANK_MIN_DAYS[period])
+        ranked = self.rollups.ranking(group_id, period, today, min_days)
+        if not ranked:
+            return f"{RANK_PERIOD_TITLES[period]}还没有参与满 {min_days} 天的成员呢~"
+
+        rank_template = self.templates["rank"]
+        ranks = []
+        for i, (user_id, avg, _) in enumerate(ranked[:10]):
+            ranks.append(rank_template.render({
+                "medal": self._get_medal(i),
+                "nickname": self.rollups.nickname(group_id, user_id),
+                "jrrp": f"{avg:.1f}",
+                "fortune": lambda: self._get_fortune_info(round(avg))[0]
+            }))
+
+        result = self.templates["rank_period_board"].render({
+            "title": RANK_PERIOD_TITLES[period],
+            "period": period_label(period, today),
+            "date": today,
+            "min_days": min_days,
+            "ranks": "\n".join(ranks)
+        })
+
+        # 附加发送者的名次（达到参与天数时）
+        self_template = self.templates["rank_self"]
+        sender_id = event.get_sender_id()
+        if self_template:
+            for position, (user_id, _, _) in enumerate(ranked, 1):
+                if user_id == sender_id:
+                    result += "\n" + self_template.render({
+                        "nickname": event.get_sender_name(),
+                        "position": position,
+                        "total": len(ranked)
+                    })
+                    break
+        return result
 
     @filter.command("jrrphistory", alias={"jrrphi"})
+    @timed_command("jrrphistory")
     async def jrrphistory(self, event: AstrMessageEvent):
         """查看人品历史记录"""
         # 检查群聊白名单
@@ -1048,48 +1609,87 @@ class DailyFortunePlugin(Star):
             target_user_info = await self._get_user_info(event, target_user_id)
             target_nickname = target_user_info["nickname"]
 
-        if target_user_id not in self.history_data:
+        # 统计数据随写入增量维护，统计窗口为最近 history_days 条记录
+        with self.watchdog.blocking("history_stats"):
+            stats = self.store.history_stats(target_user_id)
+
+        if stats is None:
             yield event.plain_result(f"{target_nickname} 还没有任何人品记录呢~")
             return
 
-        # 获取历史天数配置
-        history_days = self.config.get("history_days", 30)
-        user_history = self.history_data[target_user_id]
+        # 使用模板，历史列表只在模板引用时读取
+        result = self.templates["history"].render({
+            "nickname": target_nickname,
+            # 只显示最近10条
+            "history": lambda: "\n".join(f"{date}: {data['jrrp']} ({data['fortune']})"
+                                          for date, data in self.store.get_history(target_user_id, 10)),
+            "avgjrrp": stats.window_avg,
+            "maxjrrp": stats.window_max,
+            "minjrrp": stats.window_min
+        })
+
+        yield event.plain_result(result)
+
+    @filter.command("jrrpstats")
+    @timed_command("jrrpstats")
+    async def jrrpstats(self, event: AstrMessageEvent):
+        """查看人品统计分析"""
+        # 检查群聊白名单
+        if not self._check_group_whitelist(event):
+            yield event.plain_result("")
+            return
+
+        # 防止触发LLM调用
+        event.should_call_llm(False)
+
+        # 检查是否有@某人
+        target_user_id, target_nickname = self._get_target_user_from_event(event)
 
-        # 按日期排序并限制天数
-        sorted_dates = sorted(user_history.keys(), reverse=True)[:history_days]
+        if not target_user_id:
+            target_user_id = event.get_sender_id()
+            target_nickname = event.get_sender_name()
+        else:
+            target_user_info = await self._get_user_info(event, target_user_id)
+            target_nickname = target_user_info["nickname"]
 
-        if not sorted_dates:
+        # 在内存映射的列式历史上用NumPy计算
+        analytics_config = self.config.get("history_analytics", {})
+        with self.metrics.time("phase", "stats_analysis"), self.watchdog.blocking("history_stats"):
+            arrays = self.store.history_arrays(target_user_id)
+            summary = analyze_history(
+                *arrays,
+                good_threshold=analytics_config.get("good_threshold", 61),
+                bad_threshold=analytics_config.get("bad_threshold", 30)
+            ) if arrays else None
+
+        if summary is None:
             yield event.plain_result(f"{target_nickname} 还没有任何人品记录呢~")
             return
 
-        # 计算统计数据
-        jrrp_values = [user_history[date]["jrrp"] for date in sorted_dates]
-        avg_jrrp = round(sum(jrrp_values) / len(jrrp_values), 1)
-        max_jrrp = max(jrrp_values)
-        min_jrrp = min(jrrp_values)
-
-        # 构建历史记录列表
-        history_lines = []
-        for date in sorted_dates[:10]:  # 只显示最近10条
-            data = user_history[date]
-            history_lines.append(f"{date}: {data['jrrp']} ({data['fortune']})")
-
-        # 使用模板
-        history_template = self.config.get("templates", {}).get("history_template",
-            "📚 {nickname} 的人品历史记录\n{history}\n\n📊 统计信息:\n平均人品值: {avgjrrp}\n最高人品值: {maxjrrp}\n最低人品值: {minjrrp}")
-
-        result = history_template.format(
-            nickname=target_nickname,
-            history="\n".join(history_lines),
-            avgjrrp=avg_jrrp,
-            maxjrrp=max_jrrp,
-            minjrrp=min_jrrp
-        )
+        result = self.templates["stats"].render({
+            "nickname": target_nickname,
+            "count": summary["count"],
+            "first_date": summary["first_date"],
+            "last_date": summary["last_date"],
+            "avgjrrp": summary["avg"],
+            "ma7": summary["ma7"],
+            "ma30": summary["ma30"],
+            "trend": f"{summary['trend']:+g}",
+            "p25": summary["p25"],
+            "median": summary["median"],
+            "p75": summary["p75"],
+            "p90": summary["p90"],
+            "good_streak": summary["good_streak"],
+            "bad_streak": summary["bad_streak"],
+            "weekdays": lambda: "\n".join(f"{name}: {avg} ({count}次)" for name, avg, count in summary["weekdays"]),
+            "best_weekday": summary["best_weekday"],
+            "worst_weekday": summary["worst_weekday"]
+        })
 
         yield event.plain_result(result)
 
     @filter.command("jrrpdelete", alias={"jrrpdel"})
+    @timed_command("jrrpdelete")
     async def jrrpdelete(self, event: AstrMessageEvent, confirm: str = ""):
         """删除个人人品历史记录（保留今日）"""
         # 检查群聊白名单
@@ -1110,38 +1710,19 @@ class DailyFortunePlugin(Star):
             return
 
         today = self._get_today_key()
-        deleted_count = 0
-
-        # 删除历史记录（保留今日）
-        if target_user_id in self.history_data:
-            user_history = self.history_data[target_user_id]
-            dates_to_delete = [date for date in user_history.keys() if date != today]
-            for date in dates_to_delete:
-                del user_history[date]
-                deleted_count += 1
-
-            # 如果历史记录为空，删除整个用户记录
-            if not user_history:
-                del self.history_data[target_user_id]
-
-            self._save_data(self.history_data, self.history_file)
-
-        # 删除每日记录（保留今日）
-        dates_to_delete = [date for date in self.daily_data.keys() if date != today]
-        for date in dates_to_delete:
-            if target_user_id in self.daily_data[date]:
-                del self.daily_data[date][target_user_id]
-                deleted_count += 1
-            # 如果该日期没有任何用户数据，删除整个日期记录
-            if not self.daily_data[date]:
-                del self.daily_data[date]
-
-        self._save_data(self.daily_data, self.fortune_file)
+
+        # 删除历史记录和每日记录（保留今日）
+        with self.watchdog.blocking("delete"):
+            deleted_count = self.store.delete_user_data(target_user_id, keep_day=today)
+        await self.writer.commit()
+        self.rollups.forget_user(target_user_id)
+        await self._save_rollups()
 
         yield event.plain_result(f"✅ 已删除您的除今日以外的人品历史记录（共 {deleted_count} 条）")
 
     @filter.command("jrrpinitialize", alias={"jrrpinit"})
     @filter.permission_type(filter.PermissionType.ADMIN)
+    @timed_command("jrrpinitialize")
     async def jrrpinitialize(self, event: AstrMessageEvent, confirm: str = ""):
         """初始化今日人品记录（仅管理员）"""
         # 检查群聊白名单
@@ -1172,28 +1753,23 @@ class DailyFortunePlugin(Star):
             return
 
         today = self._get_today_key()
-        deleted = False
-
-        # 删除今日记录
-        if today in self.daily_data and target_user_id in self.daily_data[today]:
-            del self.daily_data[today][target_user_id]
-            deleted = True
-            # 如果该日期没有任何用户数据，删除整个日期记录
-            if not self.daily_data[today]:
-                del self.daily_data[today]
-            self._save_data(self.daily_data, self.fortune_file)
-
-        # 删除今日历史记录
-        if target_user_id in self.history_data and today in self.history_data[target_user_id]:
-            del self.history_data[target_user_id][today]
-            deleted = True
-            # 如果历史记录为空，删除整个用户记录
-            if not self.history_data[target_user_id]:
-                del self.history_data[target_user_id]
-            self._save_data(self.history_data, self.history_file)
+
+        # 删除今日记录和今日历史记录，并移出排行榜
+        record = self.store.get_daily(today, target_user_id)
+        if record is not None:
+            self.leaderboards.remove(record.get("group_id", ""), target_user_id)
+            self.rollups.remove(record.get("group_id", ""), target_user_id, today)
+            self.score_histograms.remove(record.get("group_id", ""), record["jrrp"])
+        deleted = self.store.delete_daily(today, target_user_id)
+        deleted = self.store.delete_history(target_user_id, today) or deleted
+        await self.writer.commit()
+
+        # 换一条随机数流，下次查询重新抽取人品值
+        self.jrrp_engine.reroll(target_user_id, today)
+        self._precomputed.pop(target_user_id, None)
 
         # 从正在处理的集合中移除（如果存在）
-        self.processing_users.discard(target_user_id)
+        self.processing_users.pop(target_user_id, None)
 
         action_desc = f"{target_nickname} 的" if is_target_others else "您的"
         if deleted:
@@ -1201,8 +1777,55 @@ class DailyFortunePlugin(Star):
         else:
             yield event.plain_result(f"ℹ️ {action_desc}今日还没有人品记录，无需初始化")
 
+    @filter.command("jrrppurge")
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @timed_command("jrrppurge")
+    async def jrrppurge(self, event: AstrMessageEvent, user_ids: str = ""):
+        """批量删除指定用户的全部人品数据（仅管理员）"""
+        # 检查群聊白名单
+        if not self._check_group_whitelist(event):
+            yield event.plain_result("")
+            return
+
+        # 防止触发LLM调用
+        event.should_call_llm(False)
+
+        # 参数可能被空格拆开，直接从消息中解析
+        target_user_ids = self._get_user_ids_from_event(event, "purge")
+        if not target_user_ids:
+            yield event.plain_result("ℹ️ 请指定要删除数据的用户ID（逗号分隔）或@用户，例如：/jrrppurge 123456,234567 --confirm")
+            return
+
+        id_list = ",".join(target_user_ids)
+        if not self._has_confirm_param(event):
+            yield event.plain_result(f"⚠️ 警告：此操作将删除以下 {len(target_user_ids)} 个用户的全部人品数据（包括今日记录），且无法恢复！\n"
+                                     f"{id_list}\n如确认删除，请使用：/jrrppurge {id_list} --confirm")
+            return
+
+        today = self._get_today_key()
+
+        with self.watchdog.blocking("delete"):
+            # 先把今日记录移出排行榜等内存结构
+            for user_id in target_user_ids:
+                record = self.store.get_daily(today, user_id)
+                if record is not None:
+                    self.leaderboards.remove(record.get("group_id", ""), user_id)
+                    self.rollups.remove(record.get("group_id", ""), user_id, today)
+                    self.score_histograms.remove(record.get("group_id", ""), record["jrrp"])
+                self.processing_users.pop(user_id, None)
+                self._precomputed.pop(user_id, None)
+            deleted_count = self.store.delete_users(target_user_ids)
+            self.rollups.forget_users(target_user_ids, names=True)
+            self.profile_cache.forget_users(target_user_ids)
+        await self.writer.commit()
+        await self._save_rollups()
+
+        logger.info(f"[daily_fortune] 管理员 {event.get_sender_id()} 删除了 {len(target_user_ids)} 个用户的数据（共 {deleted_count} 条）")
+        yield event.plain_result(f"✅ 已删除 {len(target_user_ids)} 个用户的人品数据（共 {deleted_count} 条）")
+
     @filter.command("jrrpreset", alias={"jrrpre"})
     @filter.permission_type(filter.PermissionType.ADMIN)
+    @timed_command("jrrpreset")
     async def jrrpreset(self, event: AstrMessageEvent, confirm: str = ""):
         """重置所有人品数据（仅管理员）"""
         # 检查群聊白名单
@@ -1219,20 +1842,267 @@ class DailyFortunePlugin(Star):
             return
 
         # 清空所有数据
-        self.daily_data = {}
-        self.history_data = {}
-        self._save_data(self.daily_data, self.fortune_file)
-        self._save_data(self.history_data, self.history_file)
+        with self.watchdog.blocking("reset"):
+            self.store.reset()
+            self.leaderboards.reset(self._get_today_key())
+            self.score_histograms.reset(self._get_today_key())
+            self.rollups.reset()
+        await self.writer.commit()
+        await self._save_rollups()
 
         # 清空正在处理的用户集合
         self.processing_users.clear()
 
         yield event.plain_result("✅ 所有人品数据已重置")
 
+    @filter.command("jrrpmetrics")
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @timed_command("jrrpmetrics")
+    async def jrrpmetrics(self, event: AstrMessageEvent, action: str = ""):
+        """查看插件运行指标（仅管理员），带 reset 参数时清空累计的耗时和计数"""
+        event.should_call_llm(False)
+
+        if not self.metrics.enabled:
+            yield event.plain_result("运行指标未开启，请在配置中打开 metrics.enable")
+            return
+
+        if action.lower() == "reset":
+            self.metrics.reset()
+            yield event.plain_result("✅ 运行指标已清空")
+            return
+
+        yield event.plain_result(self.metrics.render_text(self._runtime_gauges()))
+
+    @filter.command("jrrplag")
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @timed_command("jrrplag")
+    async def jrrplag(self, event: AstrMessageEvent, action: str = ""):
+        """查看事件循环卡顿统计及其归属的插件阶段（仅管理员），带 reset 参数时清空"""
+        event.should_call_llm(False)
+
+        if not self.watchdog.enabled:
+            yield event.plain_result("事件循环监控未开启，请在配置中打开 loop_watchdog.enable")
+            return
+
+        if action.lower() == "reset":
+            self.watchdog.reset()
+            yield event.plain_result("✅ 事件循环监控统计已清空")
+            return
+
+        yield event.plain_result(self.watchdog.summary())
+
+    @filter.command("jrrpprofile")
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @timed_command("jrrpprofile")
+    async def jrrpprofile(self, event: AstrMessageEvent, action: str = "", option: str = ""):
+        """按需分析指令处理器的耗时和插件的内存占用（仅管理员）"""
+        event.should_call_llm(False)
+        action = action.lower()
+
+        if action == "start":
+            if self.profiler.active:
+                yield event.plain_result("ℹ️ 性能分析已在进行中，使用 jrrp profile stop 结束")
+                return
+            try:
+                self.profiler.start()
+            except ValueError as e:
+                yield event.plain_result(f"❌ 无法启动cProfile（可能有其他分析工具正在运行）: {e}")
+                return
+            max_seconds = self.config.get("profiling", {}).get("max_seconds", 600)
+            if max_seconds > 0:
+                self._profile_timeout_task = asyncio.create_task(self._stop_profile_after(max_seconds))
+            limit = f"，{max_seconds} 秒后自动停止" if max_seconds > 0 else ""
+            yield event.plain_result(f"✅ 已开始记录指令处理器的性能数据{limit}，使用 jrrp profile stop 查看结果")
+            return
+
+        if action == "stop":
+            result = await self._finish_profile()
+            yield event.plain_result(result or "ℹ️ 当前没有在进行性能分析，使用 jrrp profile start 开始")
+            return
+
+        if action == "mem":
+            yield event.plain_result(await self._memory_report(option.lower() == "stop"))
+            return
+
+        profiling = f"记录中，已记录 {self.profiler.calls} 次指令" if self.profiler.active else "未开启"
+        status = [f"cProfile: {profiling}",
+                  f"tracemalloc: {'追踪中' if self.profiler.tracing() else '未开启'}",
+                  "用法: jrrp profile start | stop | mem | mem stop"]
+        yield event.plain_result("\n".join(status))
+
+    async def _stop_profile_after(self, seconds: float):
+        await asyncio.sleep(seconds)
+        result = await self._finish_profile(cancel_timeout=False)
+        if result:
+            logger.info(f"[daily_fortune] 性能分析已到达最长时间，自动停止\n{result}")
+
+    async def _finish_profile(self, cancel_timeout: bool = True) -> Optional[str]:
+        """停止cProfile并写入pstats文件，返回摘要；没有在记录时返回None"""
+        if cancel_timeout and self._profile_timeout_task:
+            self._profile_timeout_task.cancel()
+        self._profile_timeout_task = None
+        calls, duration = self.profiler.calls, time.time() - self.profiler.started_at
+        profile = self.profiler.stop()
+        if profile is None:
+            return None
+        try:
+            path, summary = await asyncio.to_thread(self.profiler.dump, profile)
+        except Exception as e:
+            logger.error(f"[daily_fortune] 写入性能分析结果失败: {e}")
+            return f"❌ 写入性能分析结果失败: {e}"
+        return (f"📈 性能分析结果（{duration:.0f} 秒，{calls} 次指令，本插件函数按累计耗时排序）\n"
+                f"{summary}\n完整结果: {path}")
+
+    async def _memory_report(self, stop: bool = False) -> str:
+        """估算主要数据结构的内存占用；tracemalloc追踪中时附带按代码行的分配统计"""
+        if stop:
+            if not self.profiler.tracing():
+                return "ℹ️ tracemalloc未在追踪"
+            self.profiler.stop_tracing()
+            self._tracing_started = False
+            return "✅ 已停止tracemalloc追踪"
+
+        with self.watchdog.blocking("profile_mem"):
+            sizes = structure_sizes(self._memory_structures())
+        lines = ["🧠 主要数据结构的内存占用（估算）", format_sizes(sizes)]
+
+        if not self.profiler.tracing():
+            self.profiler.start_tracing()
+            self._tracing_started = True
+            lines.append("已开始tracemalloc追踪（会降低运行速度），一段时间后再次执行 jrrp profile mem "
+                         "查看分配位置，jrrp profile mem stop 停止追踪")
+        else:
+            try:
+                path, report = await asyncio.to_thread(self.profiler.memory_report)
+                lines += [report, f"快照: {path}"]
+            except Exception as e:
+                lines.append(f"❌ 拍摄内存快照失败: {e}")
+        return "\n".join(lines)
+
+    def _memory_structures(self) -> Dict[str, Any]:
+        structures = {f"store.{name}": value for name, value in self.store.memory_structures().items()}
+        structures.update({
+            "leaderboards": self.leaderboards,
+            "score_histograms": self.score_histograms,
+            "rollups": self.rollups,
+            "profile_cache": self.profile_cache,
+            "metrics": self.metrics
+        })
+        if self.text_pool:
+            structures["text_pool"] = self.text_pool
+        return structures
+
+    def _runtime_gauges(self) -> Dict[str, Dict[str, Any]]:
+        """收集内存中各结构的当前大小和各组件的统计"""
+        gauges = {
+            "store": self.store.memory_stats(),
+            "plugin": {
+                "processing_users": len(self.processing_users),
+                "leaderboard_groups": self.leaderboards.group_count(),
+                "today_records": self.score_histograms.overall.total,
+                "rollup_groups": self.rollups.group_count()
+            },
+            "writer": self.writer.stats(),
+            "llm_scheduler": self.llm_scheduler.stats(),
+            "profile_cache": self.profile_cache.stats()
+        }
+        if self.text_pool:
+            gauges["text_pool"] = self.text_pool.stats()
+        if self.watchdog.enabled:
+            gauges["loop"] = {
+                "lag_p99_ms": round(self.watchdog.lag.quantile(0.99), 2),
+                "lag_max_ms": round(self.watchdog.lag.max_ms, 2),
+                "stalls": self.watchdog.stalls
+            }
+        return gauges
+
+    async def _export_metrics_loop(self):
+        """定期把运行指标以Prometheus文本格式写入数据目录"""
+        metrics_config = self.config.get("metrics", {})
+        interval = max(5, metrics_config.get("prometheus_interval", 60))
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            await self._export_metrics()
+
+    async def _export_metrics(self):
+        """渲染在事件循环中完成，写文件在线程池中进行"""
+        path = self.data_dir / self.config.get("metrics", {}).get("prometheus_file", "metrics.prom")
+        with self.watchdog.blocking("metrics_export"):
+            text = self.metrics.render_prometheus(self._runtime_gauges())
+        try:
+            await asyncio.to_thread(Metrics.write, path, text)
+        except Exception as e:
+            logger.error(f"[daily_fortune] 写入运行指标文件失败: {e}")
+
     async def terminate(self):
         """插件卸载时的清理工作"""
         logger.info("astrbot_plugin_daily_fortune1 插件正在卸载...")
 
+        try:
+            # 停止后台压缩任务，并把剩余journal合并进快照
+            self._stop_event.set()
+            try:
+                await self._compact_task
+            except Exception as e:
+                logger.debug(f"[daily_fortune] 等待压缩任务结束失败: {e}")
+            try:
+                await self._rollover_task
+            except Exception as e:
+                logger.debug(f"[daily_fortune] 等待日期切换任务结束失败: {e}")
+
+            if self._watchdog_task:
+                try:
+                    await self._watchdog_task
+                except Exception as e:
+                    logger.debug(f"[daily_fortune] 等待事件循环监控任务结束失败: {e}")
+
+            # 结束进行中的性能分析，停止本插件开启的内存追踪
+            try:
+                if self.profiler.active:
+                    result = await self._finish_profile()
+                    logger.info(f"[daily_fortune] 卸载时结束性能分析\n{result}")
+                if self._tracing_started and self.profiler.tracing():
+                    self.profiler.stop_tracing()
+            except Exception as e:
+                logger.warning(f"[daily_fortune] 卸载时结束性能分析失败: {e}")
+
+            # 等待指标导出任务结束（停止前会再写一次文件）
+            if self._metrics_task:
+                try:
+                    await self._metrics_task
+                except Exception as e:
+                    logger.debug(f"[daily_fortune] 等待指标导出任务结束失败: {e}")
+
+            # 停止预生成任务（可能正在等待LLM，直接取消）
+            if self._pool_task:
+                self._pool_task.cancel()
+                try:
+                    await self._pool_task
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.debug(f"[daily_fortune] 等待预生成任务结束失败: {e}")
+                logger.info(f"[daily_fortune] 预生成文本池统计: {self.text_pool.stats()}")
+            logger.info(f"[daily_fortune] LLM调度器统计: {self.llm_scheduler.stats()}")
+            logger.info(f"[daily_fortune] 用户信息缓存统计: {self.profile_cache.stats()}")
+            if self.api_client:
+                logger.info(f"[daily_fortune] 第三方API统计: {self.api_client.stats()}")
+                await self.api_client.close()
+        finally:
+            # 最后一次刷写缓冲区中的写操作，前面的清理步骤出错也必须执行
+            await self.writer.close()
+            logger.info(f"[daily_fortune] 延迟写入统计: {self.writer.stats()}")
+            try:
+                self.store.compact()
+            except Exception as e:
+                logger.error(f"[daily_fortune] journal压缩失败: {e}")
+            self.store.close()
+            # 等待进行中的汇总保存完成（已封存部分在每次变化时都已保存）
+            await self._save_rollups()
+
         # 根据配置决定是否删除数据
         if self.config.get("delete_data_on_uninstall", False):
             import shutil
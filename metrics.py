@@ -0,0 +1,231 @@
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+# 耗时直方图的桶上界（毫秒），最后一个桶为 +Inf
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# 当前正在计时的指令（用于识别 jrrp rank 这类转发到其他指令的调用）
+_active_command: ContextVar[Optional[Dict[str, bool]]] = ContextVar("daily_fortune_active_command", default=None)
+
+
+class LatencyHistogram:
+    """固定分桶的耗时直方图，记录次数、总耗时和最大值，分位数按桶线性插值估算"""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS_MS[i - 1] if i else 0.0
+                upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max_ms)
+            seen += n
+        return self.max_ms
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class Metrics:
+    """插件内的运行指标
+
+    - 耗时直方图按 (类别, 名称) 区分，类别为 command（指令）、phase（阶段）和 save（持久化）
+    - 计数器按 (名称, 标签) 区分，如 ("llm_calls", "success")、("save_bytes", "write_behind")
+    - 内存大小等瞬时值不在这里保存，由插件在输出时收集后传入
+
+    enabled为False时所有记录方法直接返回，只剩一次属性判断的开销。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.counters: Dict[Tuple[str, str], float] = {}
+
+    def observe(self, kind: str, name: str, ms: float):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get((kind, name))
+        if histogram is None:
+            histogram = self.histograms[(kind, name)] = LatencyHistogram()
+        histogram.observe(ms)
+
+    def incr(self, name: str, label: str = "", n: float = 1):
+        if not self.enabled:
+            return
+        key = (name, label)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    @contextmanager
+    def time(self, kind: str, name: str) -> Iterator[None]:
+        """记录with块的耗时（异常退出也会记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(kind, name, (time.perf_counter() - start) * 1000)
+
+    def reset(self):
+        self.started_at = time.time()
+        self.histograms.clear()
+        self.counters.clear()
+
+    def histograms_of(self, kind: str) -> List[Tuple[str, LatencyHistogram]]:
+        return sorted((name, h) for (k, name), h in self.histograms.items() if k == kind)
+
+    def counters_of(self, name: str) -> Dict[str, float]:
+        return {label: value for (n, label), value in self.counters.items() if n == name}
+
+    # ---------- 输出 ----------
+
+    def render_text(self, sections: Mapping[str, Mapping[str, Any]]) -> str:
+        """管理员指令输出的文本摘要，sections 为 标题 -> {指标: 值} 的瞬时状态"""
+        lines = [f"📊 运行指标（统计 {format_duration(time.time() - self.started_at)}）"]
+        for kind, title in (("command", "指令耗时"), ("phase", "阶段耗时"), ("save", "持久化耗时")):
+            rows = self.histograms_of(kind)
+            if not rows:
+                continue
+            lines.append(f"━━ {title} (ms) ━━")
+            for name, h in rows:
+                lines.append(f"{name}: {h.count}次 p50 {h.quantile(0.5):.1f} p95 {h.quantile(0.95):.1f} "
+                             f"p99 {h.quantile(0.99):.1f} max {h.max_ms:.1f}")
+
+        counter_names = sorted({name for name, _ in self.counters})
+        if counter_names:
+            lines.append("━━ 计数 ━━")
+            for name in counter_names:
+                values = ", ".join(f"{label or 'total'}={_format_number(value)}"
+                                   for label, value in sorted(self.counters_of(name).items()))
+                lines.append(f"{name}: {values}")
+
+        for title, values in sections.items():
+            if values:
+                lines.append(f"━━ {title} ━━")
+                lines.append(", ".join(f"{key}={_format_number(value)}" for key, value in values.items()))
+        return "\n".join(lines)
+
+    def render_prometheus(self, gauges: Mapping[str, Mapping[str, Any]], prefix: str = "daily_fortune") -> str:
+        """Prometheus文本格式（node_exporter textfile collector 可直接读取）
+
+        gauges 为 组名 -> {指标: 值}，只输出数值，组名和指标名拼接为指标名。
+        """
+        out: List[str] = []
+        for kind, label in (("command", "command"), ("phase", "phase"), ("save", "target")):
+            rows = self.histograms_of(kind)
+            if not rows:
+                continue
+            metric = f"{prefix}_{kind}_duration_seconds"
+            out.append(f"# TYPE {metric} histogram")
+            for name, h in rows:
+                cumulative = 0
+                for bound, n in zip(BUCKETS_MS, h.counts):
+                    cumulative += n
+                    out.append(f'{metric}_bucket{{{label}="{_escape(name)}",le="{bound / 1000:g}"}} {cumulative}')
+                out.append(f'{metric}_bucket{{{label}="{_escape(name)}",le="+Inf"}} {h.count}')
+                out.append(f'{metric}_sum{{{label}="{_escape(name)}"}} {h.total_ms / 1000:.6f}')
+                out.append(f'{metric}_count{{{label}="{_escape(name)}"}} {h.count}')
+
+        for name in sorted({name for name, _ in self.counters}):
+            metric = f"{prefix}_{name}_total"
+            out.append(f"# TYPE {metric} counter")
+            for label, value in sorted(self.counters_of(name).items()):
+                labels = f'{{label="{_escape(label)}"}}' if label else ""
+                out.append(f"{metric}{labels} {_format_number(value)}")
+
+        for group, values in gauges.items():
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric = f"{prefix}_{group}_{key}"
+                out.append(f"# TYPE {metric} gauge")
+                out.append(f"{metric} {_format_number(value)}")
+        return "\n".join(out) + "\n"
+
+    @staticmethod
+    def write(path: Path, text: str):
+        """先写临时文件再替换，采集程序不会读到写了一半的文件（可在线程中调用）"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+def timed_command(name: str) -> Callable:
+    """记录指令处理器（异步生成器）的总耗时和异常次数
+
+    从其他指令转发进来的调用（如 jrrp rank -> jrrprank）只记在被转发的指令名下，
+    外层指令不再重复记录。处理器所属对象需要有 metrics 属性；有 profiler 属性且正在记录时，
+    处理器运行期间同时启用cProfile。
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            outer = _active_command.get()
+            if outer is not None:
+                outer["routed"] = True
+            state = {"routed": False}
+            token = _active_command.set(state)
+            profiler = getattr(self, "profiler", None)
+            profile = profiler.enter() if profiler is not None and profiler.active else None
+            start = time.perf_counter()
+            try:
+                async for result in func(self, *args, **kwargs):
+                    yield result
+            except Exception:
+                self.metrics.incr("command_errors", name)
+                raise
+            finally:
+                try:
+                    _active_command.reset(token)
+                except ValueError:
+                    # 生成器被垃圾回收时在其他上下文中关闭
+                    pass
+                if not state["routed"]:
+                    self.metrics.observe("command", name, (time.perf_counter() - start) * 1000)
+                if profile is not None:
+                    profiler.exit(profile)
+        return wrapper
+    return decorator
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.6g}" if not value.is_integer() else str(int(value))
+    return str(value)
+
+
+def format_duration(seconds: float) -> str:
+    minutes, _ = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    if days:
+        return f"{days}天{hours}小时"
+    if hours:
+        return f"{hours}小时{minutes}分钟"
+    return f"{minutes}分钟"
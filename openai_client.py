@@ -0,0 +1,159 @@
+import asyncio
+import random
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from astrbot.api import logger
+
+from .llm_scheduler import remaining_time
+
+
+# 这些状态码通常是临时性的，可以重试
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# 距调度器截止时间不足此秒数时不再重试
+MIN_ATTEMPT_SECONDS = 1.0
+
+
+class OpenAIAPIError(Exception):
+    """第三方接口返回错误或重试次数用尽"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMResponse:
+    """与AstrBot provider返回值保持一致，只提供插件用到的 completion_text"""
+
+    def __init__(self, completion_text: str, raw: Optional[Dict[str, Any]] = None):
+        self.completion_text = completion_text
+        self.raw = raw
+
+    def __repr__(self):
+        return f"LLMResponse(completion_text={self.completion_text!r})"
+
+
+def normalize_chat_url(url: str) -> str:
+    """支持填写到 /v1 或 /v1/chat/completions"""
+    url = url.rstrip('/')
+    if not url.endswith('/chat/completions'):
+        if url.endswith('/v1'):
+            url += '/chat/completions'
+        else:
+            url += '/v1/chat/completions'
+    return url
+
+
+class OpenAICompatibleClient:
+    """兼容OpenAI接口的第三方LLM客户端
+
+    插件生命周期内复用同一个 aiohttp.ClientSession，连接池保持长连接并限制连接数；
+    每次请求有独立的超时，遇到网络错误、429和5xx时按指数退避加随机抖动重试。
+    在LLM调度器中调用时，每次请求的超时不超过调度器剩余的时间，剩余时间不够时不再重试。
+    text_chat() 的签名和返回值与AstrBot provider一致，可以直接替代provider使用。
+    """
+
+    def __init__(self, url: str, api_key: str, model: str = "gpt-3.5-turbo",
+                 max_connections: int = 10, timeout: float = 10.0, max_retries: int = 2,
+                 retry_backoff: float = 0.5, keepalive_timeout: float = 30.0):
+        self.url = normalize_chat_url(url)
+        self.api_key = api_key
+        self.model = model
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    'Authorization': f"Bearer {self.api_key}",
+                    'Content-Type': 'application/json'
+                }
+            )
+        return self._session
+
+    async def text_chat(self, prompt: str = "", contexts: Optional[List[Dict[str, Any]]] = None,
+                        system_prompt: str = "", max_tokens: Optional[int] = None, **kwargs) -> LLMResponse:
+        messages = []
+        if system_prompt:
+            messages.append({'role': 'system', 'content': system_prompt})
+        messages.extend(contexts or [])
+        messages.append({'role': 'user', 'content': prompt})
+
+        payload = {'model': self.model, 'messages': messages}
+        if max_tokens:
+            payload['max_tokens'] = max_tokens
+        data = await self._post(payload)
+
+        try:
+            text = data['choices'][0]['message']['content'] or ""
+        except (KeyError, IndexError, TypeError):
+            raise OpenAIAPIError(f"无法解析接口返回: {str(data)[:200]}")
+        return LLMResponse(text.strip(), data)
+
+    async def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        session = self._get_session()
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # 指数退避 + 全抖动，避免大量请求同时重试
+                delay = random.uniform(0, self.retry_backoff * (2 ** (attempt - 1)))
+                remaining = remaining_time()
+                if remaining is not None and remaining - delay < MIN_ATTEMPT_SECONDS:
+                    logger.debug(f"[daily_fortune] 距截止时间只剩 {remaining:.1f}s，不再重试: {last_error}")
+                    break
+                self.retries += 1
+                logger.debug(f"[daily_fortune] 第三方API第 {attempt} 次重试，等待 {delay:.2f}s: {last_error}")
+                await asyncio.sleep(delay)
+
+            remaining = remaining_time()
+            attempt_timeout = self.timeout if remaining is None else max(0.001, min(self.timeout, remaining))
+            timeout = aiohttp.ClientTimeout(total=attempt_timeout)
+            self.requests += 1
+            try:
+                async with session.post(self.url, json=payload, timeout=timeout) as resp:
+                    if resp.status == 200:
+                        return await resp.json(content_type=None)
+                    text = await resp.text()
+                    last_error = OpenAIAPIError(f"HTTP {resp.status}: {text[:200]}", resp.status)
+                    if resp.status not in RETRYABLE_STATUS:
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = OpenAIAPIError(f"{type(e).__name__}: {e}")
+
+        self.errors += 1
+        raise last_error
+
+    async def ping(self) -> bool:
+        """发送一次最小请求测试连通性"""
+        try:
+            await self.text_chat(prompt="REPLY `PONG` ONLY", max_tokens=10)
+            return True
+        except Exception as e:
+            logger.warning(f"[daily_fortune] 第三方API连接测试失败: {e}")
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "retries": self.retries, "errors": self.errors}
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
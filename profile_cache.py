@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+ProfileKey = Tuple[str, str, str]
+
+
+class ProfileCache:
+    """按 (平台, 群号, 用户ID) 缓存用户的昵称、群名片和头衔
+
+    条目超过 ttl 秒视为过期；条目数超过 max_size 时淘汰最久未使用的条目。
+    群名片和头衔是群内属性，因此群号也是键的一部分，私聊时群号为空字符串。
+    """
+
+    def __init__(self, ttl: float = 600, max_size: int = 2000):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[ProfileKey, Tuple[float, Dict[str, str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, key: ProfileKey) -> Optional[Dict[str, str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, profile = entry
+        if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return profile
+
+    def peek(self, key: ProfileKey) -> Optional[Dict[str, str]]:
+        """查看未过期的条目，不计入命中统计，也不更新使用顺序"""
+        entry = self._entries.get(key)
+        if entry is None or (self.ttl > 0 and time.monotonic() - entry[0] > self.ttl):
+            return None
+        return entry[1]
+
+    def put(self, key: ProfileKey, nickname: str, card: str = "", title: str = "") -> Dict[str, str]:
+        profile = {
+            "nickname": nickname,
+            "card": card or nickname,
+            "title": title or "无"
+        }
+        self._entries[key] = (time.monotonic(), profile)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        return profile
+
+    def forget_users(self, user_ids) -> int:
+        """删除这些用户在所有平台和群中的条目，返回删除的条目数"""
+        targets = set(user_ids)
+        keys = [key for key in self._entries if key[2] in targets]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
@@ -0,0 +1,183 @@
+import cProfile
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import deque
+from pathlib import Path
+from types import FunctionType, ModuleType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+PLUGIN_DIR = str(Path(__file__).resolve().parent)
+
+
+class HandlerProfiler:
+    """按需开启的指令处理器性能分析
+
+    start() 后，只要有指令处理器在运行就启用cProfile，所有处理器都结束后停用，
+    因此空闲时和其他插件单独运行时不会被记录（处理器await期间运行的其他任务仍会被记录，
+    汇总时只列出本插件的函数）。stop() 把结果写成 .pstats 文件，可用 pstats / snakeviz 查看。
+
+    未开启时处理器包装只多一次 active 属性判断。
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.active = False
+        self.started_at = 0.0
+        self.calls = 0
+        self._profile: Optional[cProfile.Profile] = None
+        self._depth = 0
+        # 上一次内存快照按代码行汇总的结果，用于比较增长
+        self._last_allocations: Optional[Dict[str, List[int]]] = None
+
+    # ---------- cProfile ----------
+
+    def start(self):
+        """开始记录，已有其他分析工具（如另一个profiler或调试器）占用时抛出ValueError"""
+        profile = cProfile.Profile()
+        # 先试探一次，避免在处理器中途才发现无法启用
+        profile.enable()
+        profile.disable()
+        self._profile = profile
+        self._depth = 0
+        self.calls = 0
+        self.started_at = time.time()
+        self.active = True
+
+    def enter(self) -> Optional[cProfile.Profile]:
+        """处理器开始运行，返回本次记录的Profile，结束时传给exit()"""
+        self.calls += 1
+        self._depth += 1
+        if self._depth == 1:
+            self._profile.enable()
+        return self._profile
+
+    def exit(self, profile: Optional[cProfile.Profile]):
+        # 处理器运行期间记录已被停止（或重新开始）时忽略
+        if profile is None or profile is not self._profile:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            profile.disable()
+
+    def stop(self) -> Optional[cProfile.Profile]:
+        """停止记录并返回结果，没有在记录时返回None"""
+        if not self.active:
+            return None
+        self.active = False
+        profile, self._profile = self._profile, None
+        profile.disable()
+        self._depth = 0
+        return profile
+
+    def dump(self, profile: cProfile.Profile, limit: int = 15) -> Tuple[Path, str]:
+        """写入pstats文件并返回 (文件路径, 本插件函数按累计耗时排序的摘要)，可在线程中调用"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"handlers-{time.strftime('%Y%m%d-%H%M%S')}.pstats"
+        profile.dump_stats(str(path))
+
+        stats = pstats.Stats(profile)
+        rows: List[Tuple[float, float, int, str]] = []
+        for (filename, lineno, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            if filename.startswith(PLUGIN_DIR):
+                rows.append((cumtime, tottime, ncalls, f"{Path(filename).name}:{lineno}({func})"))
+        rows.sort(reverse=True)
+        lines = [f"{'累计ms':>9} {'自身ms':>9} {'调用':>7}  函数"]
+        lines += [f"{cum * 1000:9.1f} {tot * 1000:9.1f} {n:7d}  {name}" for cum, tot, n, name in rows[:limit]]
+        return path, "\n".join(lines)
+
+    # ---------- tracemalloc ----------
+
+    @staticmethod
+    def tracing() -> bool:
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self, frames: int = 10):
+        tracemalloc.start(frames)
+        self._last_allocations = None
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self._last_allocations = None
+
+    def memory_report(self, limit: int = 10) -> Tuple[Path, str]:
+        """拍摄快照并写入文件，返回本插件代码分配的内存以及与上一次快照的差异，可在线程中调用
+
+        调用栈中经过本插件的分配（包括在json、sqlite3等标准库中完成的分配）都归到
+        栈上最近的一行插件代码，这样能看出是哪个数据结构的构建占用了内存。
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(True, PLUGIN_DIR + "*", all_frames=True),)
+        )
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"memory-{time.strftime('%Y%m%d-%H%M%S')}.tracemalloc"
+        snapshot.dump(str(path))
+
+        allocations: Dict[str, List[int]] = {}
+        for trace in snapshot.traces:
+            for frame in reversed(trace.traceback):
+                if frame.filename.startswith(PLUGIN_DIR):
+                    entry = allocations.setdefault(f"{Path(frame.filename).name}:{frame.lineno}", [0, 0])
+                    entry[0] += trace.size
+                    entry[1] += 1
+                    break
+
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"进程已追踪内存: {_format_bytes(current)}（峰值 {_format_bytes(peak)}）",
+                 f"经过本插件代码的分配: {_format_bytes(sum(size for size, _ in allocations.values()))}"]
+        for location, (size, count) in sorted(allocations.items(), key=lambda x: -x[1][0])[:limit]:
+            lines.append(f"  {location} {_format_bytes(size)} ({count}个)")
+        if self._last_allocations is not None:
+            diffs = [(size - self._last_allocations.get(location, [0])[0], location)
+                     for location, (size, _) in allocations.items()]
+            diffs += [(-size, location) for location, (size, _) in self._last_allocations.items()
+                      if location not in allocations]
+            diffs = sorted((d for d in diffs if d[0]), key=lambda x: -abs(x[0]))[:limit]
+            if diffs:
+                lines.append("与上次快照相比:")
+                lines += [f"  {location} {diff:+,d} B" for diff, location in diffs]
+        self._last_allocations = allocations
+        return path, "\n".join(lines)
+
+
+def deep_sizeof(obj: Any) -> int:
+    """递归估算对象及其引用的容器、字符串等占用的字节数（同一对象只计一次）"""
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, ModuleType, FunctionType)):
+            continue
+        seen.add(id(item))
+        nbytes = getattr(item, "nbytes", None)
+        if isinstance(nbytes, int) and not isinstance(item, (bytes, bytearray)):
+            # NumPy数组
+            total += nbytes
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, Mapping):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+    return total
+
+
+def structure_sizes(structures: Mapping[str, Any]) -> Dict[str, int]:
+    return {name: deep_sizeof(obj) for name, obj in structures.items()}
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size:.0f} B"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def format_sizes(sizes: Mapping[str, int]) -> str:
+    return "\n".join(f"  {name}: {_format_bytes(size)}" for name, size in sorted(sizes.items(), key=lambda x: -x[1]))
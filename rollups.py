@@ -0,0 +1,187 @@
+import json
+import os
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+PERIODS = ("week", "month", "all")
+
+
+def period_key(period: str, day: str) -> str:
+    """返回某日所属的统计周期，如 week:2026-W42、month:2026-10、all"""
+    if period == "week":
+        year, week, _ = date.fromisoformat(day).isocalendar()
+        return f"week:{year}-W{week:02d}"
+    if period == "month":
+        return f"month:{day[:7]}"
+    return "all"
+
+
+def period_label(period: str, day: str) -> str:
+    """周期的展示文本"""
+    if period == "week":
+        start = date.fromisoformat(day) - timedelta(days=date.fromisoformat(day).weekday())
+        return f"{start.isoformat()} ~ {(start + timedelta(days=6)).isoformat()}"
+    if period == "month":
+        return day[:7]
+    return f"截至 {day}"
+
+
+class GroupRollups:
+    """按群汇总的周/月/总人品值
+
+    已封存的日期按 群 -> 周期 -> 用户 -> [总和, 天数] 累加，日期切换时把前一天的记录一次性计入；
+    尚未封存的日期（通常只有今天）单独按 日期 -> 群 -> 用户 -> 人品值 保存，随每次查询增删，
+    查询时与已封存的汇总合并，因此不需要扫描任何用户的历史记录。
+
+    只有已封存的部分需要持久化，未封存的部分在启动时由今日记录重建；周和月只保留最新的一个周期。
+    """
+
+    def __init__(self):
+        self.sealed_through = ""
+        self._sealed: Dict[str, Dict[str, Dict[str, List[int]]]] = {}
+        self._open: Dict[str, Dict[str, Dict[str, int]]] = {}
+        # group_id -> {user_id: 最近一次使用的昵称}
+        self.names: Dict[str, Dict[str, str]] = {}
+
+    # ---------- 增量更新 ----------
+
+    def add(self, group_id: str, user_id: str, day: str, jrrp: int, nickname: str = ""):
+        """记录一次查询，私聊记录(group_id为空)和已封存日期的记录忽略"""
+        if not group_id or day <= self.sealed_through:
+            return
+        self._open.setdefault(day, {}).setdefault(group_id, {})[user_id] = jrrp
+        if nickname:
+            self.names.setdefault(group_id, {})[user_id] = nickname
+
+    def add_sealed(self, group_id: str, user_id: str, day: str, jrrp: int, nickname: str = ""):
+        """把已封存日期的一条记录补充计入汇总（查询跨过日期切换才完成时）
+
+        周/月只计入仍在保留的当前周期，已经换到下一个周期时只计入总汇总。
+        """
+        if not group_id:
+            return
+        if day > self.sealed_through:
+            self.add(group_id, user_id, day, jrrp, nickname)
+            return
+        group = self._sealed.setdefault(group_id, {})
+        for period in PERIODS:
+            key = period_key(period, day)
+            if period != "all" and key != period_key(period, self.sealed_through):
+                continue
+            totals = group.setdefault(key, {}).setdefault(user_id, [0, 0])
+            totals[0] += jrrp
+            totals[1] += 1
+        if nickname:
+            self.names.setdefault(group_id, {})[user_id] = nickname
+
+    def remove(self, group_id: str, user_id: str, day: str):
+        self._open.get(day, {}).get(group_id, {}).pop(user_id, None)
+
+    def seal(self, day: str, records: Iterable[Tuple[str, Dict[str, Any]]]):
+        """把某日的全部记录计入汇总，records 为 (user_id, 每日记录)，以存储中的记录为准"""
+        if day <= self.sealed_through:
+            return
+        self._open.pop(day, None)
+        keys = [period_key(period, day) for period in PERIODS]
+        for user_id, record in records:
+            group_id = record.get("group_id", "")
+            if not group_id:
+                continue
+            group = self._sealed.setdefault(group_id, {})
+            for key in keys:
+                totals = group.setdefault(key, {}).setdefault(user_id, [0, 0])
+                totals[0] += record["jrrp"]
+                totals[1] += 1
+            if record.get("nickname"):
+                self.names.setdefault(group_id, {})[user_id] = record["nickname"]
+        self.sealed_through = day
+        self._prune(keys)
+
+    def _prune(self, current_keys: List[str]):
+        """删除早于当前周期的周/月汇总"""
+        for group in self._sealed.values():
+            for key in list(group):
+                kind = key.split(":", 1)[0]
+                if kind != "all" and key not in current_keys:
+                    del group[key]
+
+    def forget_user(self, user_id: str):
+        """从已封存的汇总中移除用户（删除历史记录时）"""
+        self.forget_users([user_id])
+
+    def forget_users(self, user_ids: Iterable[str], names: bool = False):
+        """从已封存的汇总中移除一批用户，names为True时同时移除保存的昵称"""
+        user_ids = set(user_ids)
+        tables = [users for group in self._sealed.values() for users in group.values()]
+        if names:
+            tables += self.names.values()
+        for users in tables:
+            for user_id in user_ids & users.keys():
+                del users[user_id]
+
+    def reset(self):
+        self._sealed.clear()
+        self._open.clear()
+        self.names.clear()
+
+    # ---------- 查询 ----------
+
+    def ranking(self, group_id: str, period: str, day: str, min_days: int = 1) -> List[Tuple[str, float, int]]:
+        """返回按平均人品值从高到低排列的 (user_id, 平均值, 参与天数)，只包含参与天数达到min_days的用户"""
+        key = period_key(period, day)
+        totals: Dict[str, List[int]] = {
+            user_id: list(values) for user_id, values in self._sealed.get(group_id, {}).get(key, {}).items()
+        }
+        for open_day, groups in self._open.items():
+            if period_key(period, open_day) != key:
+                continue
+            for user_id, jrrp in groups.get(group_id, {}).items():
+                entry = totals.setdefault(user_id, [0, 0])
+                entry[0] += jrrp
+                entry[1] += 1
+        ranked = [(user_id, total / count, count) for user_id, (total, count) in totals.items()
+                  if count >= max(1, min_days)]
+        ranked.sort(key=lambda x: (-x[1], -x[2], x[0]))
+        return ranked
+
+    def group_count(self) -> int:
+        return len(self._sealed.keys() | {g for groups in self._open.values() for g in groups})
+
+    def nickname(self, group_id: str, user_id: str) -> str:
+        return self.names.get(group_id, {}).get(user_id, "未知")
+
+    # ---------- 持久化 ----------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sealed_through": self.sealed_through, "groups": self._sealed, "names": self.names}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GroupRollups":
+        rollups = cls()
+        rollups.sealed_through = data.get("sealed_through", "")
+        rollups._sealed = data.get("groups", {})
+        rollups.names = data.get("names", {})
+        return rollups
+
+    @classmethod
+    def load(cls, path: Path) -> "GroupRollups":
+        """读取汇总文件，不存在时返回空汇总（sealed_through为空）"""
+        if not path.exists():
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def dumps(self) -> str:
+        """序列化已封存的汇总，需要在修改汇总的线程（事件循环）中调用"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':'))
+
+    @staticmethod
+    def write(path: Path, text: str):
+        """原子写入 dumps() 的结果，可在线程中调用"""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,116 @@
+from bisect import bisect_left, insort
+from itertools import accumulate
+from typing import Dict, List, Optional
+
+# 每个直方图最多使用的计数格数（每个群一个直方图），分值范围更大时只为0-100建格
+MAX_BINS = 1024
+
+
+class Histogram:
+    """[low, high] 范围内的计数直方图，前缀和在首次读取时计算并缓存，直到下一次修改
+
+    范围以外的分值（分段配置以外的分数、修改配置前的记录）放在有序列表中，用二分查找计数，
+    因此任意分值的排名都是精确的。
+    """
+
+    def __init__(self, low: int = 0, high: int = 100):
+        self.low = low
+        self.high = high
+        self.counts: List[int] = [0] * (high - low + 1)
+        self.total = 0
+        self._outliers: List[int] = []
+        self._cumulative: Optional[List[int]] = None
+
+    def add(self, score: int, n: int = 1):
+        if self.low <= score <= self.high:
+            self.counts[score - self.low] += n
+            self._cumulative = None
+        elif n > 0:
+            for _ in range(n):
+                insort(self._outliers, score)
+        else:
+            for _ in range(-n):
+                del self._outliers[bisect_left(self._outliers, score)]
+        self.total += n
+
+    def count(self, score: int) -> int:
+        """分值恰好为score的人数"""
+        if self.low <= score <= self.high:
+            return self.counts[score - self.low]
+        pos = bisect_left(self._outliers, score)
+        end = pos
+        while end < len(self._outliers) and self._outliers[end] == score:
+            end += 1
+        return end - pos
+
+    def below(self, score: int) -> int:
+        """严格低于score的人数"""
+        below = bisect_left(self._outliers, score)
+        if score <= self.low:
+            return below
+        if self._cumulative is None:
+            self._cumulative = list(accumulate(self.counts))
+        return below + self._cumulative[min(score, self.high + 1) - self.low - 1]
+
+
+class ScoreHistograms:
+    """今日人品值分布（全局 + 按群），用于计算"打败了百分之多少的人"
+
+    每次查询只更新对应的计数，百分位是一次前缀和读取，不需要对今日记录排序。
+    计数格按运势分段覆盖的分值范围建立，支持负数和大于100的分值。
+    """
+
+    def __init__(self, day: str = "", low: int = 0, high: int = 100):
+        self.day = day
+        if high < low or high - low + 1 > MAX_BINS:
+            low, high = 0, 100
+        self.low = low
+        self.high = high
+        self.overall = self._new()
+        self._groups: Dict[str, Histogram] = {}
+
+    def _new(self) -> Histogram:
+        return Histogram(self.low, self.high)
+
+    def reset(self, day: str):
+        """切换日期时清空所有直方图"""
+        self.day = day
+        self.overall = self._new()
+        self._groups.clear()
+
+    def add(self, group_id: str, jrrp: int):
+        """计入一条今日记录，私聊记录(group_id为空)只计入全局分布"""
+        score = int(jrrp)
+        self.overall.add(score)
+        if group_id:
+            histogram = self._groups.get(group_id)
+            if histogram is None:
+                histogram = self._groups[group_id] = self._new()
+            histogram.add(score)
+
+    def remove(self, group_id: str, jrrp: int):
+        score = int(jrrp)
+        if self.overall.count(score):
+            self.overall.add(score, -1)
+        histogram = self._groups.get(group_id) if group_id else None
+        if histogram is not None and histogram.count(score):
+            histogram.add(score, -1)
+
+    def percentile(self, jrrp: int, group_id: Optional[str] = None, counted: bool = True) -> Optional[float]:
+        """返回人品值严格高于其他人的比例(0-100)
+
+        group_id为None时按全局分布计算，为空字符串（私聊）时返回None；
+        counted表示这个人品值是否已经计入直方图，已计入时从分母中排除自己。没有其他人时返回100。
+        """
+        if group_id is None:
+            histogram = self.overall
+        elif not group_id:
+            return None
+        else:
+            histogram = self._groups.get(group_id)
+            if histogram is None:
+                return 100.0
+        others = histogram.total - (1 if counted else 0)
+        if others <= 0:
+            return 100.0
+        return histogram.below(int(jrrp)) * 100 / others
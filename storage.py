@@ -0,0 +1,1428 @@
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from astrbot.api import logger
+
+from .history_columns import HistoryColumns
+from .history_stats import HistoryStats
+from .metrics import Metrics
+
+
+def _atomic_write_json(file_path: Path, data: Any, indent: Optional[int] = 2):
+    """先写临时文件再替换，避免写到一半崩溃导致文件损坏"""
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent,
+                  separators=None if indent is not None else (',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def _put_sorted(records: Dict[str, Any], day: str, data: Any):
+    """向按日期升序排列的dict写入记录并保持有序
+
+    按日期顺序追加时直接写入；写入更早的日期（补录）时才重新排序。
+    """
+    if not records or day in records or day > next(reversed(records)):
+        records[day] = data
+        return
+    records[day] = data
+    items = sorted(records.items())
+    records.clear()
+    records.update(items)
+
+
+def _append_lines(file_path: Path, lines: str):
+    """向追加日志写入若干行；上次写到一半的行先补上换行，读取时作为损坏行跳过"""
+    with open(file_path, 'a+b') as f:
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        f.write(lines.encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_archive(file_path: Path, users: Dict[str, Any]):
+    """写入一个gzip压缩的归档分区，先写临时文件再替换"""
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(users, f, ensure_ascii=False)
+    os.replace(tmp_path, file_path)
+
+
+def _read_index_log(file_path: Path) -> List[Tuple[str, str, bool]]:
+    """读取每日记录索引的追加日志，每行为 [user_id, 日期, 是否存在]"""
+    entries = []
+    if not file_path.exists():
+        return entries
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                user_id, day, exists = json.loads(line)
+            except (json.JSONDecodeError, ValueError, TypeError):
+                logger.warning(f"[daily_fortune] 跳过损坏的索引日志记录 {file_path.name}:{line_no}")
+                continue
+            entries.append((user_id, day, bool(exists)))
+    return entries
+
+
+def _load_json(file_path: Path, default: Any = None) -> Any:
+    """加载JSON文件，不存在或损坏时返回默认值"""
+    try:
+        if file_path.exists():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        logger.error(f"[daily_fortune] 加载数据文件失败 {file_path}: {e}")
+    return {} if default is None else default
+
+
+class BaseStore:
+    """存储后端接口
+
+    插件只通过这些方法读写数据，不直接遍历内部结构，
+    因此可以在JSON和SQLite等不同后端之间切换。
+    """
+
+    # 自上次压缩以来未合并的记录数（不需要压缩的后端恒为0）
+    pending_records = 0
+
+    # 历史统计的滑动窗口大小（最近N条记录），以及最多缓存多少个用户的统计
+    history_window = 30
+    history_stats_cache_size = 4096
+    _history_stats: "Optional[OrderedDict[str, HistoryStats]]" = None
+    # 人品值历史的列式副本（用于统计分析），由create_store设置
+    history_columns: Optional[HistoryColumns] = None
+    # 列式副本的待执行更新 (user_id, 日期, 人品值)，人品值为None表示丢弃该用户的文件
+    _column_ops: Optional[List[Tuple[str, str, Optional[int]]]] = None
+
+    def load(self, today: str = ""):
+        raise NotImplementedError
+
+    # ---------- 延迟写入 ----------
+    # 写入方法只更新可见状态并把操作放入缓冲区(self._buffer)，真正的持久化由
+    # WriteBehindWorker在线程池中批量执行：
+    # drain_ops(事件循环) -> write_ops(线程) -> ops_written(事件循环)
+
+    @property
+    def pending_ops(self) -> int:
+        """缓冲区中尚未持久化的操作数"""
+        return len(self._buffer)
+
+    def drain_ops(self) -> List[Dict[str, Any]]:
+        ops, self._buffer = self._buffer, []
+        return ops
+
+    def requeue_ops(self, ops: List[Dict[str, Any]]):
+        """写入失败时把操作放回缓冲区头部"""
+        self._buffer[:0] = ops
+
+    def write_ops(self, ops: List[Dict[str, Any]]) -> int:
+        """持久化一批操作（在写入线程中调用），返回写入的字节数"""
+        raise NotImplementedError
+
+    def ops_written(self, ops: List[Dict[str, Any]]):
+        pass
+
+    def flush(self):
+        """同步持久化缓冲区中的所有操作（用于卸载时）"""
+        ops = self.drain_ops()
+        if ops:
+            self.write_ops(ops)
+            self.ops_written(ops)
+        self.write_column_ops(self.drain_column_ops())
+
+    def drain_column_ops(self) -> List[Tuple[str, str, Optional[int]]]:
+        ops, self._column_ops = self._column_ops or [], None
+        return ops
+
+    def write_column_ops(self, ops: List[Tuple[str, str, Optional[int]]]):
+        """更新列式副本（在写入线程中调用）
+
+        列式副本是派生数据，更新失败时不重试：条数与主存储不一致的文件会在下次读取时重建。
+        """
+        if self.history_columns is None:
+            return
+        for user_id, day, jrrp in ops:
+            if jrrp is None:
+                self.history_columns.discard(user_id)
+            else:
+                self.history_columns.append(user_id, day, jrrp)
+
+    def memory_stats(self) -> Dict[str, int]:
+        """内存中各结构的大小（条目数），用于运行指标"""
+        return {
+            "pending_ops": self.pending_ops,
+            "pending_records": self.pending_records,
+            "history_stats_cached": len(self._history_stats) if self._history_stats else 0
+        }
+
+    def memory_structures(self) -> Dict[str, Any]:
+        """常驻内存的主要数据结构，用于估算内存占用"""
+        return {"history_stats": self._history_stats or {}, "write_buffer": self._buffer}
+
+    # ---------- 查询 ----------
+
+    def get_daily(self, day: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取某用户某日的完整记录"""
+        raise NotImplementedError
+
+    def top_daily(self, day: str, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """按人品值从高到低返回某日前limit条记录"""
+        raise NotImplementedError
+
+    def iter_daily(self, day: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """返回某日的全部记录（用于重建排行榜等内存结构）"""
+        raise NotImplementedError
+
+    def get_history(self, user_id: str, limit: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """按日期从新到旧返回用户的历史记录"""
+        raise NotImplementedError
+
+    def history_stats(self, user_id: str) -> Optional[HistoryStats]:
+        """返回用户历史人品值的聚合统计，没有历史记录时返回None
+
+        首次访问某用户时读取一次全部历史构建，之后随写入增量更新，读取为O(1)。
+        """
+        if self._history_stats is None:
+            self._history_stats = OrderedDict()
+        stats = self._history_stats.get(user_id)
+        if stats is None:
+            stats = HistoryStats(self.history_window,
+                                 ((day, data["jrrp"]) for day, data in self.get_history(user_id)))
+            self._history_stats[user_id] = stats
+            while len(self._history_stats) > self.history_stats_cache_size:
+                self._history_stats.popitem(last=False)
+        else:
+            self._history_stats.move_to_end(user_id)
+        return stats if stats.count else None
+
+    def history_arrays(self, user_id: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """返回用户历史的 (日期序数数组, 人品值数组)，按日期升序，没有历史记录时返回None
+
+        数据来自内存映射的列式文件；文件缺失、条数与主存储不一致（首次使用、补录、删除后）
+        或该用户还有尚未执行的更新时，用聚合统计中已排好序的历史重建一次。
+        """
+        stats = self.history_stats(user_id)
+        if stats is None or self.history_columns is None:
+            return None
+        # 统计中已经包含这些更新，重建后不再需要
+        pending = bool(self._column_ops) and any(op[0] == user_id for op in self._column_ops)
+        if pending:
+            self._column_ops = [op for op in self._column_ops if op[0] != user_id]
+        days, scores = self.history_columns.read(user_id)
+        if pending or len(days) != stats.count:
+            self.history_columns.write(user_id, stats.dates, stats.values)
+            days, scores = self.history_columns.read(user_id)
+        return days, scores
+
+    def _update_history_stats(self, user_id: str, day: str, data: Optional[Dict[str, Any]]):
+        """写入或删除(data为None)历史记录后更新已缓存的统计，列式副本的更新由延迟写入在线程中执行"""
+        if self.history_columns is not None:
+            if self._column_ops is None:
+                self._column_ops = []
+            self._column_ops.append((user_id, day, None if data is None else data["jrrp"]))
+        if not self._history_stats:
+            return
+        stats = self._history_stats.get(user_id)
+        if stats is None:
+            return
+        if data is None:
+            stats.remove(day)
+        else:
+            stats.put(day, data["jrrp"])
+
+    def _clear_history_stats(self):
+        self._column_ops = None
+        if self.history_columns is not None:
+            self.history_columns.clear()
+        if self._history_stats:
+            self._history_stats.clear()
+
+    # ---------- 写入 ----------
+
+    def put_daily(self, today: str, user_id: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def delete_daily(self, day: str, user_id: str) -> bool:
+        raise NotImplementedError
+
+    def put_history(self, user_id: str, day: str, data: Dict[str, Any]):
+        raise NotImplementedError
+
+    def delete_history(self, user_id: str, day: str) -> bool:
+        raise NotImplementedError
+
+    def delete_user_data(self, user_id: str, keep_day: Optional[str] = None) -> int:
+        """删除用户除keep_day以外的所有每日记录（包括已归档的）和历史记录，返回删除条数（不含归档）"""
+        deleted_count = self._delete_user_records(user_id, keep_day)
+        self._purge_archive([user_id])
+        return deleted_count
+
+    def delete_users(self, user_ids: Iterable[str]) -> int:
+        """删除一批用户的全部每日记录（包括今日和已归档的）和历史记录，返回删除条数（不含归档）
+
+        删除操作都先进入写入缓冲区，之后由延迟写入一次性持久化
+        （JSON后端为一次journal追加，SQLite后端为一个事务）。
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        deleted_count = sum(self._delete_user_records(user_id) for user_id in user_ids)
+        self._purge_archive(user_ids)
+        return deleted_count
+
+    def _delete_user_records(self, user_id: str, keep_day: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    def _purge_archive(self, user_ids: List[str]):
+        """把删除这些用户归档记录的操作放入写入缓冲区"""
+        pass
+
+    def reset(self):
+        raise NotImplementedError
+
+    # ---------- 维护 ----------
+
+    def rollover(self, today: str):
+        """日期变化时调用"""
+        pass
+
+    def apply_retention(self, cutoff_day: str, mode: str) -> Optional[Callable[[], None]]:
+        """归档(archive)或删除(delete)早于cutoff_day的每日记录
+
+        返回需要在线程池中执行的任务；后端也可以把操作放入延迟写入队列并返回None。
+        """
+        return None
+
+    def begin_compaction(self) -> Optional[Callable[[], None]]:
+        return None
+
+    def finish_compaction(self, success: bool = True):
+        pass
+
+    def compact(self):
+        job = self.begin_compaction()
+        if job:
+            job()
+            self.finish_compaction()
+
+    def close(self):
+        pass
+
+
+class JournalStore(BaseStore):
+    """基于预写日志(journal)的JSON存储
+
+    每次新增或删除记录只向journal追加一行，保存开销与数据总量无关；
+    后台压缩时再把journal合并进快照文件。启动时先加载快照，再按顺序重放journal。
+
+    journal按段(segment)存放，压缩前切换到新段，压缩完成后在state.json中记录
+    已合并的最大段号并删除旧段。所有操作都是按key覆盖/删除的幂等操作，
+    即使压缩中途崩溃导致某些段被重复重放，结果也保持一致。
+
+    每日记录按日期分区存放在 daily/<日期>.json 中，内存里只常驻今日分区；
+    其他日期的分区只在被修改后、压缩写回之前暂时留在内存中。
+
+    历史记录按用户ID哈希分片存放在 history/shard_XX.json 中，启动时只加载记录了
+    用户列表的小索引，分片在首次访问时载入，并用LRU只保留最近活跃的分片。
+
+    另有 user_id -> 有每日记录的日期 的反向索引，随写入维护，删除某个用户的数据时
+    只需载入该用户出现过的分区，不必遍历全部日期。索引由快照(daily_index.json)和
+    追加日志(daily_index.jsonl)组成：每次压缩只追加自上次压缩以来变化的条目，
+    日志行数超过索引条数时才在写入线程中合并成新快照。
+    """
+
+    # 索引日志至少积累这么多行才合并进快照
+    DAILY_INDEX_LOG_MIN = 10000
+
+    def __init__(self, data_dir: Path, fortune_file: Path, history_file: Path,
+                 history_shards: int = 64, history_cache_shards: int = 16):
+        self.fortune_file = fortune_file
+        self.history_file = history_file
+        self.history_dir = data_dir / "history"
+        self.history_index_file = self.history_dir / "index.json"
+        self.daily_index_file = data_dir / "daily_index.json"
+        self.daily_index_log = data_dir / "daily_index.jsonl"
+        self.history_shards = history_shards
+        self.history_cache_shards = max(1, history_cache_shards)
+        self.daily_dir = data_dir / "daily"
+        self.archive_dir = self.daily_dir / "archive"
+        self.journal_dir = data_dir / "journal"
+        self.daily_dir.mkdir(parents=True, exist_ok=True)
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        self.state_file = self.journal_dir / "state.json"
+
+        # 常驻内存的每日分区：今日分区 + 等待压缩写回的其他分区
+        self.daily_data: Dict[str, Dict[str, Any]] = {}
+        self.hot_day = ""
+        # 历史记录索引: user_id -> 记录条数，用于快速判断用户是否有记录
+        self.history_index: Dict[str, int] = {}
+        # 每日记录反向索引: user_id -> 有记录的日期集合
+        self.daily_index: Dict[str, set] = {}
+        # 自上次压缩以来索引的变化: (user_id, 日期) -> 是否存在
+        self._index_changes: Dict[Tuple[str, str], bool] = {}
+        # 索引的条目数和索引日志的行数，用于决定何时合并快照
+        self._daily_index_size = 0
+        self._index_log_lines = 0
+        # 已载入的历史分片(LRU): shard_id -> {user_id: {date: record}}
+        self._history_cache: "OrderedDict[int, Dict[str, Dict[str, Any]]]" = OrderedDict()
+        self._dirty_shards = set()
+        # 正在压缩写回的分片，写回完成前不能被LRU淘汰
+        self._sealed_shards = set()
+        # 自上次压缩以来被修改过的分区
+        self._dirty_days = set()
+        # reset后、压缩删除旧分区文件之前，磁盘上的分区文件视为不存在
+        self._reset_gen = 0
+        self._reset_flushed_gen = 0
+        self._compaction: Optional[Tuple[set, set, int, int, bool]] = None
+
+        self._segment_seq = 0
+        self._segment_fp = None
+        # 写入线程与压缩时切换journal段互斥
+        self._segment_lock = threading.Lock()
+        # 保留策略的归档任务与从归档中删除用户互斥
+        self._archive_lock = threading.Lock()
+        # 进行中的归档任务写入时要排除的用户（任务开始后才被删除的用户）
+        self._retention_purged: Optional[set] = None
+        self._buffer: List[Dict[str, Any]] = []
+        # 自上次压缩以来写入journal的记录数
+        self.pending_records = 0
+
+    # ---------- 分区 ----------
+
+    def _partition_path(self, day: str) -> Path:
+        return self.daily_dir / f"{day}.json"
+
+    def _list_partition_days(self) -> List[str]:
+        return sorted(path.stem for path in self.daily_dir.glob("*.json"))
+
+    def _read_partition(self, day: str) -> Dict[str, Any]:
+        """读取分区，优先使用内存中的版本"""
+        if day in self.daily_data:
+            return self.daily_data[day]
+        if self._reset_gen != self._reset_flushed_gen:
+            return {}
+        return _load_json(self._partition_path(day))
+
+    def _resident_partition(self, day: str) -> Dict[str, Any]:
+        """获取可修改的分区，不在内存中时从磁盘载入"""
+        if day not in self.daily_data:
+            self.daily_data[day] = self._read_partition(day)
+        return self.daily_data[day]
+
+    def _migrate_legacy_daily(self):
+        """把旧版的单文件daily_fortune.json拆分为按日期的分区"""
+        if not self.fortune_file.exists():
+            return
+        legacy = _load_json(self.fortune_file)
+        for day, users in legacy.items():
+            if users and not self._partition_path(day).exists():
+                _atomic_write_json(self._partition_path(day), users)
+        os.replace(self.fortune_file, self.fortune_file.with_name(self.fortune_file.name + ".migrated"))
+        logger.info(f"[daily_fortune] 已将 {self.fortune_file.name} 拆分为 {len(legacy)} 个日期分区")
+
+    def _load_daily_index(self):
+        """载入每日记录反向索引（快照 + 追加日志），升级后首次启动时扫描一次全部分区建立索引"""
+        if self.daily_index_file.exists() or self.daily_index_log.exists():
+            index = _load_json(self.daily_index_file)
+            self.daily_index = {user_id: set(days) for user_id, days in index.items()}
+            self._daily_index_size = sum(len(days) for days in self.daily_index.values())
+            entries = _read_index_log(self.daily_index_log)
+            for user_id, day, exists in entries:
+                self._set_index(day, user_id, exists)
+            self._index_log_lines = len(entries)
+            return
+        for day in self._list_partition_days():
+            for user_id in _load_json(self._partition_path(day)):
+                self._set_index(day, user_id, True)
+        _atomic_write_json(self.daily_index_file, self._daily_index_snapshot(self.daily_index), indent=None)
+        if self.daily_index:
+            logger.info(f"[daily_fortune] 已为 {len(self.daily_index)} 个用户建立每日记录索引")
+
+    @staticmethod
+    def _daily_index_snapshot(index: Dict[str, Any]) -> Dict[str, List[str]]:
+        return {user_id: sorted(days) for user_id, days in index.items()}
+
+    def _merge_index_log(self):
+        """把索引日志合并进快照（在压缩线程中调用，只读写磁盘上的文件）"""
+        index = {user_id: set(days) for user_id, days in _load_json(self.daily_index_file).items()}
+        for user_id, day, exists in _read_index_log(self.daily_index_log):
+            if exists:
+                index.setdefault(user_id, set()).add(day)
+            elif user_id in index:
+                index[user_id].discard(day)
+                if not index[user_id]:
+                    del index[user_id]
+        _atomic_write_json(self.daily_index_file, self._daily_index_snapshot(index), indent=None)
+        self.daily_index_log.unlink(missing_ok=True)
+
+    def _set_index(self, day: str, user_id: str, exists: bool) -> bool:
+        """修改内存中的索引，返回是否有变化"""
+        days = self.daily_index.get(user_id)
+        if exists:
+            if days is None:
+                days = self.daily_index[user_id] = set()
+            if day in days:
+                return False
+            days.add(day)
+            self._daily_index_size += 1
+            return True
+        if days is None or day not in days:
+            return False
+        days.discard(day)
+        if not days:
+            del self.daily_index[user_id]
+        self._daily_index_size -= 1
+        return True
+
+    def _index_daily(self, day: str, user_id: str, exists: bool):
+        """修改索引并记录变化，下次压缩时追加到索引日志"""
+        if self._set_index(day, user_id, exists):
+            self._index_changes[(user_id, day)] = exists
+
+    def iter_daily_partitions(self):
+        """遍历所有分区（用于迁移到其他后端）"""
+        for day in sorted(set(self._list_partition_days()) | set(self.daily_data)):
+            users = self._read_partition(day)
+            if users:
+                yield day, users
+
+    # ---------- 历史分片 ----------
+
+    def _shard_of(self, user_id: str) -> int:
+        return zlib.crc32(user_id.encode('utf-8')) % self.history_shards
+
+    def _shard_path(self, shard_id: int) -> Path:
+        return self.history_dir / f"shard_{shard_id:03d}.json"
+
+    def _load_shard(self, shard_id: int) -> Dict[str, Dict[str, Any]]:
+        """获取历史分片，不在内存中时从磁盘载入并按LRU淘汰旧分片"""
+        shard = self._history_cache.get(shard_id)
+        if shard is not None:
+            self._history_cache.move_to_end(shard_id)
+            return shard
+
+        if self._reset_gen != self._reset_flushed_gen:
+            shard = {}
+        else:
+            shard = _load_json(self._shard_path(shard_id))
+            # 旧版本写入的分片不保证日期有序，载入时整理一次
+            for user_id, user_history in shard.items():
+                if any(a > b for a, b in zip(user_history, islice(user_history, 1, None))):
+                    shard[user_id] = dict(sorted(user_history.items()))
+        self._history_cache[shard_id] = shard
+        self._evict_shards()
+        return shard
+
+    def _evict_shards(self):
+        pinned = self._dirty_shards | self._sealed_shards
+        # 最近访问的分片（末尾）总是保留，调用方可能正要修改它
+        for shard_id in list(self._history_cache)[:-1]:
+            if len(self._history_cache) <= self.history_cache_shards:
+                break
+            if shard_id not in pinned:
+                del self._history_cache[shard_id]
+
+    def _user_history(self, user_id: str) -> Dict[str, Any]:
+        if user_id not in self.history_index:
+            return {}
+        return self._load_shard(self._shard_of(user_id)).get(user_id, {})
+
+    def _migrate_legacy_history(self):
+        """把旧版的单文件fortune_history.json拆分为按用户哈希的分片"""
+        if not self.history_file.exists():
+            return
+        legacy = _load_json(self.history_file)
+        shards: Dict[int, Dict[str, Any]] = {}
+        for user_id, dates in legacy.items():
+            if dates:
+                shards.setdefault(self._shard_of(user_id), {})[user_id] = dates
+                self.history_index[user_id] = len(dates)
+        for shard_id, shard in shards.items():
+            _atomic_write_json(self._shard_path(shard_id), shard)
+        _atomic_write_json(self.history_index_file,
+                           {"shards": self.history_shards, "users": self.history_index})
+        os.replace(self.history_file, self.history_file.with_name(self.history_file.name + ".migrated"))
+        logger.info(f"[daily_fortune] 已将 {self.history_file.name} 拆分为 {len(shards)} 个历史分片")
+
+    def iter_history(self):
+        """遍历所有用户的历史记录（用于迁移到其他后端）"""
+        for user_id in list(self.history_index):
+            user_history = self._user_history(user_id)
+            if user_history:
+                yield user_id, user_history
+
+    # ---------- 加载与重放 ----------
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.journal_dir / f"{seq:08d}.jsonl"
+
+    def _list_segments(self) -> List[int]:
+        segments = []
+        for path in self.journal_dir.glob("*.jsonl"):
+            try:
+                segments.append(int(path.stem))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def load(self, today: str = ""):
+        """加载今日分区和历史快照，并重放journal"""
+        self._migrate_legacy_daily()
+        self.hot_day = today
+        if today:
+            self.daily_data[today] = _load_json(self._partition_path(today))
+        self._load_daily_index()
+
+        index = _load_json(self.history_index_file)
+        if index:
+            # 分片数以索引中记录的为准，避免配置变化后找不到已有分片
+            self.history_shards = index.get("shards", self.history_shards)
+            self.history_index = index.get("users", {})
+        self._migrate_legacy_history()
+
+        compacted_through = _load_json(self.state_file).get("compacted_through", 0)
+        replayed = 0
+        last_seq = compacted_through
+        for seq in self._list_segments():
+            path = self._segment_path(seq)
+            if seq <= compacted_through:
+                # 已合并进快照的旧段，上次压缩时未来得及删除
+                path.unlink(missing_ok=True)
+                continue
+            replayed += self._replay_segment(path)
+            last_seq = max(last_seq, seq)
+
+        self.pending_records = replayed
+        self._open_segment(last_seq + 1)
+
+        if replayed:
+            logger.info(f"[daily_fortune] 已从journal重放 {replayed} 条记录")
+
+    def _replay_segment(self, path: Path) -> int:
+        count = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程崩溃时最后一行可能只写了一半
+                    logger.warning(f"[daily_fortune] 跳过损坏的journal记录 {path.name}:{line_no}")
+                    continue
+                self._apply(op)
+                if op.get("op") == "purge_archive":
+                    self._purge_archive_files(op["user_ids"])
+                count += 1
+        return count
+
+    def _apply(self, op: Dict[str, Any]):
+        """把一条journal记录应用到内存数据"""
+        kind = op.get("op")
+        if kind == "put_daily":
+            self._resident_partition(op["date"])[op["user_id"]] = op["data"]
+            self._dirty_days.add(op["date"])
+            self._index_daily(op["date"], op["user_id"], True)
+        elif kind == "del_daily":
+            partition = self._resident_partition(op["date"])
+            if partition.pop(op["user_id"], None) is not None:
+                self._dirty_days.add(op["date"])
+            elif op["date"] != self.hot_day and op["date"] not in self._dirty_days:
+                self.daily_data.pop(op["date"], None)
+            self._index_daily(op["date"], op["user_id"], False)
+        elif kind == "put_history":
+            shard_id = self._shard_of(op["user_id"])
+            user_history = self._load_shard(shard_id).setdefault(op["user_id"], {})
+            _put_sorted(user_history, op["date"], op["data"])
+            self.history_index[op["user_id"]] = len(user_history)
+            self._dirty_shards.add(shard_id)
+            self._update_history_stats(op["user_id"], op["date"], op["data"])
+        elif kind == "del_history":
+            if op["user_id"] in self.history_index:
+                shard_id = self._shard_of(op["user_id"])
+                shard = self._load_shard(shard_id)
+                user_history = shard.get(op["user_id"], {})
+                if user_history.pop(op["date"], None) is not None:
+                    self._dirty_shards.add(shard_id)
+                    self._update_history_stats(op["user_id"], op["date"], None)
+                if user_history:
+                    self.history_index[op["user_id"]] = len(user_history)
+                else:
+                    shard.pop(op["user_id"], None)
+                    del self.history_index[op["user_id"]]
+        elif kind == "purge_archive":
+            # 归档文件由写入线程改写，这里只通知进行中的归档任务
+            purged = self._retention_purged
+            if purged is not None:
+                purged.update(op["user_ids"])
+        elif kind == "reset":
+            self.daily_data.clear()
+            self.history_index.clear()
+            self.daily_index.clear()
+            self._index_changes.clear()
+            self._daily_index_size = 0
+            self._history_cache.clear()
+            self._dirty_days.clear()
+            self._dirty_shards.clear()
+            self._clear_history_stats()
+            self._reset_gen += 1
+            if self.hot_day:
+                self.daily_data[self.hot_day] = {}
+        else:
+            logger.warning(f"[daily_fortune] 未知的journal操作: {kind}")
+
+    # ---------- 查询 ----------
+
+    def get_daily(self, day: str, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._read_partition(day).get(user_id)
+
+    def top_daily(self, day: str, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        records = sorted(self._read_partition(day).items(), key=lambda x: x[1]["jrrp"], reverse=True)
+        return records[:limit]
+
+    def iter_daily(self, day: str) -> List[Tuple[str, Dict[str, Any]]]:
+        return list(self._read_partition(day).items())
+
+    def get_history(self, user_id: str, limit: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        # 每个用户的历史按日期升序保存，从末尾倒序读取即可，不需要排序
+        user_history = self._user_history(user_id)
+        return [(day, user_history[day]) for day in islice(reversed(user_history), limit)]
+
+    # ---------- 写入 ----------
+
+    def _open_segment(self, seq: int):
+        self._segment_seq = seq
+        self._segment_fp = open(self._segment_path(seq), 'a', encoding='utf-8')
+
+    def _append(self, op: Dict[str, Any]):
+        """应用一条journal记录，并放入缓冲区等待批量写入"""
+        self._apply(op)
+        self._buffer.append(op)
+
+    def write_ops(self, ops: List[Dict[str, Any]]) -> int:
+        lines = "".join(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + "\n" for op in ops)
+        with self._segment_lock:
+            self._segment_fp.write(lines)
+            self._segment_fp.flush()
+            self.pending_records += len(ops)
+        for op in ops:
+            if op["op"] == "purge_archive":
+                self._purge_archive_files(op["user_ids"])
+        return len(lines.encode('utf-8'))
+
+    def _purge_archive_files(self, user_ids: List[str]):
+        """从归档分区中删除这些用户的记录（在写入线程或启动重放时调用）
+
+        归档没有按用户的索引，需要读取全部归档文件，但只改写包含这些用户的文件。
+        """
+        targets = set(user_ids)
+        with self._archive_lock:
+            for path in sorted(self.archive_dir.glob("*.json.gz")):
+                try:
+                    with gzip.open(path, 'rt', encoding='utf-8') as f:
+                        users = json.load(f)
+                    if targets.isdisjoint(users):
+                        continue
+                    remaining = {uid: record for uid, record in users.items() if uid not in targets}
+                    if remaining:
+                        _write_archive(path, remaining)
+                    else:
+                        path.unlink(missing_ok=True)
+                except Exception as e:
+                    logger.error(f"[daily_fortune] 从归档 {path.name} 中删除用户记录失败: {e}")
+
+    def memory_stats(self) -> Dict[str, int]:
+        return {
+            **super().memory_stats(),
+            "daily_partitions": len(self.daily_data),
+            "daily_records": sum(len(users) for users in self.daily_data.values()),
+            "history_users": len(self.history_index),
+            "history_shards_cached": len(self._history_cache),
+            "daily_index_users": len(self.daily_index)
+        }
+
+    def memory_structures(self) -> Dict[str, Any]:
+        return {
+            **super().memory_structures(),
+            "daily_data": self.daily_data,
+            # daily_data中保存的完整结果、过程和建议文本（已计入daily_data）
+            "daily_data.texts": [record.get(key) for users in self.daily_data.values()
+                                 for record in users.values() for key in ("result", "process", "advice")],
+            "history_cache": self._history_cache,
+            "history_index": self.history_index,
+            "daily_index": self.daily_index,
+            "daily_index_changes": self._index_changes
+        }
+
+    def put_daily(self, today: str, user_id: str, data: Dict[str, Any]):
+        self._append({"op": "put_daily", "date": today, "user_id": user_id, "data": data})
+
+    def delete_daily(self, day: str, user_id: str) -> bool:
+        if self.get_daily(day, user_id) is None:
+            return False
+        self._append({"op": "del_daily", "date": day, "user_id": user_id})
+        return True
+
+    def put_history(self, user_id: str, day: str, data: Dict[str, Any]):
+        self._append({"op": "put_history", "user_id": user_id, "date": day, "data": data})
+
+    def delete_history(self, user_id: str, day: str) -> bool:
+        if day not in self._user_history(user_id):
+            return False
+        self._append({"op": "del_history", "user_id": user_id, "date": day})
+        return True
+
+    def _delete_user_records(self, user_id: str, keep_day: Optional[str] = None) -> int:
+        deleted_count = 0
+        for day in [d for d in self._user_history(user_id) if d != keep_day]:
+            deleted_count += self.delete_history(user_id, day)
+        # 只访问索引中该用户出现过的分区
+        for day in sorted(self.daily_index.get(user_id, set()) - {keep_day}):
+            if self.delete_daily(day, user_id):
+                deleted_count += 1
+            else:
+                # 分区已被保留策略清理但索引尚未写回（如清理后崩溃）
+                self._index_daily(day, user_id, False)
+        return deleted_count
+
+    def _purge_archive(self, user_ids: List[str]):
+        if user_ids:
+            self._append({"op": "purge_archive", "user_ids": user_ids})
+
+    def reset(self):
+        self._append({"op": "reset"})
+
+    # ---------- 日期分区维护 ----------
+
+    def rollover(self, today: str):
+        """切换今日分区，昨日分区如无未写回的修改则移出内存"""
+        previous = self.hot_day
+        self.hot_day = today
+        self._resident_partition(today)
+        if previous and previous != today and previous not in self._dirty_days:
+            self.daily_data.pop(previous, None)
+
+    def apply_retention(self, cutoff_day: str, mode: str) -> Optional[Callable[[], None]]:
+        """归档或删除早于cutoff_day的分区，返回在线程中执行的任务"""
+        expired = [day for day in self._list_partition_days() if day < cutoff_day]
+        # 内存中尚未写回的过期分区直接使用内存版本，并不再写回
+        resident = {day: dict(self.daily_data.pop(day)) for day in list(self.daily_data)
+                    if day < cutoff_day and day != self.hot_day}
+        self._dirty_days.difference_update(resident)
+        if not expired and not resident:
+            return None
+        removed = set(expired) | set(resident)
+        for user_id, days in [(uid, days & removed) for uid, days in self.daily_index.items()
+                              if not days.isdisjoint(removed)]:
+            for day in days:
+                self._index_daily(day, user_id, False)
+
+        purged = self._retention_purged = set()
+
+        def job():
+            with self._archive_lock:
+                if mode == "archive":
+                    self.archive_dir.mkdir(parents=True, exist_ok=True)
+                for day in sorted(set(expired) | set(resident)):
+                    path = self._partition_path(day)
+                    if mode == "archive":
+                        users = resident[day] if day in resident else _load_json(path)
+                        # 清理开始后被删除的用户：删除归档可能先于本任务执行，这里直接排除
+                        users = {uid: record for uid, record in users.items() if uid not in purged}
+                        if users:
+                            _write_archive(self.archive_dir / f"{day}.json.gz", users)
+                    path.unlink(missing_ok=True)
+                if self._retention_purged is purged:
+                    self._retention_purged = None
+            action = "归档" if mode == "archive" else "删除"
+            logger.info(f"[daily_fortune] 已{action} {cutoff_day} 之前的 {len(set(expired) | set(resident))} 个每日分区")
+
+        return job
+
+    # ---------- 压缩 ----------
+
+    def begin_compaction(self) -> Optional[Callable[[], None]]:
+        """切换journal段并复制被修改的数据，返回可在线程中执行的压缩任务
+
+        需要在事件循环线程中调用；返回的任务只读取复制出的数据，可以安全地放到线程池执行。
+        记录本身写入后不会被原地修改，因此只需复制到第二层。
+        """
+        if self.pending_records == 0 and not self._index_changes:
+            return None
+
+        with self._segment_lock:
+            sealed_seq = self._segment_seq
+            self._segment_fp.close()
+            self._open_segment(sealed_seq + 1)
+            sealed_records, self.pending_records = self.pending_records, 0
+
+        sealed_days, self._dirty_days = self._dirty_days, set()
+        sealed_shards, self._dirty_shards = self._dirty_shards, set()
+        self._sealed_shards = sealed_shards
+        reset_gen = self._reset_gen
+        need_reset = reset_gen != self._reset_flushed_gen
+        # 索引只追加变化的条目；日志比索引本身还大时再合并成新快照
+        index_changes, self._index_changes = self._index_changes, {}
+        log_lines = len(index_changes) + (0 if need_reset else self._index_log_lines)
+        merge_index = log_lines > max(self.DAILY_INDEX_LOG_MIN, self._daily_index_size)
+        self._compaction = (sealed_days, sealed_shards, reset_gen, sealed_records,
+                            index_changes, 0 if merge_index else log_lines)
+
+        partitions = {day: dict(self.daily_data.get(day, {})) for day in sealed_days}
+        shards = {
+            shard_id: {uid: dict(dates) for uid, dates in self._history_cache.get(shard_id, {}).items()}
+            for shard_id in sealed_shards
+        }
+        index_snapshot = {"shards": self.history_shards, "users": dict(self.history_index)}
+
+        def job():
+            if need_reset:
+                for day in self._list_partition_days():
+                    if day not in partitions:
+                        self._partition_path(day).unlink(missing_ok=True)
+                for path in self.history_dir.glob("shard_*.json"):
+                    if int(path.stem.split("_")[1]) not in shards:
+                        path.unlink(missing_ok=True)
+                # 与SQLite后端清空归档表一致，重置后离线重建汇总也不会读到旧数据
+                with self._archive_lock:
+                    for path in self.archive_dir.glob("*.json.gz"):
+                        path.unlink(missing_ok=True)
+            for day, users in partitions.items():
+                if users:
+                    _atomic_write_json(self._partition_path(day), users)
+                else:
+                    self._partition_path(day).unlink(missing_ok=True)
+            for shard_id, shard in shards.items():
+                if shard:
+                    _atomic_write_json(self._shard_path(shard_id), shard)
+                else:
+                    self._shard_path(shard_id).unlink(missing_ok=True)
+            _atomic_write_json(self.history_index_file, index_snapshot)
+            if need_reset:
+                _atomic_write_json(self.daily_index_file, {}, indent=None)
+                self.daily_index_log.unlink(missing_ok=True)
+            if index_changes:
+                _append_lines(self.daily_index_log, "".join(
+                    json.dumps([user_id, day, int(exists)], ensure_ascii=False, separators=(',', ':')) + "\n"
+                    for (user_id, day), exists in index_changes.items()
+                ))
+            if merge_index:
+                self._merge_index_log()
+            _atomic_write_json(self.state_file, {"compacted_through": sealed_seq})
+            for seq in self._list_segments():
+                if seq <= sealed_seq:
+                    self._segment_path(seq).unlink(missing_ok=True)
+
+        return job
+
+    def finish_compaction(self, success: bool = True):
+        """压缩任务结束后在事件循环中调用，释放已写回的非今日分区和历史分片"""
+        if not self._compaction:
+            return
+        sealed_days, sealed_shards, reset_gen, sealed_records, index_changes, log_lines = self._compaction
+        self._compaction = None
+        self._sealed_shards = set()
+        if not success:
+            # 写回失败，保留在内存中等待下次压缩；压缩期间的新变化优先
+            self._dirty_days.update(sealed_days)
+            self._dirty_shards.update(sealed_shards)
+            self.pending_records += sealed_records
+            if reset_gen == self._reset_gen:
+                for key, exists in index_changes.items():
+                    self._index_changes.setdefault(key, exists)
+            return
+        self._reset_flushed_gen = reset_gen
+        self._index_log_lines = log_lines
+        for day in sealed_days:
+            if day != self.hot_day and day not in self._dirty_days:
+                self.daily_data.pop(day, None)
+        self._evict_shards()
+
+    def close(self):
+        if self._segment_fp and not self._segment_fp.closed:
+            self.flush()
+            self._segment_fp.close()
+
+
+class SQLiteStore(BaseStore):
+    """SQLite存储后端（WAL模式）
+
+    每日记录和历史记录分别存放在带索引的表中，所有查询都走索引，
+    内存占用不随历史数据增长，启动时也不需要反序列化全部数据。
+    首次启用时会把已有的JSON数据一次性迁移进数据库。
+
+    读写使用两个连接：事件循环中的查询走读连接，写入线程使用写连接，
+    WAL模式下两者互不阻塞。尚未写入数据库的操作保存在覆盖层中，查询时合并，
+    保证刚写入的数据立即可见。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS daily (
+        date TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        jrrp INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (date, user_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_daily_user_date ON daily (user_id, date);
+    CREATE INDEX IF NOT EXISTS idx_daily_date_jrrp ON daily (date, jrrp DESC);
+
+    CREATE TABLE IF NOT EXISTS daily_archive (
+        date TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        jrrp INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (date, user_id)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS history (
+        user_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        jrrp INTEGER NOT NULL,
+        fortune TEXT NOT NULL,
+        PRIMARY KEY (user_id, date)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_history_date_user ON history (date, user_id);
+
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, data_dir: Path, fortune_file: Path, history_file: Path):
+        self.data_dir = data_dir
+        self.db_file = data_dir / "daily_fortune.db"
+        self.fortune_file = fortune_file
+        self.history_file = history_file
+        self.read_conn: Optional[sqlite3.Connection] = None
+        self.write_conn: Optional[sqlite3.Connection] = None
+
+        self._seq = 0
+        self._buffer: List[Dict[str, Any]] = []
+        # 覆盖层: key -> (seq, 记录)，记录为None表示已删除
+        self._daily_overlay: Dict[Tuple[str, str], Tuple[int, Optional[Dict[str, Any]]]] = {}
+        self._history_overlay: Dict[Tuple[str, str], Tuple[int, Optional[Dict[str, Any]]]] = {}
+        # 尚未写入数据库的reset操作序号，期间数据库中的旧数据不可见
+        self._reset_seq: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self, today: str = ""):
+        self.write_conn = self._connect()
+        self.write_conn.executescript(self.SCHEMA)
+        self._migrate_from_json()
+        self.read_conn = self._connect()
+
+    def _migrate_from_json(self):
+        """把JSON后端的数据（快照 + journal）一次性导入数据库"""
+        row = self.write_conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if row:
+            return
+
+        json_store = JournalStore(self.data_dir, self.fortune_file, self.history_file)
+        json_store.load()
+        json_store.close()
+
+        daily_rows = [
+            (day, user_id, record["jrrp"], json.dumps(record, ensure_ascii=False))
+            for day, users in json_store.iter_daily_partitions()
+            for user_id, record in users.items()
+        ]
+        history_rows = [
+            (user_id, day, record["jrrp"], record.get("fortune", ""))
+            for user_id, dates in json_store.iter_history()
+            for day, record in dates.items()
+        ]
+
+        with self.write_conn:
+            self.write_conn.executemany("INSERT OR REPLACE INTO daily VALUES (?, ?, ?, ?)", daily_rows)
+            self.write_conn.executemany("INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?)", history_rows)
+            self.write_conn.execute("INSERT OR REPLACE INTO meta VALUES ('json_migrated', '1')")
+
+        # 迁移完成后保留一份旧文件作为备份，并清理journal
+        for directory in (json_store.daily_dir, json_store.history_dir):
+            if any(directory.iterdir()):
+                os.replace(directory, directory.with_name(directory.name + ".migrated"))
+            else:
+                directory.rmdir()
+        for segment in json_store.journal_dir.glob("*.jsonl"):
+            segment.unlink(missing_ok=True)
+        json_store.state_file.unlink(missing_ok=True)
+        json_store.daily_index_file.unlink(missing_ok=True)
+        json_store.daily_index_log.unlink(missing_ok=True)
+
+        if daily_rows or history_rows:
+            logger.info(f"[daily_fortune] 已从JSON迁移 {len(daily_rows)} 条每日记录、{len(history_rows)} 条历史记录到SQLite")
+
+    # ---------- 查询 ----------
+
+    def get_daily(self, day: str, user_id: str) -> Optional[Dict[str, Any]]:
+        pending = self._daily_overlay.get((day, user_id))
+        if pending is not None:
+            return pending[1]
+        if self._reset_seq is not None:
+            return None
+        row = self.read_conn.execute(
+            "SELECT data FROM daily WHERE date = ? AND user_id = ?", (day, user_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def top_daily(self, day: str, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        pending = {uid: record for (d, uid), (_, record) in self._daily_overlay.items() if d == day}
+        merged = {}
+        if self._reset_seq is None:
+            # 多取覆盖层中的条数，保证被删除的记录剔除后仍有足够的数据
+            rows = self.read_conn.execute(
+                "SELECT user_id, data FROM daily WHERE date = ? ORDER BY jrrp DESC LIMIT ?",
+                (day, limit + len(pending))
+            ).fetchall()
+            merged = {user_id: json.loads(data) for user_id, data in rows}
+        merged.update(pending)
+        records = [(uid, record) for uid, record in merged.items() if record is not None]
+        records.sort(key=lambda x: x[1]["jrrp"], reverse=True)
+        return records[:limit]
+
+    def iter_daily(self, day: str) -> List[Tuple[str, Dict[str, Any]]]:
+        merged = {}
+        if self._reset_seq is None:
+            rows = self.read_conn.execute("SELECT user_id, data FROM daily WHERE date = ?", (day,)).fetchall()
+            merged = {user_id: json.loads(data) for user_id, data in rows}
+        merged.update({uid: record for (d, uid), (_, record) in self._daily_overlay.items() if d == day})
+        return [(uid, record) for uid, record in merged.items() if record is not None]
+
+    def get_history(self, user_id: str, limit: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        pending = {d: record for (uid, d), (_, record) in self._history_overlay.items() if uid == user_id}
+        merged = {}
+        if self._reset_seq is None:
+            rows = self.read_conn.execute(
+                "SELECT date, jrrp, fortune FROM history WHERE user_id = ? ORDER BY date DESC LIMIT ?",
+                (user_id, -1 if limit is None else limit + len(pending))
+            ).fetchall()
+            merged = {day: {"jrrp": jrrp, "fortune": fortune} for day, jrrp, fortune in rows}
+        merged.update(pending)
+        records = [(day, record) for day, record in merged.items() if record is not None]
+        records.sort(key=lambda x: x[0], reverse=True)
+        return records[:limit]
+
+    # ---------- 写入 ----------
+
+    def _enqueue(self, op: Dict[str, Any]) -> int:
+        self._seq += 1
+        op["seq"] = self._seq
+        self._buffer.append(op)
+        return self._seq
+
+    def put_daily(self, today: str, user_id: str, data: Dict[str, Any]):
+        seq = self._enqueue({"op": "put_daily", "date": today, "user_id": user_id, "data": data})
+        self._daily_overlay[(today, user_id)] = (seq, data)
+
+    def delete_daily(self, day: str, user_id: str) -> bool:
+        if self.get_daily(day, user_id) is None:
+            return False
+        seq = self._enqueue({"op": "del_daily", "date": day, "user_id": user_id})
+        self._daily_overlay[(day, user_id)] = (seq, None)
+        return True
+
+    def put_history(self, user_id: str, day: str, data: Dict[str, Any]):
+        seq = self._enqueue({"op": "put_history", "user_id": user_id, "date": day, "data": data})
+        self._history_overlay[(user_id, day)] = (seq, data)
+        self._update_history_stats(user_id, day, data)
+
+    def delete_history(self, user_id: str, day: str) -> bool:
+        pending = self._history_overlay.get((user_id, day))
+        if pending is not None:
+            exists = pending[1] is not None
+        elif self._reset_seq is not None:
+            exists = False
+        else:
+            exists = self.read_conn.execute(
+                "SELECT 1 FROM history WHERE user_id = ? AND date = ?", (user_id, day)
+            ).fetchone() is not None
+        if not exists:
+            return False
+        seq = self._enqueue({"op": "del_history", "user_id": user_id, "date": day})
+        self._history_overlay[(user_id, day)] = (seq, None)
+        self._update_history_stats(user_id, day, None)
+        return True
+
+    def _delete_user_records(self, user_id: str, keep_day: Optional[str] = None) -> int:
+        history_days = {day for day, _ in self.get_history(user_id)}
+        daily_days = {d for (d, uid), (_, record) in self._daily_overlay.items()
+                      if uid == user_id and record is not None}
+        if self._reset_seq is None:
+            rows = self.read_conn.execute("SELECT date FROM daily WHERE user_id = ?", (user_id,)).fetchall()
+            daily_days.update(day for (day,) in rows)
+
+        deleted_count = 0
+        for day in history_days - {keep_day}:
+            deleted_count += self.delete_history(user_id, day)
+        for day in daily_days - {keep_day}:
+            deleted_count += self.delete_daily(day, user_id)
+        return deleted_count
+
+    def _purge_archive(self, user_ids: List[str]):
+        if user_ids:
+            self._enqueue({"op": "purge_archive", "user_ids": user_ids})
+
+    def reset(self):
+        self._reset_seq = self._enqueue({"op": "reset"})
+        self._daily_overlay.clear()
+        self._history_overlay.clear()
+        self._clear_history_stats()
+
+    def apply_retention(self, cutoff_day: str, mode: str) -> Optional[Callable[[], None]]:
+        # 与其他写操作一起在写入线程中执行
+        self._enqueue({"op": "retention", "cutoff": cutoff_day, "mode": mode})
+        return None
+
+    # ---------- 延迟写入 ----------
+
+    def write_ops(self, ops: List[Dict[str, Any]]) -> int:
+        """在一个事务中执行一批操作（在写入线程中调用），返回写入记录的数据字节数（不含索引和页开销）"""
+        written = 0
+        with self.write_conn:
+            for op in ops:
+                kind = op["op"]
+                if kind == "put_daily":
+                    payload = json.dumps(op["data"], ensure_ascii=False)
+                    written += len(payload.encode('utf-8'))
+                    self.write_conn.execute(
+                        "INSERT OR REPLACE INTO daily VALUES (?, ?, ?, ?)",
+                        (op["date"], op["user_id"], op["data"]["jrrp"], payload)
+                    )
+                elif kind == "del_daily":
+                    self.write_conn.execute(
+                        "DELETE FROM daily WHERE date = ? AND user_id = ?", (op["date"], op["user_id"])
+                    )
+                elif kind == "put_history":
+                    data = op["data"]
+                    written += len(data.get("fortune", "").encode('utf-8'))
+                    self.write_conn.execute(
+                        "INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?)",
+                        (op["user_id"], op["date"], data["jrrp"], data.get("fortune", ""))
+                    )
+                elif kind == "del_history":
+                    self.write_conn.execute(
+                        "DELETE FROM history WHERE user_id = ? AND date = ?", (op["user_id"], op["date"])
+                    )
+                elif kind == "reset":
+                    self.write_conn.execute("DELETE FROM daily")
+                    self.write_conn.execute("DELETE FROM daily_archive")
+                    self.write_conn.execute("DELETE FROM history")
+                elif kind == "purge_archive":
+                    user_ids = op["user_ids"]
+                    # 分批绑定参数，避免超过SQLite的变量个数上限
+                    for start in range(0, len(user_ids), 500):
+                        chunk = user_ids[start:start + 500]
+                        self.write_conn.execute(
+                            f"DELETE FROM daily_archive WHERE user_id IN ({','.join('?' * len(chunk))})", chunk
+                        )
+                elif kind == "retention":
+                    if op["mode"] == "archive":
+                        self.write_conn.execute(
+                            "INSERT OR REPLACE INTO daily_archive SELECT * FROM daily WHERE date < ?",
+                            (op["cutoff"],)
+                        )
+                    deleted = self.write_conn.execute(
+                        "DELETE FROM daily WHERE date < ?", (op["cutoff"],)
+                    ).rowcount
+                    if deleted:
+                        action = "归档" if op["mode"] == "archive" else "删除"
+                        logger.info(f"[daily_fortune] 已{action} {op['cutoff']} 之前的 {deleted} 条每日记录")
+        return written
+
+    def memory_stats(self) -> Dict[str, int]:
+        return {
+            **super().memory_stats(),
+            "daily_overlay": len(self._daily_overlay),
+            "history_overlay": len(self._history_overlay)
+        }
+
+    def memory_structures(self) -> Dict[str, Any]:
+        return {
+            **super().memory_structures(),
+            "daily_overlay": self._daily_overlay,
+            "history_overlay": self._history_overlay
+        }
+
+    def ops_written(self, ops: List[Dict[str, Any]]):
+        """操作已写入数据库，移除覆盖层中没有被更新操作覆盖的条目"""
+        for op in ops:
+            kind, seq = op["op"], op["seq"]
+            if kind in ("put_daily", "del_daily"):
+                key = (op["date"], op["user_id"])
+                if self._daily_overlay.get(key, (None,))[0] == seq:
+                    del self._daily_overlay[key]
+            elif kind in ("put_history", "del_history"):
+                key = (op["user_id"], op["date"])
+                if self._history_overlay.get(key, (None,))[0] == seq:
+                    del self._history_overlay[key]
+            elif kind == "reset" and self._reset_seq == seq:
+                self._reset_seq = None
+
+    def close(self):
+        if self.write_conn:
+            self.flush()
+            self.write_conn.close()
+            self.write_conn = None
+        if self.read_conn:
+            self.read_conn.close()
+            self.read_conn = None
+
+
+class WriteBehindWorker:
+    """延迟写入worker
+
+    把一段时间内的写操作合并成一批，在线程池中持久化，避免在事件循环中执行阻塞IO。
+    缓冲区达到上限时，写入方会在commit()中等待刷写完成（背压）。
+    """
+
+    def __init__(self, store: BaseStore, flush_interval: float = 1.0, max_pending: int = 1000,
+                 metrics: Optional[Metrics] = None):
+        self.store = store
+        self.metrics = metrics
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self._wakeup = asyncio.Event()
+        self._flushed = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计信息
+        self.flush_count = 0
+        self.ops_written = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.failed_flushes = 0
+        self.bytes_written = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def commit(self):
+        """提交写入；缓冲区已满时等待后台刷写腾出空间"""
+        if self.store.pending_ops < self.max_pending:
+            return
+        self._wakeup.set()
+        async with self._flushed:
+            await self._flushed.wait_for(
+                lambda: self._closed or self.store.pending_ops < self.max_pending
+            )
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """把缓冲区中的操作作为一批写入"""
+        async with self._flush_lock:
+            ops = self.store.drain_ops()
+            if ops:
+                start = time.perf_counter()
+                try:
+                    written = await asyncio.to_thread(self.store.write_ops, ops)
+                except Exception as e:
+                    # 放回缓冲区，下次刷写时重试
+                    self.store.requeue_ops(ops)
+                    self.failed_flushes += 1
+                    logger.error(f"[daily_fortune] 批量写入失败（{len(ops)} 条），稍后重试: {e}")
+                else:
+                    self.store.ops_written(ops)
+                    self._record(len(ops), (time.perf_counter() - start) * 1000, written or 0)
+            column_ops = self.store.drain_column_ops()
+            if column_ops:
+                try:
+                    await asyncio.to_thread(self.store.write_column_ops, column_ops)
+                except Exception as e:
+                    logger.warning(f"[daily_fortune] 更新列式历史失败，将在下次统计时重建: {e}")
+        async with self._flushed:
+            self._flushed.notify_all()
+
+    def _record(self, batch_size: int, elapsed_ms: float, written: int):
+        self.flush_count += 1
+        self.bytes_written += written
+        self.ops_written += batch_size
+        self.last_batch_size = batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+        if self.metrics:
+            self.metrics.observe("save", "write_behind", elapsed_ms)
+            self.metrics.incr("save_bytes", "write_behind", written)
+        logger.debug(f"[daily_fortune] 批量写入 {batch_size} 条（{written} 字节），耗时 {elapsed_ms:.1f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        avg_batch = self.ops_written / self.flush_count if self.flush_count else 0
+        avg_ms = self.total_flush_ms / self.flush_count if self.flush_count else 0
+        return {
+            "pending": self.store.pending_ops,
+            "flushes": self.flush_count,
+            "ops_written": self.ops_written,
+            "failed_flushes": self.failed_flushes,
+            "bytes_written": self.bytes_written,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": round(avg_batch, 1),
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(avg_ms, 2),
+        }
+
+    async def close(self):
+        """停止后台任务并做最后一次刷写"""
+        self._closed = True
+        self._wakeup.set()
+        if self._task:
+            try:
+                await self._task
+            except Exception as e:
+                logger.debug(f"[daily_fortune] 等待写入任务结束失败: {e}")
+        await self.flush()
+
+
+def create_store(backend: str, data_dir: Path, fortune_file: Path, history_file: Path,
+                 history_cache_shards: int = 16, history_window: int = 30) -> BaseStore:
+    """根据配置创建存储后端"""
+    if backend == "sqlite":
+        store = SQLiteStore(data_dir, fortune_file, history_file)
+    else:
+        if backend != "json":
+            logger.warning(f"[daily_fortune] 未知的存储后端: {backend}，将使用json")
+        store = JournalStore(data_dir, fortune_file, history_file, history_cache_shards=history_cache_shards)
+    store.history_window = max(1, history_window)
+    store.history_columns = HistoryColumns(data_dir / "columns")
+    return store
@@ -0,0 +1,138 @@
+from string import Formatter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Mapping, Tuple, Union
+
+from astrbot.api import logger
+
+
+# 查询类模板共用的基础变量
+BASE_VARS = frozenset({
+    "nickname", "card", "title", "jrrp", "fortune", "femoji", "date",
+    "medals", "ranges_jrrp", "ranges_fortune", "ranges_emoji"
+})
+QUERY_VARS = BASE_VARS | {
+    "process", "advice", "avgjrrp", "maxjrrp", "minjrrp", "ranks", "medal",
+    "target_nickname", "target_user_id", "sender_nickname", "percentile", "group_percentile"
+}
+PROMPT_VARS = BASE_VARS | {"user_id"}
+POOL_PROMPT_VARS = frozenset({
+    "jrrp", "fortune", "femoji", "date", "medals", "ranges_jrrp", "ranges_fortune", "ranges_emoji"
+})
+
+# 模板名 -> (配置路径, 默认值, 允许的变量)
+TEMPLATE_SPECS: Dict[str, Tuple[Tuple[str, ...], str, FrozenSet[str]]] = {
+    "resault": (("templates", "resault_template"),
+                "🔮 {process}\n💎 人品值：{jrrp}\n✨ 运势：{fortune}\n💬 建议：{advice}",
+                BASE_VARS | {"process", "advice", "user_id", "percentile", "group_percentile"}),
+    "query": (("templates", "query_template"),
+              "📌 今日人品\n{nickname}，今天已经查询过了哦~\n今日人品值: {jrrp}\n运势: {fortune} {femoji}",
+              QUERY_VARS),
+    "rank": (("templates", "rank_template"),
+             "{medal} {nickname}: {jrrp} ({fortune})",
+             frozenset({"medal", "nickname", "jrrp", "fortune"})),
+    "rank_board": (("templates", "rank_board_template"),
+                   "📊【今日人品排行榜】{date}\n━━━━━━━━━━━━━━━\n{ranks}",
+                   frozenset({"date", "ranks"})),
+    "rank_self": (("templates", "rank_self_template"),
+                  "📍 {nickname} 的排名: 第 {position}/{total} 名",
+                  frozenset({"nickname", "position", "total"})),
+    "rank_period_board": (("templates", "rank_period_board_template"),
+                          "📊【{title}】{period}\n━━━━━━━━━━━━━━━\n{ranks}\n（按平均人品值排名，至少参与 {min_days} 天）",
+                          frozenset({"title", "period", "date", "min_days", "ranks"})),
+    "history": (("templates", "history_template"),
+                "📚 {nickname} 的人品历史记录\n{history}\n\n📊 统计信息:\n平均人品值: {avgjrrp}\n最高人品值: {maxjrrp}\n最低人品值: {minjrrp}",
+                frozenset({"nickname", "history", "avgjrrp", "maxjrrp", "minjrrp"})),
+    "stats": (("templates", "stats_template"),
+              "📈 {nickname} 的人品统计（{first_date} 起共 {count} 天）\n平均: {avgjrrp}  近7次: {ma7}  近30次: {ma30}\n"
+              "分位数: P25 {p25} / 中位数 {median} / P75 {p75} / P90 {p90}\n最长好运连续: {good_streak} 天\n"
+              "最长霉运连续: {bad_streak} 天\n📅 星期分布:\n{weekdays}",
+              frozenset({"nickname", "count", "first_date", "last_date", "avgjrrp", "ma7", "ma30", "trend",
+                         "p25", "median", "p75", "p90", "good_streak", "bad_streak", "weekdays",
+                         "best_weekday", "worst_weekday"})),
+    "detecting": (("detecting_message",),
+                  "神秘的能量汇聚，{nickname}，你的命运即将显现，正在祈祷中...",
+                  frozenset({"nickname"})),
+    "processing": (("processing_message",),
+                   "已经在努力获取 {nickname} 的命运了哦~",
+                   frozenset({"nickname"})),
+    "not_queried": (("others_not_queried_message",),
+                    "{target_nickname} 今天还没有查询过人品值呢~",
+                    QUERY_VARS),
+    "process_prompt": (("prompts", "process_prompt"),
+                       "读取'user_id:{user_id}'相关信息，以对其适当的称呼开头，模拟你使用水晶球缓慢复现的过程，50字以内",
+                       PROMPT_VARS),
+    "advice_prompt": (("prompts", "advice_prompt"),
+                      "人品值分段为{ranges_jrrp}，对应运势是{ranges_fortune}\n上述作为人品值好坏的参考，接下来，\n对{user_id}的今日人品值{jrrp}给出你的评语和建议，50字以内",
+                      PROMPT_VARS),
+    "pool_process_prompt": (("text_pool", "process_prompt"),
+                            "以“你”称呼对方，模拟你使用水晶球缓慢复现其今日运势（{fortune}）的过程，50字以内",
+                            POOL_PROMPT_VARS),
+    "pool_advice_prompt": (("text_pool", "advice_prompt"),
+                           "人品值分段为{ranges_jrrp}，对应运势是{ranges_fortune}\n上述作为人品值好坏的参考，接下来，\n对今日人品值在{jrrp}之间、运势为{fortune}的人给出你的评语和建议，50字以内",
+                           POOL_PROMPT_VARS),
+}
+
+# 变量值可以是普通值，也可以是无参函数（只有模板引用该变量时才调用）
+VarValue = Union[Any, Callable[[], Any]]
+
+
+class TemplateError(ValueError):
+    """模板格式错误或引用了不支持的变量"""
+
+
+class CompiledTemplate:
+    """加载时解析好的模板，记录自己引用了哪些变量，渲染时只计算这些变量"""
+
+    def __init__(self, source: str, allowed: Iterable[str]):
+        self.source = source
+        allowed = frozenset(allowed)
+        fields = set()
+        try:
+            parsed = list(Formatter().parse(source))
+        except ValueError as e:
+            raise TemplateError(f"花括号不匹配: {e}")
+        for _, field_name, format_spec, _ in parsed:
+            if field_name is None:
+                continue
+            # 取属性/下标访问前的变量名，如 {a.b} / {a[0]} 中的 a
+            root = field_name.split(".", 1)[0].split("[", 1)[0]
+            if not root or root.isdigit():
+                raise TemplateError("不支持位置参数 {}，请使用变量名")
+            if root not in allowed:
+                raise TemplateError(f"不支持的变量 {{{root}}}")
+            if format_spec and "{" in format_spec:
+                raise TemplateError(f"不支持嵌套的格式说明 {{{field_name}:{format_spec}}}")
+            fields.add(root)
+        self.fields = frozenset(fields)
+
+    def uses(self, name: str) -> bool:
+        return name in self.fields
+
+    def render(self, values: Mapping[str, VarValue]) -> str:
+        resolved = {}
+        for name in self.fields:
+            value = values.get(name, "")
+            resolved[name] = value() if callable(value) else value
+        return self.source.format_map(resolved)
+
+    def __bool__(self):
+        return bool(self.source)
+
+
+def _lookup(config: Mapping[str, Any], path: Tuple[str, ...], default: str) -> str:
+    node: Any = config
+    for key in path[:-1]:
+        node = node.get(key, {}) if isinstance(node, Mapping) else {}
+    return node.get(path[-1], default) if isinstance(node, Mapping) else default
+
+
+def compile_templates(config: Mapping[str, Any]) -> Dict[str, CompiledTemplate]:
+    """编译配置中的所有模板，格式错误的模板记录错误并回退为默认值"""
+    compiled = {}
+    for name, (path, default, allowed) in TEMPLATE_SPECS.items():
+        source = _lookup(config, path, default)
+        try:
+            compiled[name] = CompiledTemplate(source, allowed)
+        except TemplateError as e:
+            logger.error(f"[daily_fortune] 模板 {'.'.join(path)} 无效，已使用默认模板: {e}")
+            compiled[name] = CompiledTemplate(default, allowed)
+    return compiled
@@ -0,0 +1,49 @@
+"""测试公共设置
+
+插件内部使用相对导入，这里把插件目录注册为 daily_fortune 包；
+未安装AstrBot时使用 tools/bench_plugin.py 中的最小接口替身。
+"""
+import importlib.machinery
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PLUGIN_DIR / "tools"))
+
+from bench_plugin import install_astrbot_shim  # noqa: E402
+
+install_astrbot_shim()
+
+if "daily_fortune" not in sys.modules:
+    _spec = importlib.machinery.ModuleSpec("daily_fortune", None, is_package=True)
+    _spec.submodule_search_locations = [str(PLUGIN_DIR)]
+    sys.modules["daily_fortune"] = importlib.util.module_from_spec(_spec)
+
+from daily_fortune.storage import create_store  # noqa: E402
+
+TODAY = "2026-10-17"
+
+
+def reading(jrrp: int, group_id: str = "g1") -> dict:
+    """一条每日记录（只包含存储层用到的字段）"""
+    return {"jrrp": jrrp, "fortune": "吉", "result": f"今日人品 {jrrp}", "group_id": group_id}
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    """在临时数据目录中创建并加载存储，测试结束时关闭"""
+    stores = []
+
+    def factory(backend: str = "json", today: str = TODAY, **kwargs):
+        store = create_store(backend, tmp_path, tmp_path / "daily_fortune.json",
+                             tmp_path / "fortune_history.json", **kwargs)
+        store.load(today)
+        stores.append(store)
+        return store
+
+    yield factory
+    for store in stores:
+        store.close()
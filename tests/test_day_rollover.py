@@ -0,0 +1,122 @@
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bench_plugin import FakeEvent, FakeProvider, StubContext
+from daily_fortune import main
+
+# Asia/Shanghai 零点 = UTC 16:00，UTC日期此时还没变
+BEFORE_MIDNIGHT = datetime(2026, 10, 16, 15, 59, 59, tzinfo=timezone.utc)
+DAY, NEXT_DAY = "2026-10-16", "2026-10-17"
+
+
+class Clock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def advance(self, seconds: float):
+        self.now += timedelta(seconds=seconds)
+
+
+class MidnightProvider(FakeProvider):
+    """第一次调用期间时钟越过零点，并像后台日期切换任务一样切换日期"""
+
+    def __init__(self, clock: Clock):
+        super().__init__(0.0, 0.0, 0.0, random.Random(0))
+        self.clock = clock
+        self.plugin = None
+        self.armed = False
+
+    async def text_chat(self, prompt: str = "", contexts=None, system_prompt: str = "", **kwargs):
+        if self.armed:
+            self.armed = False
+            self.clock.advance(2)
+            self.plugin._get_today_key()
+        return await super().text_chat(prompt, contexts, system_prompt, **kwargs)
+
+
+@pytest.fixture
+def plugin_factory(tmp_path, monkeypatch):
+    """在临时目录中构造插件，_now() 使用注入的时钟并换算到配置的时区"""
+    monkeypatch.chdir(tmp_path)
+    clock = Clock(BEFORE_MIDNIGHT)
+    monkeypatch.setattr(main.DailyFortunePlugin, "_now", lambda self: clock.now.astimezone(self._timezone))
+    provider = MidnightProvider(clock)
+
+    def factory(backend: str = "json"):
+        config = {"storage": {"backend": backend}, "day_rollover": {"timezone": "Asia/Shanghai"}}
+        plugin = main.DailyFortunePlugin(StubContext(provider), config)
+        provider.plugin = plugin
+        return plugin
+
+    return factory, clock, provider
+
+
+def _event(user_id: str, text: str = "jrrp") -> FakeEvent:
+    return FakeEvent(sys.modules["astrbot.api.message_components"], user_id, "g1", text)
+
+
+async def _query(plugin, user_id: str):
+    return [result async for result in plugin.jrrp(_event(user_id))]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_rollover_happens_at_configured_midnight(plugin_factory, backend):
+    factory, clock, _ = plugin_factory
+
+    async def scenario():
+        plugin = factory(backend)
+        try:
+            assert plugin._current_day == DAY
+            await _query(plugin, "u1")
+            assert plugin.leaderboards.size("g1") == 1
+
+            clock.advance(2)
+            # UTC日期仍是10-16，按配置时区已经是新的一天
+            assert clock.now.date().isoformat() == DAY
+            assert plugin._get_today_key() == NEXT_DAY
+            assert plugin.rollups.sealed_through == DAY
+            assert plugin.rollups.ranking("g1", "all", NEXT_DAY)[0][0] == "u1"
+            assert plugin.leaderboards.day == NEXT_DAY and plugin.leaderboards.size("g1") == 0
+            assert plugin.score_histograms.day == NEXT_DAY and plugin.score_histograms.overall.total == 0
+            assert plugin.store.get_daily(DAY, "u1") is not None
+
+            await _query(plugin, "u1")
+            assert plugin.store.get_daily(NEXT_DAY, "u1") is not None
+            assert plugin.leaderboards.size("g1") == 1
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_query_finishing_after_midnight_stays_in_its_day(plugin_factory, backend):
+    factory, clock, provider = plugin_factory
+
+    async def scenario():
+        plugin = factory(backend)
+        try:
+            await _query(plugin, "u1")
+            provider.armed = True
+            await _query(plugin, "u2")
+            assert plugin._current_day == NEXT_DAY
+
+            # 记录和人品值属于查询开始的那天
+            record = plugin.store.get_daily(DAY, "u2")
+            assert record["jrrp"] == plugin.jrrp_engine.compute_one("u2", DAY)
+            assert plugin.store.get_daily(NEXT_DAY, "u2") is None
+            # 新一天的排行榜和分布中没有这条记录
+            assert plugin.leaderboards.size("g1") == 0
+            assert plugin.score_histograms.overall.total == 0
+            # 前一天已封存，直接计入汇总
+            ranked = {user_id: (avg, days) for user_id, avg, days in plugin.rollups.ranking("g1", "all", NEXT_DAY)}
+            assert ranked["u2"] == (record["jrrp"], 1) and ranked["u1"][1] == 1
+            assert plugin.rollups._open == {}
+        finally:
+            await plugin.terminate()
+
+    asyncio.run(scenario())
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from daily_fortune import fortune_levels
+from daily_fortune.fortune_levels import UNKNOWN, FortuneTable, parse_ranges
+
+
+def _table(ranges: str) -> FortuneTable:
+    return FortuneTable([(low, high, f"L{i}", f"E{i}") for i, (low, high) in enumerate(parse_ranges(ranges))])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("0-1, 2-10, 11-20", [(0, 1), (2, 10), (11, 20)]),
+    ("-10--1,0,1-5", [(-10, -1), (0, 0), (1, 5)]),
+    (" 7 , -3 - 3 ,", [(7, 7), (-3, 3)]),
+    ("", []),
+])
+def test_parse_ranges(text, expected):
+    assert parse_ranges(text) == expected
+
+
+@pytest.mark.parametrize("text", ["1-", "a-5", "1-2-3", "10-1", "-1--10"])
+def test_parse_ranges_rejects_invalid(text):
+    with pytest.raises(ValueError):
+        parse_ranges(text)
+
+
+# (分段配置, 空隙, 重叠(先前序号, 当前序号, 起, 止))
+CASES = [
+    ("0-50, 51-100", [], []),
+    ("0-10, 20-30", [(11, 19)], []),
+    ("0-10, 12, 14-20", [(11, 11), (13, 13)], []),
+    ("0-10, 5-15", [], [(0, 1, 5, 10)]),
+    ("0-20, 5-8, 15-30", [], [(0, 1, 5, 8), (0, 2, 15, 20)]),
+    ("-10--1, 1-10", [(0, 0)], []),
+    ("-5, -3-3, 5", [(-4, -4), (4, 4)], []),
+    ("0-10, 3, 3", [], [(0, 1, 3, 3), (0, 2, 3, 3)]),
+]
+
+
+@pytest.fixture(params=["dense", "sparse"])
+def mode(request, monkeypatch):
+    if request.param == "sparse":
+        monkeypatch.setattr(fortune_levels, "MAX_TABLE_SPAN", 0)
+    return request.param
+
+
+@pytest.mark.parametrize("ranges, gaps, overlaps", CASES)
+def test_gaps_and_overlaps(mode, ranges, gaps, overlaps):
+    table = _table(ranges)
+    assert table.sparse == (mode == "sparse")
+    assert table.gaps == gaps
+    assert sorted(table.overlaps) == sorted(overlaps)
+    assert len(table.report()) == len(gaps) + len(overlaps)
+
+
+def _linear_index(levels, value):
+    """原先的线性扫描，靠前的分段优先"""
+    for i, (low, high, _, _) in enumerate(levels):
+        if low <= value <= high:
+            return i
+    return -1
+
+
+@pytest.mark.parametrize("ranges", [ranges for ranges, _, _ in CASES])
+def test_lookup_matches_linear_scan(mode, ranges):
+    table = _table(ranges)
+    values = np.arange(table.offset - 3, table.upper + 4)
+    expected = [_linear_index(table.levels, int(v)) for v in values]
+    assert [table.index(int(v)) for v in values] == expected
+    assert table.classify_many(values).tolist() == expected
+    for value, i in zip(values.tolist(), expected):
+        assert table.lookup(value) == (UNKNOWN if i < 0 else (f"L{i}", f"E{i}"))
+        assert table.band(value) == (None if i < 0 else table.levels[i][:2])
+    assert table.names_many(values).tolist() == [UNKNOWN[0] if i < 0 else f"L{i}" for i in expected]
+
+
+def test_wide_span_switches_to_sparse():
+    table = _table("0-10, 11-99999999")
+    assert table.sparse
+    assert table.bounds == (0, 99999999)
+    assert table.lookup(5) == ("L0", "E0")
+    assert table.lookup(5000000) == ("L1", "E1")
+    assert table.classify_many([-1, 0, 99999999, 100000000]).tolist() == [-1, 0, 1, -1]
+
+
+def test_report_wording():
+    table = _table("0-10, 12, 5-6")
+    assert table.report() == [
+        "11 不属于任何分段",
+        "分段 5-6(L2) 与 0-10(L0) 在 5-6 重叠，按 L0 处理",
+    ]
+    assert _table("0-10, 20-30").report() == ["11-19 不属于任何分段"]
+
+
+def test_empty_table():
+    table = FortuneTable([])
+    assert table.lookup(50) == UNKNOWN
+    assert table.classify_many([1, 2]).tolist() == [-1, -1]
+    assert table.report() == []
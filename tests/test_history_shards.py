@@ -0,0 +1,65 @@
+import json
+
+from conftest import TODAY
+
+
+def _entry(jrrp):
+    return {"jrrp": jrrp, "fortune": "吉"}
+
+
+def test_legacy_history_file_is_split_into_shards(open_store, tmp_path):
+    legacy = {
+        "u1": {"2026-10-16": _entry(60), "2026-10-15": _entry(50)},
+        "u2": {TODAY: _entry(70)},
+        "u3": {}
+    }
+    (tmp_path / "fortune_history.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    store = open_store()
+    assert not (tmp_path / "fortune_history.json").exists()
+    assert (tmp_path / "fortune_history.json.migrated").exists()
+    index = json.loads((tmp_path / "history" / "index.json").read_text(encoding="utf-8"))
+    assert index["users"] == {"u1": 2, "u2": 1}
+    # 旧文件中的日期顺序不保证，读取时按日期从新到旧
+    assert [day for day, _ in store.get_history("u1")] == ["2026-10-16", "2026-10-15"]
+    assert store.get_history("u3") == []
+
+
+def test_shards_load_lazily(open_store):
+    store = open_store()
+    for i in range(20):
+        store.put_history(f"u{i}", TODAY, _entry(i))
+    store.flush()
+    store.compact()
+    store.close()
+
+    reopened = open_store()
+    assert len(reopened.history_index) == 20
+    assert not reopened._history_cache
+    assert reopened.get_history("u7") == [(TODAY, _entry(7))]
+    assert list(reopened._history_cache) == [reopened._shard_of("u7")]
+
+
+def test_lru_keeps_dirty_shards(open_store):
+    store = open_store(history_cache_shards=2)
+    users = {}
+    for i in range(200):
+        users.setdefault(store._shard_of(f"u{i}"), f"u{i}")
+        if len(users) == 4:
+            break
+    shard_ids = list(users)
+
+    store.put_history(users[shard_ids[0]], TODAY, _entry(1))
+    store.flush()
+    store.compact()
+    for shard_id in shard_ids[1:]:
+        store.put_history(users[shard_id], TODAY, _entry(2))
+    # 未写回的分片不会被淘汰，写回后才按LRU释放
+    assert set(shard_ids[1:]) <= set(store._history_cache)
+    assert shard_ids[0] not in store._history_cache
+
+    store.flush()
+    store.compact()
+    assert len(store._history_cache) <= 2
+    for shard_id in shard_ids:
+        assert store.get_history(users[shard_id])
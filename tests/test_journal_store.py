@@ -0,0 +1,111 @@
+import json
+
+from conftest import TODAY, reading
+
+
+def test_replay_restores_unflushed_journal(open_store, tmp_path):
+    store = open_store()
+    store.put_daily(TODAY, "u1", reading(80))
+    store.put_history("u1", TODAY, {"jrrp": 80, "fortune": "吉"})
+    store.put_daily(TODAY, "u2", reading(20))
+    store.delete_daily(TODAY, "u2")
+    store.flush()
+    # 不压缩，模拟进程退出后只剩journal
+    store._segment_fp.close()
+
+    reopened = open_store()
+    assert reopened.pending_records == 4
+    assert reopened.get_daily(TODAY, "u1")["jrrp"] == 80
+    assert reopened.get_daily(TODAY, "u2") is None
+    assert reopened.get_history("u1") == [(TODAY, {"jrrp": 80, "fortune": "吉"})]
+
+
+def test_replay_skips_torn_tail(open_store, tmp_path):
+    store = open_store()
+    store.put_daily(TODAY, "u1", reading(60))
+    store.flush()
+    store._segment_fp.close()
+    segment = sorted((tmp_path / "journal").glob("*.jsonl"))[0]
+    with open(segment, "a", encoding="utf-8") as f:
+        f.write('{"op":"put_daily","date":"%s","user_id":"u2","data":{"jr' % TODAY)
+
+    reopened = open_store()
+    assert reopened.get_daily(TODAY, "u1")["jrrp"] == 60
+    assert reopened.get_daily(TODAY, "u2") is None
+    assert reopened.pending_records == 1
+    # 新写入追加到新段，不会接在损坏的行后面
+    reopened.put_daily(TODAY, "u3", reading(70))
+    reopened.flush()
+    assert reopened._segment_path(reopened._segment_seq) != segment
+
+
+def test_compaction_writes_snapshot_and_drops_segments(open_store, tmp_path):
+    store = open_store()
+    store.put_daily("2026-10-16", "u1", reading(10))
+    store.put_daily(TODAY, "u1", reading(90))
+    store.put_history("u1", TODAY, {"jrrp": 90, "fortune": "大吉"})
+    store.flush()
+    store.compact()
+
+    assert store.pending_records == 0
+    state = json.loads((tmp_path / "journal" / "state.json").read_text(encoding="utf-8"))
+    assert all(seq > state["compacted_through"] for seq in store._list_segments())
+    assert json.loads((tmp_path / "daily" / f"{TODAY}.json").read_text(encoding="utf-8"))["u1"]["jrrp"] == 90
+    # 非今日分区写回后移出内存
+    assert "2026-10-16" not in store.daily_data
+    assert store.get_daily("2026-10-16", "u1")["jrrp"] == 10
+    store.close()
+
+    reopened = open_store()
+    assert reopened.pending_records == 0
+    assert reopened.get_daily(TODAY, "u1")["jrrp"] == 90
+    assert reopened.get_history("u1")[0][1]["fortune"] == "大吉"
+
+
+def test_writes_during_compaction_go_to_next_segment(open_store):
+    store = open_store()
+    store.put_daily(TODAY, "u1", reading(50))
+    store.flush()
+    job = store.begin_compaction()
+    # 压缩任务在线程中执行期间，事件循环仍然可以写入
+    store.put_daily(TODAY, "u2", reading(40))
+    store.flush()
+    job()
+    store.finish_compaction()
+    assert store.pending_records == 1
+    store.close()
+
+    reopened = open_store()
+    assert reopened.get_daily(TODAY, "u1")["jrrp"] == 50
+    assert reopened.get_daily(TODAY, "u2")["jrrp"] == 40
+
+
+def test_replaying_compacted_segment_is_idempotent(open_store, tmp_path):
+    store = open_store()
+    store.put_daily(TODAY, "u1", reading(30))
+    store.put_history("u1", TODAY, {"jrrp": 30, "fortune": "末吉"})
+    store.flush()
+    segment = store._segment_path(store._segment_seq)
+    saved = segment.read_text(encoding="utf-8")
+    store.compact()
+    store.close()
+
+    # 模拟压缩写完快照、但还没记录进度就崩溃：旧段仍在，state.json是旧的
+    segment.write_text(saved, encoding="utf-8")
+    (tmp_path / "journal" / "state.json").write_text('{"compacted_through": 0}', encoding="utf-8")
+
+    reopened = open_store()
+    assert reopened.get_daily(TODAY, "u1")["jrrp"] == 30
+    assert reopened.get_history("u1") == [(TODAY, {"jrrp": 30, "fortune": "末吉"})]
+
+
+def test_legacy_daily_file_is_split_into_partitions(open_store, tmp_path):
+    legacy = {"2026-10-15": {"u1": reading(11)}, TODAY: {"u1": reading(77), "u2": reading(33)}}
+    (tmp_path / "daily_fortune.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    store = open_store()
+    assert not (tmp_path / "daily_fortune.json").exists()
+    assert (tmp_path / "daily_fortune.json.migrated").exists()
+    assert (tmp_path / "daily" / "2026-10-15.json").exists()
+    assert store.get_daily("2026-10-15", "u1")["jrrp"] == 11
+    assert [uid for uid, _ in store.top_daily(TODAY, 10)] == ["u1", "u2"]
@@ -0,0 +1,89 @@
+import hashlib
+import random
+
+import numpy as np
+import pytest
+
+from daily_fortune.jrrp_engine import ALGORITHMS, JrrpEngine
+
+DAY, NEXT_DAY = "2026-10-17", "2026-10-18"
+USERS = [f"u{i}" for i in range(200)]
+SEEDED = [algorithm for algorithm in ALGORITHMS if algorithm != "hash"]
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+def test_same_seed_gives_same_values(algorithm):
+    first = JrrpEngine(algorithm, entropy=42).compute(USERS, DAY)
+    second = JrrpEngine(algorithm, entropy=42)
+    assert first.tolist() == second.compute(USERS, DAY).tolist()
+    # 批量计算与逐个计算、预先计算的用户哈希结果一致
+    assert [second.compute_one(uid, DAY) for uid in USERS[:20]] == first[:20].tolist()
+    assert second.compute(USERS, DAY, keys=JrrpEngine.user_keys(USERS)).tolist() == first.tolist()
+    assert ((first >= 0) & (first <= 100)).all()
+
+
+@pytest.mark.parametrize("algorithm", SEEDED)
+def test_streams_differ_by_seed_user_and_day(algorithm):
+    engine = JrrpEngine(algorithm, entropy=42)
+    today = engine.compute(USERS, DAY)
+    assert today.tolist() != engine.compute(USERS, NEXT_DAY).tolist()
+    assert today.tolist() != JrrpEngine(algorithm, entropy=43).compute(USERS, DAY).tolist()
+    # 不同用户使用不同的流，200个用户不会全部相同
+    assert len(set(today.tolist())) > 10
+
+
+def test_reroll_moves_only_that_user_to_a_new_stream():
+    engine = JrrpEngine(entropy=7)
+    before = engine.compute(USERS, DAY)
+    engine.reroll("u0", DAY)
+    assert engine.rerolled("u0", DAY) and not engine.rerolled("u1", DAY)
+    uniforms = engine._uniforms(USERS, DAY)
+    fresh = JrrpEngine(entropy=7)._uniforms(USERS, DAY)
+    assert not np.array_equal(uniforms[0], fresh[0])
+    assert np.array_equal(uniforms[1:], fresh[1:])
+    assert engine.compute(USERS[1:], DAY).tolist() == before[1:].tolist()
+
+    # 再次重抽换到第三条流，且结果仍然是确定的
+    engine.reroll("u0", DAY)
+    other = JrrpEngine(entropy=7)
+    other.reroll("u0", DAY)
+    other.reroll("u0", DAY)
+    assert not np.array_equal(engine._uniforms(["u0"], DAY)[0], uniforms[0])
+    assert engine.compute_one("u0", DAY) == other.compute_one("u0", DAY)
+
+
+def test_reroll_is_forgotten_on_the_next_day():
+    engine = JrrpEngine(entropy=7)
+    engine.reroll("u0", DAY)
+    assert engine.compute_one("u0", NEXT_DAY) == JrrpEngine(entropy=7).compute_one("u0", NEXT_DAY)
+    assert not engine.rerolled("u0", DAY) and not engine.rerolled("u0", NEXT_DAY)
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS)
+def test_global_random_state_is_untouched(algorithm):
+    random.seed(1)
+    np.random.seed(1)
+    py_state, np_state = random.getstate(), np.random.get_state()
+
+    engine = JrrpEngine(algorithm)
+    engine.compute(USERS, DAY)
+    engine.reroll("u0", DAY)
+    engine.compute_one("u0", DAY)
+
+    assert random.getstate() == py_state
+    after = np.random.get_state()
+    assert after[0] == np_state[0] and np.array_equal(after[1], np_state[1]) and after[2:] == np_state[2:]
+
+
+def test_hash_algorithm_keeps_md5_results():
+    expected = [int(hashlib.md5(f"{uid}_{DAY}".encode()).hexdigest(), 16) % 101 for uid in USERS]
+    assert JrrpEngine("hash").compute(USERS, DAY).tolist() == expected
+    # hash算法不受根种子和重抽影响
+    engine = JrrpEngine("hash", entropy=1)
+    engine.reroll("u0", DAY)
+    assert engine.compute_one("u0", DAY) == expected[0]
+
+
+def test_unknown_algorithm_falls_back_to_random():
+    assert JrrpEngine("nope").algorithm == "random"
+    assert JrrpEngine().compute([], DAY).tolist() == []
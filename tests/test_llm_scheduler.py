@@ -0,0 +1,203 @@
+import asyncio
+import types
+
+import pytest
+
+from daily_fortune import llm_scheduler
+from daily_fortune.llm_scheduler import LLMScheduler, LLMUnavailable, remaining_time
+
+
+class FakeClock:
+    """替换调度器模块里的 time，熔断冷却时间由测试手动推进"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_scheduler, "time", types.SimpleNamespace(
+        monotonic=fake.monotonic, perf_counter=fake.perf_counter))
+    return fake
+
+
+async def _fail():
+    raise RuntimeError("provider error")
+
+
+async def _ok():
+    return "ok"
+
+
+def test_queued_calls_run_in_arrival_order():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=10, timeout=5)
+    order = []
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def first():
+            order.append("first")
+            await gate.wait()
+
+        async def queued(name):
+            order.append(name)
+
+        tasks = [asyncio.create_task(scheduler.run(first))]
+        await asyncio.sleep(0)
+        for name in ("a", "b", "c"):
+            tasks.append(asyncio.create_task(scheduler.run(lambda name=name: queued(name))))
+            await asyncio.sleep(0)
+        assert scheduler.in_flight == 1 and scheduler.queued == 3
+        gate.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["first", "a", "b", "c"]
+    assert scheduler.in_flight == 0 and scheduler.queued == 0
+    assert scheduler.max_queue_seen == 3
+
+
+def test_full_queue_rejects_immediately():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=1, timeout=5)
+
+    async def scenario():
+        gate = asyncio.Event()
+        running = asyncio.create_task(scheduler.run(gate.wait))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.run(_ok))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMUnavailable):
+            await scheduler.run(_ok)
+        gate.set()
+        return await asyncio.gather(running, waiting)
+
+    assert asyncio.run(scenario())[1] == "ok"
+    assert scheduler.rejected == 1
+
+
+def test_queue_wait_counts_against_deadline():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue=5, timeout=0.3)
+    seen = []
+
+    async def slow_after_queue():
+        seen.append(remaining_time())
+        await asyncio.sleep(0.15)
+
+    async def scenario():
+        running = asyncio.create_task(scheduler.run(lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0)
+        # 调用本身只需0.15s，但排队已用掉0.2s，剩余时间不足
+        with pytest.raises(LLMUnavailable):
+            await scheduler.run(slow_after_queue)
+        await running
+        assert scheduler.in_flight == 0
+        assert await scheduler.run(_ok) == "ok"
+
+    asyncio.run(scenario())
+    assert 0.0 < seen[0] < 0.15
+    assert scheduler.timeouts == 1
+
+
+def test_remaining_time_follows_each_call():
+    scheduler = LLMScheduler(max_in_flight=2, timeout=2.0)
+    seen = {}
+
+    async def probe(name, delay):
+        await asyncio.sleep(delay)
+        seen[name] = remaining_time()
+
+    async def scenario():
+        assert remaining_time() is None
+        await asyncio.gather(scheduler.run(lambda: probe("early", 0.0)),
+                             scheduler.run(lambda: probe("late", 0.3)))
+        # 调用结束后不再处于调度器的截止时间内
+        assert remaining_time() is None
+
+    asyncio.run(scenario())
+    assert 1.8 < seen["early"] <= 2.0
+    assert 1.5 < seen["late"] < 1.8
+
+
+def test_call_timeout_is_reported_as_unavailable():
+    scheduler = LLMScheduler(timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(LLMUnavailable):
+            await scheduler.run(lambda: asyncio.sleep(1))
+
+    asyncio.run(scenario())
+    assert scheduler.timeouts == 1 and scheduler.failures == 1 and scheduler.in_flight == 0
+
+
+def test_breaker_opens_then_recovers_through_probe(clock):
+    scheduler = LLMScheduler(window=4, min_calls=2, error_threshold=0.5, cooldown=10)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await scheduler.run(_fail)
+        assert scheduler.state == LLMScheduler.OPEN
+        with pytest.raises(LLMUnavailable):
+            await scheduler.run(_ok)
+        assert scheduler.short_circuited == 1
+
+        clock.now += 11
+        gate = asyncio.Event()
+        probe = asyncio.create_task(scheduler.run(gate.wait))
+        await asyncio.sleep(0)
+        assert scheduler.state == LLMScheduler.HALF_OPEN
+        # 试探调用进行中，其他调用继续被拒绝
+        with pytest.raises(LLMUnavailable):
+            await scheduler.run(_ok)
+        gate.set()
+        await probe
+        assert scheduler.state == LLMScheduler.CLOSED
+        assert await scheduler.run(_ok) == "ok"
+
+    asyncio.run(scenario())
+    assert scheduler.short_circuited == 2
+
+
+def test_failed_probe_reopens_breaker(clock):
+    scheduler = LLMScheduler(window=2, min_calls=2, error_threshold=0.5, cooldown=10)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await scheduler.run(_fail)
+        clock.now += 11
+        with pytest.raises(RuntimeError):
+            await scheduler.run(_fail)
+        assert scheduler.state == LLMScheduler.OPEN
+        # 冷却重新计时
+        clock.now += 5
+        with pytest.raises(LLMUnavailable):
+            await scheduler.run(_ok)
+        clock.now += 6
+        assert await scheduler.run(_ok) == "ok"
+        assert scheduler.state == LLMScheduler.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_slow_calls_open_breaker(clock):
+    scheduler = LLMScheduler(window=2, min_calls=2, latency_threshold=5, cooldown=10)
+
+    async def slow():
+        clock.now += 6
+        return "slow"
+
+    async def scenario():
+        for _ in range(2):
+            assert await scheduler.run(slow) == "slow"
+        assert scheduler.state == LLMScheduler.OPEN
+
+    asyncio.run(scenario())
@@ -0,0 +1,157 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from daily_fortune import openai_client
+from daily_fortune.llm_scheduler import LLMScheduler
+from daily_fortune.openai_client import OpenAIAPIError, OpenAICompatibleClient, normalize_chat_url
+
+
+class StubServer:
+    """按预设的状态码序列应答的 /v1/chat/completions，记录每次请求的客户端端口"""
+
+    def __init__(self, statuses=(200,), delay: float = 0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests = []
+        self.peers = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append(await request.json())
+        self.peers.append(request.transport.get_extra_info("peername")[1])
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        if status != 200:
+            return web.Response(status=status, text=f"status {status}")
+        return web.json_response({"choices": [{"message": {"content": " PONG "}}]})
+
+
+@asynccontextmanager
+async def serve(stub: StubServer):
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", stub.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        await runner.cleanup()
+
+
+def test_normalize_chat_url():
+    assert normalize_chat_url("https://api.example.com") == "https://api.example.com/v1/chat/completions"
+    assert normalize_chat_url("https://api.example.com/v1/") == "https://api.example.com/v1/chat/completions"
+    assert normalize_chat_url("https://api.example.com/v1/chat/completions") == \
+        "https://api.example.com/v1/chat/completions"
+
+
+def test_retries_transient_errors():
+    stub = StubServer([503, 429, 200])
+
+    async def scenario():
+        async with serve(stub) as url:
+            client = OpenAICompatibleClient(url, "key", max_retries=2, retry_backoff=0.01)
+            try:
+                response = await client.text_chat("ping", system_prompt="persona", max_tokens=5)
+            finally:
+                await client.close()
+        return client, response
+
+    client, response = asyncio.run(scenario())
+    assert response.completion_text == "PONG"
+    assert client.stats() == {"requests": 3, "retries": 2, "errors": 0}
+    assert stub.requests[0]["messages"][0] == {"role": "system", "content": "persona"}
+    assert stub.requests[0]["max_tokens"] == 5
+
+
+def test_does_not_retry_client_errors():
+    stub = StubServer([400])
+
+    async def scenario():
+        async with serve(stub) as url:
+            client = OpenAICompatibleClient(url, "key", max_retries=3, retry_backoff=0.01)
+            try:
+                with pytest.raises(OpenAIAPIError) as error:
+                    await client.text_chat("ping")
+            finally:
+                await client.close()
+        return client, error.value
+
+    client, error = asyncio.run(scenario())
+    assert error.status == 400
+    assert len(stub.requests) == 1
+    assert client.stats() == {"requests": 1, "retries": 0, "errors": 1}
+
+
+def test_backoff_uses_full_jitter(monkeypatch):
+    stub = StubServer([500])
+    bounds = []
+
+    def fake_uniform(low, high):
+        bounds.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(openai_client.random, "uniform", fake_uniform)
+
+    async def scenario():
+        async with serve(stub) as url:
+            client = OpenAICompatibleClient(url, "key", max_retries=3, retry_backoff=0.5)
+            try:
+                with pytest.raises(OpenAIAPIError):
+                    await client.text_chat("ping")
+            finally:
+                await client.close()
+
+    asyncio.run(scenario())
+    # 每次重试在 [0, backoff * 2^(n-1)] 中随机等待
+    assert bounds == [(0, 0.5), (0, 1.0), (0, 2.0)]
+    assert len(stub.requests) == 4
+
+
+def test_session_and_connection_are_reused():
+    stub = StubServer([200])
+
+    async def scenario():
+        async with serve(stub) as url:
+            client = OpenAICompatibleClient(url, "key", max_connections=1)
+            try:
+                session = client._get_session()
+                for _ in range(3):
+                    await client.text_chat("ping")
+                assert client._get_session() is session
+            finally:
+                await client.close()
+            assert client._session is None
+
+    asyncio.run(scenario())
+    # 长连接：三次请求来自同一个客户端端口
+    assert len(stub.peers) == 3 and len(set(stub.peers)) == 1
+
+
+def test_attempts_are_bounded_by_scheduler_deadline():
+    stub = StubServer([200], delay=2.0)
+
+    async def scenario():
+        async with serve(stub) as url:
+            client = OpenAICompatibleClient(url, "key", timeout=10.0, max_retries=3, retry_backoff=0.01)
+            scheduler = LLMScheduler(timeout=1.5)
+            start = time.perf_counter()
+            try:
+                with pytest.raises((OpenAIAPIError, asyncio.TimeoutError)):
+                    await scheduler.run(lambda: client.text_chat("ping"))
+            finally:
+                await client.close()
+            return client, time.perf_counter() - start
+
+    client, elapsed = asyncio.run(scenario())
+    # 单次请求的超时被压缩到调度器剩余时间内，剩余时间不够时不再重试
+    assert elapsed < 1.9
+    assert len(stub.requests) == 1
+    assert client.retries == 0
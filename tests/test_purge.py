@@ -0,0 +1,269 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from conftest import TODAY, reading
+from daily_fortune.storage import WriteBehindWorker
+
+DAYS = ["2026-10-14", "2026-10-15", "2026-10-16", TODAY]
+
+
+def _fill(store):
+    for day in DAYS:
+        store.put_daily(day, "u1", reading(10))
+        store.put_history("u1", day, {"jrrp": 10, "fortune": "吉"})
+    store.put_daily("2026-10-15", "u2", reading(20))
+    store.put_history("u2", "2026-10-15", {"jrrp": 20, "fortune": "吉"})
+    store.put_daily(TODAY, "u3", reading(30))
+
+
+def test_daily_index_is_built_once_from_partitions(open_store, tmp_path):
+    (tmp_path / "daily").mkdir()
+    for day, users in {"2026-10-15": ["u1", "u2"], "2026-10-16": ["u1"]}.items():
+        (tmp_path / "daily" / f"{day}.json").write_text(
+            json.dumps({uid: reading(1) for uid in users}), encoding="utf-8")
+
+    store = open_store()
+    assert store.daily_index == {"u1": {"2026-10-15", "2026-10-16"}, "u2": {"2026-10-15"}}
+    saved = json.loads((tmp_path / "daily_index.json").read_text(encoding="utf-8"))
+    assert saved == {"u1": ["2026-10-15", "2026-10-16"], "u2": ["2026-10-15"]}
+
+
+def test_daily_index_follows_writes_across_restart(open_store):
+    store = open_store()
+    _fill(store)
+    store.delete_daily("2026-10-14", "u1")
+    store.flush()
+    store.compact()
+    store.close()
+
+    reopened = open_store()
+    assert reopened.daily_index["u1"] == set(DAYS[1:])
+    assert reopened.daily_index["u2"] == {"2026-10-15"}
+
+
+def test_delete_user_data_reads_only_indexed_partitions(open_store):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+
+    read = []
+    read_partition = store._read_partition
+
+    def tracked(day):
+        read.append(day)
+        return read_partition(day)
+
+    store._read_partition = tracked
+
+    assert store.delete_user_data("u2") == 2
+    assert set(read) == {"2026-10-15"}
+    assert "u2" not in store.daily_index
+    assert store.get_daily("2026-10-15", "u1") is not None
+
+
+def test_delete_user_data_keeps_today(open_store):
+    store = open_store()
+    _fill(store)
+
+    assert store.delete_user_data("u1", keep_day=TODAY) == 6
+    assert store.daily_index["u1"] == {TODAY}
+    assert store.get_daily(TODAY, "u1") is not None
+    assert store.get_history("u1") == [(TODAY, {"jrrp": 10, "fortune": "吉"})]
+
+
+def test_stale_index_entries_are_dropped(open_store, tmp_path):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+    # 分区已被清理，但索引还没来得及写回
+    (tmp_path / "daily" / "2026-10-14.json").unlink()
+
+    store.delete_user_data("u1")
+    assert "u1" not in store.daily_index
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_delete_users_is_written_as_one_batch(open_store, backend):
+    store = open_store(backend)
+    _fill(store)
+    store.flush()
+
+    deleted = store.delete_users(["u1", "u2", "u1", "missing"])
+    assert deleted == 10
+    pending = store.pending_ops
+
+    async def flush():
+        worker = WriteBehindWorker(store, flush_interval=60)
+        await worker.flush()
+        return worker
+
+    worker = asyncio.run(flush())
+    # 10条删除 + 1条删除归档记录
+    assert worker.flush_count == 1 and worker.last_batch_size == pending == 11
+    store.close()
+
+    reopened = open_store(backend)
+    for day in DAYS:
+        assert reopened.get_daily(day, "u1") is None
+    assert reopened.get_daily("2026-10-15", "u2") is None
+    assert reopened.get_history("u1") == [] and reopened.get_history("u2") == []
+    assert reopened.get_daily(TODAY, "u3")["jrrp"] == 30
+
+
+def test_compaction_appends_only_index_changes(open_store, tmp_path):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+    snapshot = (tmp_path / "daily_index.json").read_text(encoding="utf-8")
+    log_lines = (tmp_path / "daily_index.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(log_lines) == 6
+
+    store.put_daily(TODAY, "u4", reading(40))
+    store.delete_daily("2026-10-14", "u1")
+    store.flush()
+    store.compact()
+    # 快照不变，日志只多出本次变化的两行
+    assert (tmp_path / "daily_index.json").read_text(encoding="utf-8") == snapshot
+    tail = (tmp_path / "daily_index.jsonl").read_text(encoding="utf-8").splitlines()[len(log_lines):]
+    assert [json.loads(line) for line in tail] == [["u4", TODAY, 1], ["u1", "2026-10-14", 0]]
+    store.close()
+
+    reopened = open_store()
+    assert reopened.daily_index["u1"] == set(DAYS[1:])
+    assert reopened.daily_index["u4"] == {TODAY}
+
+
+def test_index_log_is_merged_when_larger_than_index(open_store, tmp_path):
+    store = open_store()
+    store.DAILY_INDEX_LOG_MIN = 0
+    _fill(store)
+    store.delete_daily("2026-10-14", "u1")
+    store.flush()
+    store.compact()
+    # 6行日志多于5条索引，合并成快照并删除日志
+    assert not (tmp_path / "daily_index.jsonl").exists()
+    saved = json.loads((tmp_path / "daily_index.json").read_text(encoding="utf-8"))
+    assert saved["u1"] == DAYS[1:] and saved["u2"] == ["2026-10-15"]
+    assert store._index_log_lines == 0
+
+
+def test_torn_index_log_line_is_skipped(open_store, tmp_path):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+    store.close()
+    with open(tmp_path / "daily_index.jsonl", "a", encoding="utf-8") as f:
+        f.write('["u9","2026-10')
+
+    reopened = open_store()
+    assert "u9" not in reopened.daily_index
+    reopened.put_daily(TODAY, "u5", reading(50))
+    reopened.flush()
+    reopened.compact()
+    reopened.close()
+
+    # 新追加的行不会接在损坏的行后面
+    again = open_store()
+    assert again.daily_index["u5"] == {TODAY}
+    assert again.daily_index["u1"] == set(DAYS)
+
+
+def _archived_users(tmp_path):
+    archived = {}
+    for path in (tmp_path / "daily" / "archive").glob("*.json.gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            archived[path.name[:10]] = set(json.load(f))
+    return archived
+
+
+def test_purge_removes_user_from_json_archive(open_store, tmp_path):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+    store.apply_retention("2026-10-16", "archive")()
+    assert _archived_users(tmp_path) == {"2026-10-14": {"u1"}, "2026-10-15": {"u1", "u2"}}
+
+    store.delete_users(["u1"])
+    store.flush()
+    # 只剩u1的归档文件被删除，其余文件去掉u1后改写
+    assert _archived_users(tmp_path) == {"2026-10-15": {"u2"}}
+
+
+def test_archive_purge_is_replayed_from_journal(open_store, tmp_path):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+    store.apply_retention("2026-10-16", "archive")()
+
+    # 模拟journal写入后、改写归档前崩溃
+    store._purge_archive_files = lambda user_ids: None
+    store.delete_users(["u2"])
+    store.flush()
+    store._segment_fp.close()
+    assert "u2" in _archived_users(tmp_path)["2026-10-15"]
+
+    open_store()
+    assert _archived_users(tmp_path)["2026-10-15"] == {"u1"}
+
+
+def test_purge_during_retention_is_not_archived(open_store, tmp_path):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+    job = store.apply_retention("2026-10-16", "archive")
+    # 删除在归档任务执行之前就写入了
+    store.delete_users(["u2"])
+    store.flush()
+    job()
+    assert _archived_users(tmp_path) == {"2026-10-14": {"u1"}, "2026-10-15": {"u1"}}
+
+
+def test_purge_removes_user_from_sqlite_archive(open_store):
+    store = open_store("sqlite")
+    _fill(store)
+    store.flush()
+    store.apply_retention("2026-10-16", "archive")
+    store.flush()
+
+    store.delete_users(["u1"])
+    ops = store.drain_ops()
+    assert ops[-1] == {"op": "purge_archive", "user_ids": ["u1"], "seq": ops[-1]["seq"]}
+    store.write_ops(ops)
+    store.ops_written(ops)
+    rows = store.write_conn.execute("SELECT date, user_id FROM daily_archive ORDER BY date").fetchall()
+    assert rows == [("2026-10-15", "u2")]
+
+
+def test_delete_own_data_also_clears_archive(open_store, tmp_path):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+    store.apply_retention("2026-10-16", "archive")()
+
+    store.delete_user_data("u1", keep_day=TODAY)
+    store.flush()
+    assert _archived_users(tmp_path) == {"2026-10-15": {"u2"}}
+    assert store.get_daily(TODAY, "u1") is not None
+
+
+def test_profile_cache_forgets_purged_users():
+    from daily_fortune.profile_cache import ProfileCache
+
+    cache = ProfileCache()
+    cache.put(("aiocqhttp", "g1", "u1"), "n1", "card")
+    cache.put(("aiocqhttp", "g2", "u1"), "n1")
+    cache.put(("aiocqhttp", "g1", "u2"), "n2")
+    assert cache.forget_users(["u1"]) == 2
+    assert cache.peek(("aiocqhttp", "g1", "u1")) is None
+    assert cache.peek(("aiocqhttp", "g1", "u2"))["nickname"] == "n2"
@@ -0,0 +1,112 @@
+import gzip
+import json
+
+import pytest
+
+from conftest import PLUGIN_DIR, TODAY, reading
+
+DAYS = ["2026-10-13", "2026-10-14", "2026-10-15", "2026-10-16", TODAY]
+CUTOFF = "2026-10-15"
+
+
+def _fill(store):
+    for i, day in enumerate(DAYS):
+        store.put_daily(day, "u1", reading(10 + i))
+        store.put_daily(day, "u2", reading(50 + i))
+
+
+def test_retention_is_opt_in():
+    schema = json.loads((PLUGIN_DIR / "_conf_schema.json").read_text(encoding="utf-8"))
+    assert schema["storage"]["items"]["daily_retention_days"]["default"] == 0
+
+
+@pytest.mark.parametrize("mode", ["archive", "delete"])
+def test_json_retention_removes_old_partitions(open_store, tmp_path, mode):
+    store = open_store()
+    _fill(store)
+    store.flush()
+    store.compact()
+    # 一个尚未压缩写回的过期修改，直接使用内存中的版本
+    store.put_daily("2026-10-13", "u3", reading(99))
+
+    job = store.apply_retention(CUTOFF, mode)
+    job()
+
+    for day in DAYS:
+        assert (tmp_path / "daily" / f"{day}.json").exists() == (day >= CUTOFF)
+        assert (store.get_daily(day, "u1") is None) == (day < CUTOFF)
+    assert store.daily_index["u1"] == {day for day in DAYS if day >= CUTOFF}
+    assert "u3" not in store.daily_index
+
+    if mode == "archive":
+        archived = sorted(path.name for path in (tmp_path / "daily" / "archive").glob("*.json.gz"))
+        assert archived == ["2026-10-13.json.gz", "2026-10-14.json.gz"]
+        with gzip.open(tmp_path / "daily" / "archive" / "2026-10-13.json.gz", "rt", encoding="utf-8") as f:
+            assert set(json.load(f)) == {"u1", "u2", "u3"}
+    else:
+        assert not (tmp_path / "daily" / "archive").exists()
+
+    # 清理后的索引在压缩时写回，重启后保持一致
+    store.flush()
+    store.compact()
+    store.close()
+    reopened = open_store()
+    assert reopened.daily_index["u2"] == {day for day in DAYS if day >= CUTOFF}
+
+
+def test_json_retention_without_expired_partitions_is_noop(open_store):
+    store = open_store()
+    store.put_daily(TODAY, "u1", reading(1))
+    assert store.apply_retention(CUTOFF, "archive") is None
+
+
+@pytest.mark.parametrize("mode", ["archive", "delete"])
+def test_sqlite_retention_runs_in_write_batch(open_store, mode):
+    store = open_store("sqlite")
+    _fill(store)
+    store.flush()
+
+    assert store.apply_retention(CUTOFF, mode) is None
+    assert store.pending_ops == 1
+    store.flush()
+
+    remaining = store.write_conn.execute("SELECT DISTINCT date FROM daily ORDER BY date").fetchall()
+    assert [day for (day,) in remaining] == [day for day in DAYS if day >= CUTOFF]
+    archived = store.write_conn.execute("SELECT COUNT(*) FROM daily_archive").fetchone()[0]
+    assert archived == (4 if mode == "archive" else 0)
+    assert store.get_daily("2026-10-14", "u2") is None
+    assert store.get_daily(TODAY, "u2")["jrrp"] == 54
+
+
+def test_rollover_releases_clean_partition(open_store):
+    store = open_store(today="2026-10-16")
+    store.put_daily("2026-10-16", "u1", reading(5))
+    store.flush()
+    store.compact()
+
+    store.rollover(TODAY)
+    assert list(store.daily_data) == [TODAY]
+    assert store.get_daily("2026-10-16", "u1")["jrrp"] == 5
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_reset_clears_archive(open_store, tmp_path, backend):
+    store = open_store(backend)
+    _fill(store)
+    store.flush()
+    if backend == "json":
+        store.compact()
+        store.apply_retention(CUTOFF, "archive")()
+        assert list((tmp_path / "daily" / "archive").glob("*.json.gz"))
+    else:
+        store.apply_retention(CUTOFF, "archive")
+        store.flush()
+
+    store.reset()
+    store.flush()
+    store.compact()
+    if backend == "json":
+        assert not list((tmp_path / "daily" / "archive").glob("*.json.gz"))
+        assert not list((tmp_path / "daily").glob("*.json"))
+    else:
+        assert store.write_conn.execute("SELECT COUNT(*) FROM daily_archive").fetchone() == (0,)
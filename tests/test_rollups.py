@@ -0,0 +1,123 @@
+import types
+
+import pytest
+
+from conftest import TODAY, reading
+from daily_fortune.main import DailyFortunePlugin
+from daily_fortune.rollups import GroupRollups
+
+# 2026-10-12 ~ 10-18 为同一周，10-11 属于前一周
+DAY1, DAY2 = "2026-10-15", "2026-10-16"
+
+
+def _sealed_two_days() -> GroupRollups:
+    rollups = GroupRollups()
+    rollups.seal(DAY1, [("u1", reading(40)), ("u2", reading(90)), ("u3", reading(10, group_id=""))])
+    rollups.seal(DAY2, [("u1", reading(60)), ("u2", reading(70, group_id="g2"))])
+    return rollups
+
+
+@pytest.mark.parametrize("period", ["week", "month", "all"])
+def test_sealed_days_are_averaged_per_group(period):
+    rollups = _sealed_two_days()
+    assert rollups.sealed_through == DAY2
+    assert rollups.ranking("g1", period, TODAY) == [("u2", 90.0, 1), ("u1", 50.0, 2)]
+    assert rollups.ranking("g2", period, TODAY) == [("u2", 70.0, 1)]
+    # 私聊记录不计入任何群
+    assert all(user_id != "u3" for user_id, _, _ in rollups.ranking("", period, TODAY))
+
+
+def test_min_days_filters_and_open_day_is_merged():
+    rollups = _sealed_two_days()
+    assert rollups.ranking("g1", "week", TODAY, min_days=2) == [("u1", 50.0, 2)]
+
+    rollups.add("g1", "u2", TODAY, 30)
+    assert rollups.ranking("g1", "week", TODAY, min_days=2) == [("u2", 60.0, 2), ("u1", 50.0, 2)]
+    rollups.remove("g1", "u2", TODAY)
+    assert rollups.ranking("g1", "week", TODAY, min_days=2) == [("u1", 50.0, 2)]
+
+
+def test_previous_week_is_pruned_but_kept_in_all():
+    rollups = GroupRollups()
+    rollups.seal("2026-10-11", [("u1", reading(100))])
+    rollups.seal(DAY1, [("u1", reading(20))])
+    assert rollups.ranking("g1", "week", TODAY) == [("u1", 20.0, 1)]
+    assert rollups.ranking("g1", "month", TODAY) == [("u1", 60.0, 2)]
+    assert rollups.ranking("g1", "all", TODAY) == [("u1", 60.0, 2)]
+    assert not any(key.startswith("week:2026-W41") for key in rollups.to_dict()["groups"]["g1"])
+
+
+def test_sealing_a_day_twice_is_ignored():
+    rollups = _sealed_two_days()
+    before = rollups.dumps()
+    rollups.seal(DAY2, [("u1", reading(100))])
+    rollups.seal(DAY1, [("u1", reading(100))])
+    assert rollups.dumps() == before
+    # 已封存日期的普通add也被忽略
+    rollups.add("g1", "u1", DAY2, 100)
+    assert rollups.ranking("g1", "all", TODAY) == [("u2", 90.0, 1), ("u1", 50.0, 2)]
+
+
+def test_add_sealed_counts_late_query_once():
+    rollups = _sealed_two_days()
+    # 前一天开始的查询在封存之后才完成
+    rollups.add_sealed("g1", "u3", DAY2, 80, "n3")
+    assert rollups.ranking("g1", "week", TODAY)[1] == ("u3", 80.0, 1)
+    assert rollups.nickname("g1", "u3") == "n3"
+
+    # 未封存的日期按普通查询计入
+    rollups.add_sealed("g1", "u3", TODAY, 20)
+    assert ("u3", 50.0, 2) in rollups.ranking("g1", "all", TODAY)
+    rollups.remove("g1", "u3", TODAY)
+    assert ("u3", 80.0, 1) in rollups.ranking("g1", "all", TODAY)
+
+
+def test_add_sealed_after_period_change_only_counts_all():
+    rollups = GroupRollups()
+    rollups.seal("2026-10-11", [])
+    rollups.seal("2026-10-12", [])
+    rollups.add_sealed("g1", "u1", "2026-10-11", 70)
+    assert rollups.ranking("g1", "week", "2026-10-13") == []
+    assert rollups.ranking("g1", "all", "2026-10-13") == [("u1", 70.0, 1)]
+
+
+def test_round_trip_keeps_sealed_totals(tmp_path):
+    rollups = _sealed_two_days()
+    GroupRollups.write(tmp_path / "rollups.json", rollups.dumps())
+    loaded = GroupRollups.load(tmp_path / "rollups.json")
+    assert loaded.sealed_through == DAY2
+    assert loaded.ranking("g1", "month", TODAY) == rollups.ranking("g1", "month", TODAY)
+    assert GroupRollups.load(tmp_path / "missing.json").sealed_through == ""
+
+
+def _plugin(store, rollups_file):
+    """只包含 _load_rollups 用到的属性"""
+    return types.SimpleNamespace(store=store, rollups_file=rollups_file, _current_day=TODAY)
+
+
+def test_startup_seals_days_missed_while_stopped(open_store, tmp_path):
+    store = open_store()
+    for day, jrrp in (("2026-10-14", 10), (DAY1, 20), (DAY2, 30), (TODAY, 99)):
+        store.put_daily(day, "u1", reading(jrrp))
+    rollups = GroupRollups()
+    rollups.seal("2026-10-14", store.iter_daily("2026-10-14"))
+    GroupRollups.write(tmp_path / "rollups.json", rollups.dumps())
+
+    plugin = _plugin(store, tmp_path / "rollups.json")
+    assert DailyFortunePlugin._load_rollups(plugin) is True
+    # 10-15、10-16补充封存，今天仍未封存，10-14不会重复计入
+    assert plugin.rollups.sealed_through == DAY2
+    assert plugin.rollups.ranking("g1", "all", TODAY) == [("u1", 20.0, 3)]
+
+    GroupRollups.write(tmp_path / "rollups.json", plugin.rollups.dumps())
+    assert DailyFortunePlugin._load_rollups(plugin) is False
+
+
+def test_startup_rebuilds_corrupt_rollups(open_store, tmp_path):
+    store = open_store()
+    store.put_daily(DAY2, "u1", reading(30))
+    (tmp_path / "rollups.json").write_text("{", encoding="utf-8")
+
+    plugin = _plugin(store, tmp_path / "rollups.json")
+    assert DailyFortunePlugin._load_rollups(plugin) is True
+    assert plugin.rollups.ranking("g1", "all", TODAY) == [("u1", 30.0, 1)]
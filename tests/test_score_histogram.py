@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from daily_fortune.score_histogram import MAX_BINS, ScoreHistograms
+
+
+def _brute(scores, jrrp, counted):
+    others = len(scores) - (1 if counted else 0)
+    if others <= 0:
+        return 100.0
+    return sum(score < jrrp for score in scores) * 100 / others
+
+
+@pytest.mark.parametrize("low, high, values", [
+    (0, 100, range(0, 101)),
+    # 负数分段
+    (-10, 10, range(-10, 11)),
+    # 大于100的刻度
+    (1, 1000, range(1, 1001)),
+    # 分值落在分段范围以外
+    (0, 100, [-50, -1, 0, 50, 100, 101, 250]),
+    # 跨度过大时退回0-100格，其余按有序列表计数
+    (0, MAX_BINS * 10, [0, 50, 100, 5000, MAX_BINS * 5, MAX_BINS * 10]),
+])
+def test_percentile_matches_brute_force(low, high, values):
+    rng = random.Random(7)
+    histograms = ScoreHistograms("2026-10-17", low, high)
+    scores = [rng.choice(list(values)) for _ in range(300)]
+    for score in scores:
+        histograms.add("g1", score)
+
+    for jrrp in sorted(set(scores))[::7] + [min(values) - 1, max(values) + 1]:
+        assert histograms.percentile(jrrp, counted=False) == pytest.approx(_brute(scores, jrrp, counted=False))
+        if jrrp in scores:
+            assert histograms.percentile(jrrp, "g1") == pytest.approx(_brute(scores, jrrp, counted=True))
+
+
+def test_remove_outside_range():
+    histograms = ScoreHistograms("2026-10-17", 0, 100)
+    for score in (150, 150, 20, -5):
+        histograms.add("g1", score)
+    histograms.remove("g1", 150)
+    histograms.remove("g1", 999)
+    assert histograms.overall.total == 3
+    assert histograms.percentile(150, "g1") == pytest.approx(100.0)
+    assert histograms.percentile(20, "g1") == pytest.approx(50.0)
+    assert histograms.percentile(20, "g2") == 100.0
+    assert histograms.percentile(20, "") is None
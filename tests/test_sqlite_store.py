@@ -0,0 +1,102 @@
+import json
+
+from conftest import TODAY, reading
+
+
+def _db_daily(store, day, user_id):
+    return store.write_conn.execute(
+        "SELECT jrrp FROM daily WHERE date = ? AND user_id = ?", (day, user_id)
+    ).fetchone()
+
+
+def test_reads_and_writes_use_separate_connections(open_store):
+    store = open_store("sqlite")
+    assert store.read_conn is not None and store.write_conn is not None
+    assert store.read_conn is not store.write_conn
+    assert store.read_conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_overlay_makes_pending_writes_visible(open_store):
+    store = open_store("sqlite")
+    store.put_daily(TODAY, "u1", reading(70))
+    store.put_daily(TODAY, "u2", reading(90))
+    store.put_history("u1", TODAY, {"jrrp": 70, "fortune": "吉"})
+
+    # 还没写入数据库，查询通过覆盖层得到结果
+    assert _db_daily(store, TODAY, "u1") is None
+    assert store.get_daily(TODAY, "u1")["jrrp"] == 70
+    assert [uid for uid, _ in store.top_daily(TODAY, 10)] == ["u2", "u1"]
+    assert store.get_history("u1") == [(TODAY, {"jrrp": 70, "fortune": "吉"})]
+
+    store.flush()
+    assert _db_daily(store, TODAY, "u1") == (70,)
+    assert not store._daily_overlay and not store._history_overlay
+    assert store.get_daily(TODAY, "u1")["jrrp"] == 70
+
+
+def test_overlay_hides_deleted_rows_until_written(open_store):
+    store = open_store("sqlite")
+    store.put_daily(TODAY, "u1", reading(40))
+    store.flush()
+
+    assert store.delete_daily(TODAY, "u1")
+    assert _db_daily(store, TODAY, "u1") == (40,)
+    assert store.get_daily(TODAY, "u1") is None
+    assert store.iter_daily(TODAY) == []
+    assert store.top_daily(TODAY, 10) == []
+    store.flush()
+    assert _db_daily(store, TODAY, "u1") is None
+
+
+def test_newer_write_survives_older_batch_completion(open_store):
+    store = open_store("sqlite")
+    store.put_daily(TODAY, "u1", reading(10))
+    in_flight = store.drain_ops()
+    # 上一批还在写入线程中时，同一条记录又被修改
+    store.put_daily(TODAY, "u1", reading(99))
+    store.write_ops(in_flight)
+    store.ops_written(in_flight)
+
+    assert store.get_daily(TODAY, "u1")["jrrp"] == 99
+    store.flush()
+    assert _db_daily(store, TODAY, "u1") == (99,)
+
+
+def test_reset_hides_database_rows_until_written(open_store):
+    store = open_store("sqlite")
+    store.put_daily(TODAY, "u1", reading(55))
+    store.put_history("u1", TODAY, {"jrrp": 55, "fortune": "吉"})
+    store.flush()
+
+    store.reset()
+    store.put_daily(TODAY, "u2", reading(66))
+    assert store.get_daily(TODAY, "u1") is None
+    assert store.get_history("u1") == []
+    assert [uid for uid, _ in store.iter_daily(TODAY)] == ["u2"]
+    store.flush()
+    assert store._reset_seq is None
+    assert _db_daily(store, TODAY, "u1") is None
+    assert store.get_daily(TODAY, "u2")["jrrp"] == 66
+
+
+def test_migrates_existing_json_data(open_store, tmp_path):
+    json_store = open_store("json")
+    json_store.put_daily(TODAY, "u1", reading(88))
+    json_store.put_history("u1", TODAY, {"jrrp": 88, "fortune": "大吉"})
+    json_store.compact()
+    # 快照之后的写入只在journal中
+    json_store.put_daily(TODAY, "u2", reading(22))
+    json_store.close()
+
+    store = open_store("sqlite")
+    assert store.get_daily(TODAY, "u1")["jrrp"] == 88
+    assert store.get_daily(TODAY, "u2")["jrrp"] == 22
+    assert store.get_history("u1") == [(TODAY, {"jrrp": 88, "fortune": "大吉"})]
+    assert (tmp_path / "daily.migrated").exists()
+    assert not list((tmp_path / "journal").glob("*.jsonl"))
+    store.close()
+
+    # 只迁移一次
+    (tmp_path / "daily_fortune.json").write_text(json.dumps({TODAY: {"u9": reading(1)}}), encoding="utf-8")
+    reopened = open_store("sqlite")
+    assert reopened.get_daily(TODAY, "u9") is None
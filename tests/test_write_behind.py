@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import pytest
+
+from conftest import TODAY, reading
+from daily_fortune.storage import WriteBehindWorker
+
+
+def test_commit_waits_when_buffer_is_full(open_store):
+    store = open_store()
+    gate = threading.Event()
+    write_ops = store.write_ops
+
+    def slow_write(ops):
+        gate.wait(5)
+        return write_ops(ops)
+
+    store.write_ops = slow_write
+
+    async def scenario():
+        worker = WriteBehindWorker(store, flush_interval=60, max_pending=3)
+        worker.start()
+        for i in range(2):
+            store.put_daily(TODAY, f"u{i}", reading(i))
+            await worker.commit()
+        assert worker.flush_count == 0
+
+        store.put_daily(TODAY, "u2", reading(2))
+        commit = asyncio.create_task(worker.commit())
+        await asyncio.sleep(0.05)
+        # 缓冲区已被取走，但写入线程还没完成之前commit会一直等待
+        assert not commit.done()
+        gate.set()
+        await asyncio.wait_for(commit, 5)
+        assert store.pending_ops < worker.max_pending
+        await worker.close()
+        return worker
+
+    worker = asyncio.run(scenario())
+    assert worker.flush_count == 1
+    assert worker.max_batch_size == 3
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_close_flushes_remaining_ops(open_store, backend):
+    store = open_store(backend)
+
+    async def scenario():
+        worker = WriteBehindWorker(store, flush_interval=60, max_pending=1000)
+        worker.start()
+        for i in range(5):
+            store.put_daily(TODAY, f"u{i}", reading(i * 10))
+            store.put_history(f"u{i}", TODAY, {"jrrp": i * 10, "fortune": "吉"})
+            await worker.commit()
+        assert worker.flush_count == 0
+        await worker.close()
+        return worker
+
+    worker = asyncio.run(scenario())
+    assert store.pending_ops == 0
+    assert worker.ops_written == 10
+    if backend == "json":
+        # 不压缩直接退出，数据只在journal中
+        store._segment_fp.close()
+    store.close()
+
+    reopened = open_store(backend)
+    assert len(reopened.iter_daily(TODAY)) == 5
+    assert reopened.get_history("u4")[0][1]["jrrp"] == 40
+
+
+def test_failed_flush_requeues_ops_in_order(open_store):
+    store = open_store("sqlite")
+    write_ops = store.write_ops
+    failures = [RuntimeError("disk full")]
+
+    def flaky_write(ops):
+        if failures:
+            raise failures.pop()
+        return write_ops(ops)
+
+    store.write_ops = flaky_write
+
+    async def scenario():
+        worker = WriteBehindWorker(store, flush_interval=60)
+        store.put_daily(TODAY, "u1", reading(10))
+        await worker.flush()
+        assert worker.failed_flushes == 1
+        assert store.pending_ops == 1
+        # 重试前的新写入排在失败的操作之后
+        store.put_daily(TODAY, "u1", reading(20))
+        await worker.flush()
+        return worker
+
+    worker = asyncio.run(scenario())
+    assert worker.flush_count == 1 and store.pending_ops == 0
+    row = store.write_conn.execute("SELECT jrrp FROM daily WHERE user_id = 'u1'").fetchone()
+    assert row == (20,)
@@ -0,0 +1,74 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class TextPool:
+    """按 (运势分段, 人格) 缓存预生成的过程模拟和建议文本
+
+    查询时直接取出一条使用，后台任务在空闲时把各分段补满。每条文本只使用一次，
+    超过 max_age 秒的条目视为过期，取用和补充前都会清理。
+    """
+
+    def __init__(self, size: int = 5, max_age: float = 86400):
+        self.size = max(1, size)
+        self.max_age = max_age
+        self._pools: Dict[Hashable, Deque[Tuple[float, str, str]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.evicted = 0
+
+    def take(self, key: Hashable) -> Optional[Tuple[str, str]]:
+        """取出一条 (process, advice)，池为空时返回None"""
+        self._evict(key, time.time())
+        pool = self._pools.get(key)
+        if not pool:
+            self.misses += 1
+            return None
+        self.hits += 1
+        _, process, advice = pool.popleft()
+        return process, advice
+
+    def put(self, key: Hashable, process: str, advice: str):
+        pool = self._pools.setdefault(key, deque())
+        if len(pool) < self.size:
+            pool.append((time.time(), process, advice))
+            self.generated += 1
+
+    def evict_stale(self) -> int:
+        """清理所有分段中的过期条目，返回清理数量"""
+        now = time.time()
+        return sum(self._evict(key, now) for key in list(self._pools))
+
+    def _evict(self, key: Hashable, now: float) -> int:
+        pool = self._pools.get(key)
+        if not pool or self.max_age <= 0:
+            return 0
+        removed = 0
+        while pool and now - pool[0][0] > self.max_age:
+            pool.popleft()
+            removed += 1
+        self.evicted += removed
+        return removed
+
+    def neediest(self, keys: Iterable[Hashable]) -> Optional[Hashable]:
+        """返回条目最少且未满的分段，全部已满时返回None"""
+        best, best_count = None, self.size
+        for key in keys:
+            count = len(self._pools.get(key, ()))
+            if count < best_count:
+                best, best_count = key, count
+        return best
+
+    def clear(self):
+        self._pools.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": sum(len(pool) for pool in self._pools.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "evicted": self.evicted
+        }
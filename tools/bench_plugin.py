@@ -0,0 +1,451 @@
+"""DailyFortunePlugin 压力测试
+
+用桩 Context、可配置延迟和错误率的假LLM提供商以及合成的消息事件构造插件，
+让 N 个群 × M 个用户按目标速率发送 jrrp / jrrp @某人 / jrrprank / jrrphistory，
+模拟多天后输出各指令的 p50/p95/p99 延迟、吞吐量、事件循环阻塞时间和数据目录大小的增长，
+用于在发布前发现热点路径的性能退化。
+
+请求按固定速率开环发送，延迟从计划发送时间算起，事件循环被阻塞造成的排队也会计入延迟。
+插件数据写在临时目录中，不会影响真实数据。未安装AstrBot时使用内置的最小接口替身：
+
+    python tools/bench_plugin.py --groups 10 --users 50 --days 3 --rate 300
+    python tools/bench_plugin.py --backend sqlite --latency 800 --error-rate 0.1 --json
+"""
+import argparse
+import asyncio
+import importlib
+import importlib.machinery
+import importlib.util
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from simulate_jrrp import load_config  # noqa: E402
+
+COMMANDS = ("jrrp", "at", "rank", "history")
+
+
+# ---------- AstrBot 替身 ----------
+
+def install_astrbot_shim():
+    """未安装AstrBot时注册插件用到的最小接口"""
+    try:
+        importlib.import_module("astrbot.api")
+        return False
+    except ImportError:
+        pass
+
+    class _Filter:
+        class PermissionType:
+            ADMIN = "admin"
+            MEMBER = "member"
+
+        class EventMessageType:
+            ALL = "all"
+
+        def command(self, name, alias=None, **kwargs):
+            return lambda func: func
+
+        def permission_type(self, permission, **kwargs):
+            return lambda func: func
+
+        def event_message_type(self, message_type, **kwargs):
+            return lambda func: func
+
+    class Star:
+        def __init__(self, context):
+            self.context = context
+
+    class At:
+        def __init__(self, qq):
+            self.qq = qq
+
+    class Plain:
+        def __init__(self, text):
+            self.text = text
+
+    modules = {
+        "astrbot": {},
+        "astrbot.api": {"logger": logging.getLogger("astrbot"), "AstrBotConfig": dict},
+        "astrbot.api.event": {"filter": _Filter(), "AstrMessageEvent": object, "MessageEventResult": object},
+        "astrbot.api.star": {"Context": object, "Star": Star, "register": lambda *a, **k: (lambda cls: cls)},
+        "astrbot.api.message_components": {"At": At, "Plain": Plain},
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        module.__path__ = []
+        sys.modules[name] = module
+    sys.modules["astrbot"].api = sys.modules["astrbot.api"]
+    sys.modules["astrbot.api"].event = sys.modules["astrbot.api.event"]
+    sys.modules["astrbot.api"].star = sys.modules["astrbot.api.star"]
+    sys.modules["astrbot.api"].message_components = sys.modules["astrbot.api.message_components"]
+    return True
+
+
+def load_plugin_module():
+    """把插件目录作为包导入（插件内部使用相对导入）"""
+    spec = importlib.machinery.ModuleSpec("daily_fortune_bench", None, is_package=True)
+    spec.submodule_search_locations = [str(PLUGIN_DIR)]
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["daily_fortune_bench"] = package
+    return importlib.import_module("daily_fortune_bench.main")
+
+
+class SimDate:
+    """模拟的日期，替换插件的 _now()，时间部分仍使用真实时间"""
+    current = date.today()
+
+    @classmethod
+    def now(cls, plugin=None) -> datetime:
+        return datetime.combine(cls.current, datetime.now().time())
+
+
+# ---------- 桩 Context 与假提供商 ----------
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.completion_text = text
+
+
+class FakeProvider:
+    """按配置的延迟和错误率返回固定文本"""
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, rng: random.Random):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = rng
+        self.calls = 0
+        self.errors = 0
+
+    async def text_chat(self, prompt: str = "", contexts=None, system_prompt: str = "", **kwargs):
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError("模拟的LLM错误")
+        if "JSON" in prompt or "json" in prompt:
+            return FakeResponse('{"process": "水晶球泛起微光……", "advice": "保持平常心。"}')
+        return FakeResponse("水晶球中浮现出模糊的影像……")
+
+
+class StubProviderManager:
+    personas: List[Dict[str, Any]] = []
+    selected_default_persona = None
+
+
+class StubContext:
+    def __init__(self, provider: FakeProvider):
+        self.provider = provider
+        self.provider_manager = StubProviderManager()
+
+    def get_using_provider(self):
+        return self.provider
+
+    def get_all_providers(self):
+        return [self.provider]
+
+    def get_provider_by_id(self, provider_id):
+        return self.provider
+
+    def get_all_stars(self):
+        return []
+
+
+# ---------- 合成事件 ----------
+
+class FakeMessage:
+    def __init__(self, components, user_id: str, group_id: str):
+        self.message = components
+        self.message_id = f"{user_id}-{time.monotonic_ns()}"
+        self.group_id = group_id
+        self.raw_message = {"sender": {"nickname": f"用户{user_id}", "card": f"名片{user_id}", "title": ""}}
+
+
+class FakeEvent:
+    """插件用到的 AstrMessageEvent 接口"""
+
+    def __init__(self, comp_module, user_id: str, group_id: str, text: str, at: Optional[str] = None):
+        self.user_id = user_id
+        self.group_id = group_id
+        self.message_str = text
+        self.message_obj = FakeMessage([comp_module.At(at)] if at else [], user_id, group_id)
+
+    def get_sender_id(self):
+        return self.user_id
+
+    def get_sender_name(self):
+        return f"用户{self.user_id}"
+
+    def get_group_id(self):
+        return self.group_id
+
+    def get_platform_name(self):
+        return "aiocqhttp"
+
+    def is_private_chat(self):
+        return not self.group_id
+
+    def is_admin(self):
+        return False
+
+    def should_call_llm(self, call: bool):
+        pass
+
+    def stop_event(self):
+        pass
+
+    def plain_result(self, text: str):
+        return text
+
+
+# ---------- 测量 ----------
+
+class LoopMonitor:
+    """定期休眠并记录实际唤醒比预期晚了多少，即事件循环被阻塞的时间"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self, threshold: float) -> Dict[str, float]:
+        lags = np.array(self.lags or [0.0]) * 1000
+        return {
+            "samples": len(self.lags),
+            "p99_ms": round(float(np.percentile(lags, 99)), 2),
+            "max_ms": round(float(lags.max()), 2),
+            "blocked_ms": round(float(lags[lags > threshold * 1000].sum()), 1)
+        }
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {"count": len(samples), "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2), "max_ms": round(float(values.max()), 2)}
+
+
+# ---------- 驱动 ----------
+
+def build_day_requests(groups: int, users: int, extra: float, mix: Dict[str, float],
+                       rng: random.Random) -> List[tuple]:
+    """生成一天的请求：每个用户先各查询一次，再按比例混入其他指令，整体打乱顺序"""
+    members = {f"g{g}": [str(10000 + g * users + u) for u in range(users)] for g in range(groups)}
+    requests = [("jrrp", gid, uid, None) for gid, uids in members.items() for uid in uids]
+    kinds, weights = zip(*mix.items())
+    for _ in range(int(len(requests) * extra)):
+        gid = rng.choice(list(members))
+        uid, other = rng.sample(members[gid], 2) if users > 1 else (members[gid][0], members[gid][0])
+        kind = rng.choices(kinds, weights)[0]
+        requests.append((kind, gid, uid, other if kind == "at" else None))
+    rng.shuffle(requests)
+    return requests
+
+
+async def run_request(plugin, comp_module, kind: str, gid: str, uid: str, other: Optional[str]):
+    if kind == "jrrp":
+        event = FakeEvent(comp_module, uid, gid, "jrrp")
+        handler = plugin.jrrp(event, "")
+    elif kind == "at":
+        event = FakeEvent(comp_module, uid, gid, f"jrrp @{other}", at=other)
+        handler = plugin.jrrp(event, "")
+    elif kind == "rank":
+        event = FakeEvent(comp_module, uid, gid, "jrrprank")
+        handler = plugin.jrrprank(event)
+    else:
+        event = FakeEvent(comp_module, uid, gid, "jrrphistory")
+        handler = plugin.jrrphistory(event)
+    # 与AstrBot一样，每条消息先经过记录发送者信息的监听器
+    await plugin.record_sender_profile(event)
+    async for _ in handler:
+        pass
+
+
+async def bench(args, config: Dict[str, Any]) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    main_module = load_plugin_module()
+    main_module.DailyFortunePlugin._now = SimDate.now
+    comp_module = sys.modules["astrbot.api.message_components"]
+    SimDate.current = date.fromisoformat(args.start)
+
+    provider = FakeProvider(args.latency / 1000, args.jitter / 1000, args.error_rate, rng)
+    plugin = main_module.DailyFortunePlugin(StubContext(provider), config)
+    data_dir = Path(plugin.data_dir)
+
+    mix = {}
+    for item in args.mix.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() in COMMANDS[1:] and float(weight or 0) > 0:
+            mix[kind.strip()] = float(weight)
+    if not mix:
+        mix = {"at": 1.0}
+
+    monitor = LoopMonitor()
+    monitor.start()
+    latencies: Dict[str, List[float]] = {kind: [] for kind in COMMANDS}
+    failures: Dict[str, int] = {kind: 0 for kind in COMMANDS}
+    days = []
+    loop = asyncio.get_running_loop()
+    total_requests = 0
+    bench_start = loop.time()
+
+    async def timed(kind, gid, uid, other, scheduled):
+        try:
+            await run_request(plugin, comp_module, kind, gid, uid, other)
+        except Exception:
+            failures[kind] += 1
+        latencies[kind].append(loop.time() - scheduled)
+
+    for day_index in range(args.days):
+        requests = build_day_requests(args.groups, args.users, args.extra, mix, rng)
+        day_start = loop.time()
+        tasks = []
+        for i, (kind, gid, uid, other) in enumerate(requests):
+            scheduled = day_start + i / args.rate
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(timed(kind, gid, uid, other, scheduled)))
+        await asyncio.gather(*tasks)
+        await plugin.writer.flush()
+        elapsed = loop.time() - day_start
+        total_requests += len(requests)
+        days.append({
+            "date": SimDate.current.isoformat(),
+            "requests": len(requests),
+            "seconds": round(elapsed, 2),
+            "throughput": round(len(requests) / elapsed, 1),
+            "data_bytes": dir_size(data_dir)
+        })
+        SimDate.current += timedelta(days=1)
+
+    total_seconds = loop.time() - bench_start
+    await monitor.stop()
+    scheduler_stats = plugin.llm_scheduler.stats()
+    writer_stats = plugin.writer.stats()
+    await plugin.terminate()
+
+    return {
+        "config": {"groups": args.groups, "users": args.users, "days": args.days, "rate": args.rate,
+                   "latency_ms": args.latency, "error_rate": args.error_rate,
+                   "backend": config.get("storage", {}).get("backend", "json")},
+        "commands": {kind: {**latency_summary(samples), "failures": failures[kind]}
+                     for kind, samples in latencies.items() if samples},
+        "throughput": round(total_requests / total_seconds, 1),
+        "loop": monitor.summary(args.block_threshold / 1000),
+        "days": days,
+        "llm": {"calls": provider.calls, "errors": provider.errors, "scheduler": scheduler_stats},
+        "writer": writer_stats,
+        "data_dir": str(data_dir.resolve())
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    cfg = result["config"]
+    print(f"{cfg['groups']} 群 × {cfg['users']} 用户 × {cfg['days']} 天，目标速率 {cfg['rate']}/s，"
+          f"LLM延迟 {cfg['latency_ms']}ms，错误率 {cfg['error_rate']:.0%}，后端 {cfg['backend']}\n")
+    print(f"{'指令':<8}{'次数':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'失败':>6}")
+    for kind, s in result["commands"].items():
+        print(f"{kind:<8}{s['count']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}{s['failures']:>6}")
+    loop = result["loop"]
+    print(f"\n总吞吐: {result['throughput']} 请求/s")
+    print(f"事件循环延迟: p99 {loop['p99_ms']}ms，最大 {loop['max_ms']}ms，累计阻塞 {loop['blocked_ms']}ms")
+    print(f"LLM调用: {result['llm']['calls']} 次，失败 {result['llm']['errors']} 次")
+    print(f"批量写入: {result['writer']['flushes']} 批，平均 {result['writer']['avg_flush_ms']}ms")
+    print("\n每日数据目录大小:")
+    previous = 0
+    for day in result["days"]:
+        print(f"  {day['date']}  {day['requests']:>6} 请求  {day['throughput']:>8}/s  "
+              f"{day['data_bytes'] / 1024:>10.1f} KiB (+{(day['data_bytes'] - previous) / 1024:.1f})")
+        previous = day["data_bytes"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="每日人品插件压力测试")
+    parser.add_argument("--config", default="", help="插件配置文件路径，默认使用 _conf_schema.json 默认值")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="", help="覆盖配置中的存储后端")
+    parser.add_argument("--groups", type=int, default=5, help="群数量")
+    parser.add_argument("--users", type=int, default=50, help="每个群的用户数")
+    parser.add_argument("--days", type=int, default=3, help="模拟的天数")
+    parser.add_argument("--start", default=date.today().isoformat(), help="第一天的日期 YYYY-MM-DD")
+    parser.add_argument("--rate", type=float, default=200, help="目标发送速率（请求/秒）")
+    parser.add_argument("--extra", type=float, default=2.0, help="每个用户每天除首次查询外的平均请求数")
+    parser.add_argument("--mix", default="at=1,rank=1,history=1", help="其他请求的比例，可选 at/rank/history")
+    parser.add_argument("--latency", type=float, default=200, help="假LLM的平均延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=50, help="假LLM延迟的标准差（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="假LLM的错误率 0-1")
+    parser.add_argument("--block-threshold", type=float, default=5, help="事件循环延迟超过此值（毫秒）计为阻塞")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--keep-data", action="store_true", help="保留临时数据目录")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    parser.add_argument("--verbose", action="store_true", help="输出插件的警告日志（默认只输出错误）")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.backend:
+        config["storage"] = {**config.get("storage", {}), "backend": args.backend}
+
+    shimmed = install_astrbot_shim()
+    level = logging.WARNING if args.verbose else logging.ERROR
+    logging.getLogger("astrbot").setLevel(level)
+    if shimmed and not logging.getLogger().handlers:
+        logging.basicConfig(level=level)
+
+    # 插件使用相对路径 data/plugin_data/...，切换到临时目录运行
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="daily_fortune_bench_")
+    os.chdir(work_dir)
+    try:
+        result = asyncio.run(bench(args, config))
+    finally:
+        os.chdir(cwd)
+        if not args.keep_data:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+        if args.keep_data:
+            print(f"\n数据目录: {result['data_dir']}")
+
+
+if __name__ == "__main__":
+    main()
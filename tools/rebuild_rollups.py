@@ -0,0 +1,107 @@
+"""从每日记录离线重建周/月/总排行榜汇总 (rollups.json)
+
+历史记录不包含群号，因此从保存了群号的每日记录重建：json后端读取 daily/ 下的分区、
+daily/archive/ 下的归档以及尚未压缩的journal；sqlite后端读取 daily 和 daily_archive 表。
+daily_retention_mode 为 delete 时已删除的日期无法恢复。
+
+重建会覆盖插件运行时维护的汇总文件，请先停止AstrBot（或卸载插件）再运行：
+
+    python tools/rebuild_rollups.py --data-dir data/plugin_data/astrbot_plugin_daily_fortune1
+"""
+import argparse
+import gzip
+import json
+import sqlite3
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PLUGIN_DIR))
+
+from rollups import GroupRollups  # noqa: E402
+
+# 日期 -> {user_id: 每日记录}
+Days = Dict[str, Dict[str, Dict[str, Any]]]
+
+
+def load_json_days(data_dir: Path) -> Days:
+    days: Days = {}
+    legacy = data_dir / "daily_fortune.json"
+    if legacy.exists():
+        days.update(json.loads(legacy.read_text(encoding="utf-8")))
+    daily_dir = data_dir / "daily"
+    for path in sorted((daily_dir / "archive").glob("*.json.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            days.setdefault(path.name[:-len(".json.gz")], {}).update(json.load(f))
+    for path in sorted(daily_dir.glob("*.json")):
+        days.setdefault(path.stem, {}).update(json.loads(path.read_text(encoding="utf-8")))
+
+    # 重放尚未合并进分区的journal段
+    journal_dir = data_dir / "journal"
+    state_file = journal_dir / "state.json"
+    compacted_through = json.loads(state_file.read_text(encoding="utf-8")).get("compacted_through", 0) \
+        if state_file.exists() else 0
+    for path in sorted(journal_dir.glob("*.jsonl")):
+        if not path.stem.isdigit() or int(path.stem) <= compacted_through:
+            continue
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if op.get("op") == "put_daily":
+                days.setdefault(op["date"], {})[op["user_id"]] = op["data"]
+            elif op.get("op") == "del_daily":
+                days.get(op["date"], {}).pop(op["user_id"], None)
+            elif op.get("op") == "reset":
+                days.clear()
+    return days
+
+
+def load_sqlite_days(db_file: Path) -> Days:
+    days: Days = {}
+    conn = sqlite3.connect(db_file)
+    try:
+        for table in ("daily_archive", "daily"):
+            for day, user_id, data in conn.execute(f"SELECT date, user_id, data FROM {table}"):
+                days.setdefault(day, {})[user_id] = json.loads(data)
+    finally:
+        conn.close()
+    return days
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线重建周/月/总排行榜汇总")
+    parser.add_argument("--data-dir", default="data/plugin_data/astrbot_plugin_daily_fortune1", help="插件数据目录")
+    parser.add_argument("--backend", choices=("auto", "json", "sqlite"), default="auto",
+                        help="存储后端，auto 根据是否存在 daily_fortune.db 判断")
+    parser.add_argument("--today", default=date.today().isoformat(),
+                        help="今日日期 YYYY-MM-DD，只封存此日期之前的记录（今日部分由插件启动时重建）")
+    parser.add_argument("--output", default="", help="输出文件，默认为数据目录下的 rollups.json")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    db_file = data_dir / "daily_fortune.db"
+    backend = args.backend
+    if backend == "auto":
+        backend = "sqlite" if db_file.exists() else "json"
+    days = load_sqlite_days(db_file) if backend == "sqlite" else load_json_days(data_dir)
+
+    rollups = GroupRollups()
+    sealed = 0
+    for day in sorted(days):
+        if day < args.today:
+            rollups.seal(day, days[day].items())
+            sealed += 1
+    rollups.sealed_through = (date.fromisoformat(args.today) - timedelta(days=1)).isoformat()
+
+    output = Path(args.output) if args.output else data_dir / "rollups.json"
+    GroupRollups.write(output, rollups.dumps())
+    groups = rollups.to_dict()["groups"]
+    print(f"[{backend}] 已从 {sealed} 天的每日记录重建 {len(groups)} 个群的汇总 -> {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""人品值算法的离线蒙特卡洛模拟
+
+用插件的 JrrpEngine 为大量 (用户, 日期) 批量抽取人品值，输出每种算法的分布直方图、
+落入各运势分段的比例以及计算吞吐量，用于根据数据调整 ranges_jrrp，也可以发现计算路径的性能退化。
+
+不依赖AstrBot，直接在插件目录外运行：
+
+    python tools/simulate_jrrp.py --users 100000 --days 30
+    python tools/simulate_jrrp.py --config data/config/astrbot_plugin_daily_fortune1_config.json --json
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PLUGIN_DIR))
+
+from fortune_levels import FortuneTable, parse_ranges  # noqa: E402
+from jrrp_engine import ALGORITHMS, JrrpEngine  # noqa: E402
+
+
+def load_config(path: str = "") -> Dict[str, Any]:
+    """读取插件配置；未指定时使用 _conf_schema.json 中的默认值"""
+    schema = json.loads((PLUGIN_DIR / "_conf_schema.json").read_text(encoding="utf-8"))
+    config = {key: item.get("default") for key, item in schema.items() if "default" in item}
+    if path:
+        config.update(json.loads(Path(path).read_text(encoding="utf-8-sig")))
+    return config
+
+
+def build_table(config: Dict[str, Any]) -> FortuneTable:
+    """按插件相同的规则把 ranges_jrrp / ranges_fortune / ranges_emoji 编译为查找表"""
+    names = [item.strip() for item in config.get("ranges_fortune", "").split(",") if item.strip()]
+    emojis = [item.strip() for item in config.get("ranges_emoji", "").split(",") if item.strip()]
+    return FortuneTable([
+        (low, high, names[i] if i < len(names) else "未知", emojis[i] if i < len(emojis) else "❓")
+        for i, (low, high) in enumerate(parse_ranges(config.get("ranges_jrrp", "")))
+    ])
+
+
+def band_shares(counts: np.ndarray, table: FortuneTable) -> List[Tuple[str, str, float]]:
+    """统计每个分段的占比，重叠部分按靠前的分段计算（与 _get_fortune_info 一致）"""
+    total = counts.sum()
+    band_counts = np.bincount(table.classify_many(np.arange(101)) + 1, weights=counts, minlength=len(table.levels) + 1)
+    shares = [(f"{low}-{high}", name, float(band_counts[i + 1] / total))
+              for i, (low, high, name, _) in enumerate(table.levels)]
+    if band_counts[0]:
+        shares.append(("-", "未知", float(band_counts[0] / total)))
+    return shares
+
+
+def simulate(algorithm: str, users: int, days: int, start: date, seed: int) -> Dict[str, Any]:
+    engine = JrrpEngine(algorithm, entropy=seed)
+    user_ids = [str(10000000 + i) for i in range(users)]
+    counts = np.zeros(101, dtype=np.int64)
+    t0 = time.perf_counter()
+    keys = engine.user_keys(user_ids)
+    elapsed = time.perf_counter() - t0
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        t0 = time.perf_counter()
+        values = engine.compute(user_ids, day, keys)
+        elapsed += time.perf_counter() - t0
+        counts += np.bincount(values, minlength=101)
+    draws = users * days
+    mean = float((counts * np.arange(101)).sum() / draws)
+    std = float(np.sqrt((counts * (np.arange(101) - mean) ** 2).sum() / draws))
+    return {
+        "algorithm": algorithm,
+        "draws": draws,
+        "seconds": elapsed,
+        "throughput": draws / elapsed if elapsed else float("inf"),
+        "mean": mean,
+        "std": std,
+        "counts": counts
+    }
+
+
+def render_histogram(counts: np.ndarray, bucket: int = 5, width: int = 40) -> List[str]:
+    buckets = [(low, min(100, low + bucket - 1)) for low in range(0, 101, bucket)]
+    sums = [int(counts[low:high + 1].sum()) for low, high in buckets]
+    peak = max(sums) or 1
+    total = counts.sum()
+    return [f"  {low:>3}-{high:<3} {'#' * round(s / peak * width):<{width}} {s / total:6.2%}"
+            for (low, high), s in zip(buckets, sums)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人品值算法蒙特卡洛模拟")
+    parser.add_argument("--config", default="", help="插件配置文件路径，默认使用 _conf_schema.json 默认值")
+    parser.add_argument("--algorithms", default=",".join(ALGORITHMS), help="逗号分隔的算法列表")
+    parser.add_argument("--users", type=int, default=100000, help="每天模拟的用户数")
+    parser.add_argument("--days", type=int, default=10, help="模拟的天数")
+    parser.add_argument("--start", default=date.today().isoformat(), help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子，相同种子结果可复现")
+    parser.add_argument("--bucket", type=int, default=5, help="直方图每格包含的人品值个数")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    table = build_table(config)
+    start = date.fromisoformat(args.start)
+    results = []
+    for algorithm in [a.strip() for a in args.algorithms.split(",") if a.strip()]:
+        if algorithm not in ALGORITHMS:
+            parser.error(f"未知算法: {algorithm}")
+        results.append(simulate(algorithm, args.users, args.days, start, args.seed))
+
+    if args.json:
+        print(json.dumps([{
+            "algorithm": r["algorithm"],
+            "draws": r["draws"],
+            "throughput": round(r["throughput"]),
+            "mean": round(r["mean"], 3),
+            "std": round(r["std"], 3),
+            "histogram": r["counts"].tolist(),
+            "bands": [{"range": rng, "fortune": name, "share": round(share, 6)}
+                      for rng, name, share in band_shares(r["counts"], table)]
+        } for r in results], ensure_ascii=False, indent=2))
+        return
+
+    print(f"分段: {config.get('ranges_jrrp')}")
+    for problem in table.report():
+        print(f"  ! {problem}")
+    print(f"每种算法抽取 {args.users} 用户 × {args.days} 天 = {args.users * args.days} 次\n")
+    for r in results:
+        print(f"[{r['algorithm']}] 均值 {r['mean']:.2f}  标准差 {r['std']:.2f}  "
+              f"耗时 {r['seconds']:.3f}s  吞吐 {r['throughput'] / 1e6:.2f}M/s")
+        print("\n".join(render_histogram(r["counts"], args.bucket)))
+        print("  运势分段:")
+        for rng, name, share in band_shares(r["counts"], table):
+            print(f"    {name:<4} {rng:>7}  {share:7.2%}")
+        print()
+
+
+if __name__ == "__main__":
+    main()